@@ -0,0 +1,187 @@
+"""
+benchmark_fx_price.py – on-disk size and window-query speed of two fx_price
+layouts, e.g. the original table and fx_price_optimized (see
+migrate_fx_price.py).
+
+Sizes come from system.parts (whole table) and system.columns (per column).
+Speed is measured with the enrichment's own query (fx_rates.build_query):
+
+    window   the 30 s before a random instant, one ccypair (a trade's band)
+    span     a ccypair's whole coverage (the per-pair load in the batch run)
+
+The same seeded instants are replayed against every table, alternating the
+table order per round, with the query cache off (on servers that have one,
+ClickHouse 23.1+). Results are printed and optionally written as JSON.
+
+    python benchmark_fx_price.py --tables fx_price,fx_price_optimized --windows 200 --rounds 3
+"""
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+import fx_metrics as metrics
+import fx_rates
+from fx_metrics import log
+
+TABLES = ("fx_price", "fx_price_optimized")
+WINDOW_SECONDS = 30
+WINDOWS = 200
+ROUNDS = 3
+# Applied only if the server knows the setting (see query_settings).
+QUERY_SETTINGS = {"use_query_cache": 0}
+
+
+def table_size(client, table):
+    rows = client.execute(
+        """
+        SELECT count(), sum(rows), sum(bytes_on_disk), sum(data_compressed_bytes), sum(data_uncompressed_bytes)
+        FROM system.parts
+        WHERE database = currentDatabase() AND table = %(table)s AND active
+        """,
+        {"table": table},
+    )
+    parts, n, on_disk, compressed, uncompressed = rows[0]
+    return {
+        "table": table,
+        "parts": int(parts),
+        "rows": int(n or 0),
+        "bytes_on_disk": int(on_disk or 0),
+        "compressed_bytes": int(compressed or 0),
+        "uncompressed_bytes": int(uncompressed or 0),
+        "ratio": round(uncompressed / compressed, 2) if compressed else None,
+    }
+
+
+def column_sizes(client, table):
+    rows = client.execute(
+        """
+        SELECT name, data_compressed_bytes, data_uncompressed_bytes, compression_codec
+        FROM system.columns
+        WHERE database = currentDatabase() AND table = %(table)s
+        ORDER BY position
+        """,
+        {"table": table},
+    )
+    return [
+        {"table": table, "column": name, "compressed_bytes": int(c), "uncompressed_bytes": int(u),
+         "ratio": round(u / c, 2) if c else None, "codec": codec or "default"}
+        for name, c, u, codec in rows
+    ]
+
+
+def sample_windows(coverage, n, window_ns, seed=0):
+    """n (ccypair, start, end) windows ending at random instants inside each pair's coverage."""
+    rng = random.Random(seed)
+    pairs = sorted(coverage)
+    out = []
+    for _ in range(n):
+        pair = rng.choice(pairs)
+        cov = coverage[pair]
+        end = rng.randint(cov.first_ns + window_ns, max(cov.last_ns, cov.first_ns + window_ns))
+        out.append((pair, pd.Timestamp(end - window_ns), pd.Timestamp(end)))
+    return out
+
+
+def query_settings(client):
+    """The QUERY_SETTINGS this server supports; older servers reject unknown settings."""
+    names = tuple(QUERY_SETTINGS)
+    rows = client.execute("SELECT name FROM system.settings WHERE name IN %(names)s", {"names": names})
+    known = {name for (name,) in rows}
+    skipped = [n for n in names if n not in known]
+    if skipped:
+        log.info("Server does not support %s; left unset.", ", ".join(skipped))
+    return {k: v for k, v in QUERY_SETTINGS.items() if k in known}
+
+
+def run_query(client, table, pair, start, end, settings=None):
+    """Seconds and rows for one enrichment-style query against table."""
+    query, params = fx_rates.build_query(pair, start, end, fx_rates.TICK_COLUMNS, table=table)
+    t0 = time.perf_counter()
+    data = client.execute(query, params, columnar=True, settings=settings)
+    return time.perf_counter() - t0, len(data[0]) if data else 0
+
+
+def time_queries(client, tables, queries, rounds, settings=None):
+    """{(kind, table): [(seconds, rows), ...]} over all rounds; table order alternates per round."""
+    timings = {}
+    for r in range(rounds):
+        order = tables if r % 2 == 0 else tables[::-1]
+        for table in order:
+            for kind, pair, start, end in queries:
+                seconds, n = run_query(client, table, pair, start, end, settings)
+                timings.setdefault((kind, table), []).append((seconds, n))
+                metrics.observe("benchmark_query_seconds", seconds, table=table, kind=kind)
+    return timings
+
+
+def summarize(timings):
+    out = []
+    for (kind, table), samples in sorted(timings.items()):
+        secs = np.array([s for s, _ in samples])
+        rows = sum(n for _, n in samples)
+        out.append({
+            "query": kind,
+            "table": table,
+            "queries": len(samples),
+            "median_ms": round(float(np.median(secs)) * 1e3, 3),
+            "p95_ms": round(float(np.quantile(secs, 0.95)) * 1e3, 3),
+            "rows_per_second": round(rows / secs.sum()) if secs.sum() else None,
+        })
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare size and window-query speed of fx_price layouts.")
+    parser.add_argument("--tables", default=",".join(TABLES),
+                        help=f"Comma-separated tables to compare (default: {','.join(TABLES)}).")
+    parser.add_argument("--windows", type=int, default=WINDOWS, help=f"Window queries per round (default: {WINDOWS}).")
+    parser.add_argument("--window-seconds", type=int, default=WINDOW_SECONDS,
+                        help=f"Window length (default: {WINDOW_SECONDS}).")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help=f"Passes over the query set (default: {ROUNDS}).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the window instants (default: 0).")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+
+    with metrics.instrumented(args, job="benchmark"):
+        client = fx_rates.connect()
+
+        sizes = [table_size(client, t) for t in tables]
+        columns = [c for t in tables for c in column_sizes(client, t)]
+        counts = {s["rows"] for s in sizes}
+        if len(counts) > 1:
+            log.warning("Tables hold different row counts (%s); the comparison is skewed.",
+                        ", ".join(f"{s['table']}={s['rows']}" for s in sizes))
+
+        coverage = fx_rates.fetch_coverage(client, table=tables[0])
+        if not coverage:
+            parser.error(f"{tables[0]} is empty.")
+        window_ns = args.window_seconds * 1_000_000_000
+        queries = [("window", p, s, e) for p, s, e in sample_windows(coverage, args.windows, window_ns, args.seed)]
+        queries += [("span", p, pd.Timestamp(c.first_ns), pd.Timestamp(c.last_ns + 1)) for p, c in sorted(coverage.items())]
+
+        with metrics.stage("queries"):
+            speed = summarize(time_queries(client, tables, queries, args.rounds, query_settings(client)))
+
+        pd.set_option("display.width", 200)
+        print("\nTable size")
+        print(pd.DataFrame(sizes).to_string(index=False))
+        print("\nColumn size")
+        print(pd.DataFrame(columns).to_string(index=False))
+        print("\nQuery speed")
+        print(pd.DataFrame(speed).to_string(index=False))
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"tables": sizes, "columns": columns, "queries": speed}, f, indent=2)
+            log.info("%s written.", args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+-- fx_price with per-column codecs, LowCardinality strings and skip indexes.
+-- Same columns and sort key as create_fx_price_table.sql, so every query
+-- (and fx_rates.py) works unchanged against either layout.
+-- Copy existing data with migrate_fx_price.py; compare with benchmark_fx_price.py.
+CREATE TABLE IF NOT EXISTS fx_price_optimized
+(
+    timestamp DateTime64(9) CODEC(DoubleDelta, ZSTD(1)),  -- near-regular tick spacing: delta-of-delta is mostly 0
+    date Date CODEC(DoubleDelta, ZSTD(1)),                -- constant within a part
+    -- Price ladders are stored flattened (L0, L1, L2, L0, L1, ...), so the previous
+    -- value is the neighbouring level rather than the same level one tick earlier;
+    -- Gorilla's XOR-with-previous loses there (about 1.7x larger than ZSTD alone on
+    -- the synthetic data) while Delta + ZSTD is smallest. Compare with
+    -- benchmark_fx_price.py before switching codecs.
+    bids Array(Float64) CODEC(Delta, ZSTD(1)),
+    asks Array(Float64) CODEC(Delta, ZSTD(1)),
+    qtys Array(Float64) CODEC(ZSTD(3)),                   -- a few repeating quantity ladders: dictionary-style compression
+    ccypair LowCardinality(String),                       -- tens of distinct pairs
+    quoteId String CODEC(ZSTD(3)),                        -- unique per tick
+    name LowCardinality(String),                          -- handful of sources/venues
+
+    INDEX idx_quote_id quoteId TYPE bloom_filter(0.01) GRANULARITY 4,
+    INDEX idx_name name TYPE set(64) GRANULARITY 4
+)
+ENGINE = MergeTree
+PARTITION BY toYYYYMM(date)
+ORDER BY (ccypair, timestamp);
@@ -2,7 +2,8 @@ from pathlib import Path
 from flask import Flask
 from .config import DevConfig, ProdConfig, TestConfig
 from .extensions import db
-from . import views
+from . import views, txn_views, job_views, search, jobs, cli
+from .transactions import init_txn_store
 import os
 
 def create_app(config_object=None):
@@ -34,10 +35,22 @@ def create_app(config_object=None):
 
     # register routes
     views.register_routes(app)
+    txn_views.register_routes(app)
+    job_views.register_routes(app)
+    cli.register_commands(app)
 
     # optionally create tables (controlled by config)
     if app.config.get("AUTO_CREATE_DB", True):
         with app.app_context():
             db.create_all()
 
+    # WAL so reads of the transactions store don't block behind a load
+    init_txn_store(app)
+
+    # full-text index for user search (no-op on backends without FTS5)
+    search.init_search(app)
+
+    # bounded background pool for enrichment/extraction jobs
+    jobs.init_jobs(app)
+
     return app
@@ -0,0 +1,11 @@
+import click
+from .transactions import load_enriched_csv
+
+def register_commands(app):
+    @app.cli.command("load-txns")
+    @click.argument("csv_path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--batch-size", type=int, default=None, help="Rows per insert batch.")
+    def load_txns(csv_path, batch_size):
+        """Load an enriched transactions CSV into the indexed transactions store."""
+        n = load_enriched_csv(csv_path, batch_size=batch_size or app.config["TXN_LOAD_BATCH_SIZE"])
+        click.echo(f"Loaded {n} transactions from {csv_path}")
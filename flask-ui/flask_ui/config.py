@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 
 class BaseConfig:
     SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "dev-secret-change-me")
@@ -7,6 +8,21 @@ class BaseConfig:
     AUTO_CREATE_DB = True
     JSON_SORT_KEYS = False
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    USER_SEARCH_LIMIT = 10
+    USER_SEARCH_MAX_LIMIT = 50
+    USER_IMPORT_BATCH_SIZE = 5000
+    SQLALCHEMY_BINDS = {"txns": os.getenv("TXN_STORE_URL", "sqlite:///enriched_txns.db")}
+    TXN_PAGE_SIZE = 100
+    TXN_MAX_PAGE_SIZE = 1000
+    TXN_AGG_CACHE_TTL = 300
+    TXN_AGG_CACHE_SIZE = 256
+    TXN_LOAD_BATCH_SIZE = 50000
+    # background pipeline jobs; PIPELINE_DIR holds the enrichment/extraction scripts
+    PIPELINE_DIR = os.getenv("PIPELINE_DIR", str(Path(__file__).resolve().parents[2]))
+    JOB_DIR = os.getenv("JOB_DIR", "jobs")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    # summary tables written by fx_tca.py
+    TCA_DIR = os.getenv("TCA_DIR", str(Path(PIPELINE_DIR) / "tca"))
 
 class DevConfig(BaseConfig):
     DEBUG = True
@@ -14,6 +30,7 @@ class DevConfig(BaseConfig):
 class TestConfig(BaseConfig):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    SQLALCHEMY_BINDS = {"txns": "sqlite:///:memory:"}
     AUTO_CREATE_DB = True
 
 class ProdConfig(BaseConfig):
@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import User
+
+# SQLite caps bound parameters per statement; keep IN (...) lists well below it.
+_LOOKUP_CHUNK = 500
+
+
+def validate_user_fields(full_name, email):
+    """Return a list of validation messages for one user (empty when valid)."""
+    errors = []
+    if not full_name:
+        errors.append("Full name is required.")
+    if not email:
+        errors.append("Email is required.")
+    elif "@" not in email or "." not in email.split("@")[-1]:
+        errors.append("Email format looks invalid.")
+    return errors
+
+
+def parse_records(stream, content_type):
+    """
+    Parse an uploaded payload into a list of dicts.
+    CSV needs a header row with full_name and email columns; JSON may be a
+    list of objects or {"users": [...]}.
+    """
+    if "json" in content_type:
+        payload = json.load(stream)
+        if isinstance(payload, dict):
+            payload = payload.get("users")
+        if not isinstance(payload, list):
+            raise ValueError("JSON payload must be a list of users or {\"users\": [...]}.")
+        return [r if isinstance(r, dict) else {} for r in payload]
+
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    try:
+        fields = {(f or "").strip().lower() for f in reader.fieldnames or []}
+        if not {"full_name", "email"} <= fields:
+            raise ValueError("CSV header must include full_name and email columns.")
+        return [{(k or "").strip().lower(): v for k, v in row.items()} for row in reader]
+    except csv.Error as e:
+        raise ValueError(f"Malformed CSV at line {reader.line_num}: {e}") from e
+
+
+def _existing_emails(emails):
+    """Set-based duplicate check against the users table."""
+    existing = set()
+    emails = list(emails)
+    for i in range(0, len(emails), _LOOKUP_CHUNK):
+        chunk = emails[i:i + _LOOKUP_CHUNK]
+        existing.update(db.session.execute(select(User.email).where(User.email.in_(chunk))).scalars())
+    return existing
+
+
+def _insert_rows(batch, errors):
+    """Insert (row_no, values) pairs one at a time, each in a savepoint; returns the count inserted."""
+    inserted = 0
+    for row_no, values in batch:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(User), [values])
+            inserted += 1
+        except IntegrityError:
+            errors.append({"row": row_no, "email": values["email"],
+                           "errors": ["A user with this email already exists."]})
+    db.session.commit()
+    return inserted
+
+
+def import_users(records, batch_size=5000):
+    """
+    Validate records in memory, drop duplicates (within the payload and
+    against the database) and insert the rest with batched executemany
+    transactions. Returns a report dict with per-row errors; row numbers are
+    1-based positions in the payload.
+    """
+    errors = []
+    valid = []
+    seen = set()
+    for row_no, rec in enumerate(records, start=1):
+        full_name = str(rec.get("full_name") or "").strip()
+        email = str(rec.get("email") or "").strip().lower()
+        row_errors = validate_user_fields(full_name, email)
+        if not row_errors and email in seen:
+            row_errors.append("Duplicate email in import.")
+        if row_errors:
+            errors.append({"row": row_no, "email": email, "errors": row_errors})
+            continue
+        seen.add(email)
+        valid.append((row_no, {"full_name": full_name, "email": email}))
+
+    existing = _existing_emails(seen)
+    if existing:
+        keep = []
+        for row_no, values in valid:
+            if values["email"] in existing:
+                errors.append({"row": row_no, "email": values["email"],
+                               "errors": ["A user with this email already exists."]})
+            else:
+                keep.append((row_no, values))
+        valid = keep
+
+    inserted = 0
+    for i in range(0, len(valid), batch_size):
+        batch = valid[i:i + batch_size]
+        try:
+            db.session.execute(insert(User), [values for _, values in batch])
+            db.session.commit()
+            inserted += len(batch)
+        except IntegrityError:
+            # Lost a race with a concurrent insert: retry the batch row by row so
+            # only the rows that now collide are reported.
+            db.session.rollback()
+            inserted += _insert_rows(batch, errors)
+
+    errors.sort(key=lambda e: e["row"])
+    return {"received": len(records), "inserted": inserted, "failed": len(errors), "errors": errors}
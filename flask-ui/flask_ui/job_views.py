@@ -0,0 +1,49 @@
+from flask import request, jsonify, current_app, send_file, abort, url_for
+from .extensions import db
+from .models import Job
+from .jobs import JOB_KINDS, JobError, job_to_dict
+
+def register_routes(app):
+    @app.errorhandler(JobError)
+    def bad_job(e):
+        return jsonify({"error": str(e)}), 400
+
+    @app.route("/api/jobs", methods=["POST"])
+    def submit_job():
+        # kind=enrich|extract; optional "file" upload(s), else the pipeline's default input
+        runner = current_app.extensions["job_runner"]
+        kind = request.form.get("kind") or (request.get_json(silent=True) or {}).get("kind") or "enrich"
+        if kind not in JOB_KINDS:
+            raise JobError(f"kind must be one of {', '.join(JOB_KINDS)}.")
+        files = [f for f in request.files.getlist("file") if f.filename]
+        job_id = runner.new_job_id()
+        if files:
+            input_path = runner.save_upload(job_id, kind, files)
+        else:
+            input_path = runner.default_input(kind)
+        job = runner.submit(kind, input_path, job_id=job_id)
+        body = job_to_dict(job)
+        body["status_url"] = url_for("job_status", job_id=job.id)
+        return jsonify(body), 202
+
+    @app.route("/api/jobs")
+    def list_jobs():
+        limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+        jobs = Job.query.order_by(Job.created_at.desc()).limit(limit).all()
+        return jsonify({"results": [job_to_dict(j) for j in jobs]})
+
+    @app.route("/api/jobs/<job_id>")
+    def job_status(job_id):
+        job = db.session.get(Job, job_id) or abort(404)
+        body = job_to_dict(job)
+        if job.status == "succeeded":
+            body["result_url"] = url_for("job_result", job_id=job.id)
+        return jsonify(body)
+
+    @app.route("/api/jobs/<job_id>/result")
+    def job_result(job_id):
+        job = db.session.get(Job, job_id) or abort(404)
+        if job.status != "succeeded" or not job.output_path:
+            return jsonify({"error": f"job is {job.status}"}), 409
+        return send_file(job.output_path, mimetype="text/csv", as_attachment=True,
+                         download_name=f"{job.kind}_{job.id}.csv")
@@ -0,0 +1,372 @@
+import atexit
+import hashlib
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+from .extensions import db
+from .models import Job
+
+# script, argv builder (input_path, output_path), what the progress lines count,
+# and whether the output depends on the price data as well as the input
+JobKind = namedtuple("JobKind", ["script", "build_args", "unit", "uses_prices"])
+JOB_KINDS = {
+    "enrich": JobKind(
+        "fx_transactions_with_rates.py", lambda inp, out: ["--input", inp, "--output", out], "rows", True
+    ),
+    "extract": JobKind(
+        "pdf_to_csv_fx_transactions.py", lambda inp, out: ["--pdf-dir", inp, "--output", out], "files", False
+    ),
+}
+
+# Both scripts report progress as "Processing <thing> N/M..."
+_PROGRESS_RE = re.compile(r"^\s*Processing \w+ (\d+)/(\d+)")
+_PROGRESS_FLUSH_SECS = 0.5
+_HASH_CHUNK = 1 << 20
+
+
+class JobError(ValueError):
+    """Invalid job submission."""
+
+
+def hash_input(path):
+    """Content hash of a file, or of every *.pdf in a directory (name + bytes)."""
+    h = hashlib.sha256()
+    path = Path(path)
+    files = sorted(path.glob("*.pdf")) if path.is_dir() else [path]
+    for f in files:
+        if path.is_dir():
+            h.update(f.name.encode())
+        with open(f, "rb") as fh:
+            for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def process_owner():
+    """Identifies this process in Job.owner ("host:pid"); read per call, as workers may be forked."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner):
+    """
+    False if owner names a process on this host that no longer exists.
+    Processes on other hosts cannot be checked and count as alive.
+    """
+    host, _, pid = (owner or "").rpartition(":")
+    if not pid.isdigit():
+        return False
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+    return True
+
+
+def job_to_dict(job):
+    """
+    Job state plus derived throughput and ETA in seconds. Progress is counted
+    in the kind's unit (rows for enrich, PDF files for extract), so the keys
+    are rows_done/rows_per_sec or files_done/files_per_sec accordingly.
+    """
+    unit = JOB_KINDS[job.kind].unit if job.kind in JOB_KINDS else "rows"
+    rate = eta = None
+    if job.started_at and job.rows_done:
+        end = job.finished_at or datetime.utcnow()
+        elapsed = (end - job.started_at).total_seconds()
+        if elapsed > 0:
+            rate = job.rows_done / elapsed
+            if job.status == "running" and job.rows_total:
+                eta = max(job.rows_total - job.rows_done, 0) / rate
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "cache_hit": job.cache_hit,
+        "progress_unit": unit,
+        f"{unit}_done": job.rows_done,
+        f"{unit}_total": job.rows_total,
+        f"{unit}_per_sec": round(rate, 2) if rate is not None else None,
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobRunner:
+    """
+    Runs pipeline scripts as subprocesses on a bounded thread pool.
+    Request handlers only insert a Job row and enqueue it; the pool threads
+    supervise the subprocess, parse its progress lines and persist state, so
+    web workers never wait on a job.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.pipeline_dir = Path(app.config["PIPELINE_DIR"])
+        self.job_dir = Path(app.instance_path) / app.config["JOB_DIR"]
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        # an in-memory SQLite database lives in one connection, which the job
+        # threads cannot share with the request threads
+        self.memory_db = is_memory_sqlite(app.config["SQLALCHEMY_DATABASE_URI"])
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config["JOB_WORKERS"], thread_name_prefix="pipeline-job"
+        )
+        self._procs = set()
+        self._procs_lock = threading.Lock()
+
+    def workdir(self, job_id):
+        path = self.job_dir / job_id
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def new_job_id(self):
+        return uuid.uuid4().hex
+
+    def submit(self, kind, input_path, job_id=None):
+        """
+        Create a job for input_path and queue it. The worker first looks for
+        an earlier successful job with the same cache key (see cache_key) and
+        completes the new job from that job's output instead of re-running.
+        """
+        if kind not in JOB_KINDS:
+            raise JobError(f"kind must be one of {', '.join(JOB_KINDS)}.")
+        if self.memory_db:
+            raise JobError(
+                "Background jobs need a database file or server; an in-memory SQLite database "
+                "cannot be shared with the job threads (set DATABASE_URL)."
+            )
+        input_path = Path(input_path)
+        if not input_path.exists():
+            raise JobError(f"Input not found: {input_path}")
+        job = Job(
+            id=job_id or self.new_job_id(),
+            kind=kind,
+            input_path=str(input_path),
+            input_hash=hash_input(input_path),
+            owner=process_owner(),
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.executor.submit(self._run, job.id)
+        return job
+
+    def price_fingerprint(self):
+        """Fingerprint of the configured price source and its coverage, from fx_sources.py."""
+        proc = subprocess.run(
+            [sys.executable, str(self.pipeline_dir / "fx_sources.py"), "fingerprint"],
+            cwd=self.pipeline_dir, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            tail = (proc.stderr or proc.stdout).strip().splitlines()[-20:]
+            raise RuntimeError("price fingerprint failed:\n" + "\n".join(tail))
+        return proc.stdout.strip()
+
+    def cache_key(self, job):
+        """
+        Content hash of the input, combined for price-dependent kinds with the
+        price fingerprint, so a changed price source or newly loaded prices
+        never reuse an output computed against the old ones.
+        """
+        if not JOB_KINDS[job.kind].uses_prices:
+            return job.input_hash
+        return hashlib.sha256(f"{job.input_hash}|{self.price_fingerprint()}".encode()).hexdigest()
+
+    def _reuse_cached(self, job_id):
+        """Complete the job from an earlier identical one if possible; returns True if it was."""
+        job = db.session.get(Job, job_id)
+        key = self.cache_key(job)
+        cached = (
+            Job.query.filter(Job.kind == job.kind, Job.cache_key == key, Job.status == "succeeded", Job.id != job_id)
+            .order_by(Job.finished_at.desc())
+            .first()
+        )
+        if not (cached and cached.output_path and os.path.exists(cached.output_path)):
+            self._update(job_id, cache_key=key)
+            return False
+        now = datetime.utcnow()
+        self._update(
+            job_id,
+            cache_key=key,
+            status="succeeded",
+            error=None,
+            cache_hit=True,
+            output_path=cached.output_path,
+            rows_done=cached.rows_done,
+            rows_total=cached.rows_total,
+            started_at=now,
+            finished_at=now,
+        )
+        return True
+
+    def shutdown(self):
+        """Drop queued jobs and stop running ones; init_jobs runs this at interpreter exit."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._procs_lock:
+            for proc in self._procs:
+                proc.terminate()
+
+    def _update(self, job_id, **fields):
+        Job.query.filter_by(id=job_id).update(fields)
+        db.session.commit()
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._reuse_cached(job_id):
+                    self._run_subprocess(job_id)
+            except Exception as e:  # e.g. interpreter or script missing
+                db.session.rollback()
+                self._update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+            finally:
+                db.session.remove()
+
+    def _run_subprocess(self, job_id):
+        job = db.session.get(Job, job_id)
+        script, build_args = JOB_KINDS[job.kind][:2]
+        output_path = str(self.workdir(job_id) / "output.csv")
+        cmd = [sys.executable, "-u", str(self.pipeline_dir / script)] + build_args(job.input_path, output_path)
+        self._update(job_id, status="running", started_at=datetime.utcnow())
+
+        proc = subprocess.Popen(
+            cmd, cwd=self.pipeline_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        with self._procs_lock:
+            self._procs.add(proc)
+        tail = []
+        last_flush = 0.0
+        total = None
+        for line in proc.stdout:
+            tail = (tail + [line.rstrip()])[-20:]
+            m = _PROGRESS_RE.match(line)
+            if m:
+                done, total = int(m.group(1)), int(m.group(2))
+                now = time.monotonic()
+                if now - last_flush >= _PROGRESS_FLUSH_SECS:
+                    self._update(job_id, rows_done=done, rows_total=total)
+                    last_flush = now
+        rc = proc.wait()
+        with self._procs_lock:
+            self._procs.discard(proc)
+
+        if rc == 0:
+            self._update(
+                job_id,
+                status="succeeded",
+                error=None,
+                output_path=output_path,
+                rows_done=total or 0,
+                rows_total=total,
+                finished_at=datetime.utcnow(),
+            )
+        else:
+            self._update(
+                job_id,
+                status="failed",
+                error=f"exit code {rc}\n" + "\n".join(tail),
+                finished_at=datetime.utcnow(),
+            )
+
+    def save_upload(self, job_id, kind, files):
+        """Store uploaded input(s) in the job's work dir; returns the input path."""
+        workdir = self.workdir(job_id)
+        if kind == "extract":
+            pdf_dir = workdir / "pdfs"
+            pdf_dir.mkdir(exist_ok=True)
+            for i, f in enumerate(files):
+                name = Path(f.filename or "").name or f"upload_{i}.pdf"
+                if not name.lower().endswith(".pdf"):
+                    name += ".pdf"
+                f.save(pdf_dir / name)
+            return pdf_dir
+        target = workdir / "input.csv"
+        files[0].save(target)
+        return target
+
+    def default_input(self, kind):
+        if kind == "extract":
+            return self.pipeline_dir / "generated-pdf"
+        return self.pipeline_dir / "fx_transactions.csv"
+
+
+def _add_missing_columns(engine):
+    """Columns added to jobs since the table was created (create_all only creates missing tables)."""
+    have = {c["name"] for c in inspect(engine).get_columns(Job.__tablename__)}
+    with engine.begin() as conn:
+        for col in Job.__table__.columns:
+            if col.name not in have:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {Job.__tablename__} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"
+                )
+        for index in Job.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def fail_orphaned_jobs():
+    """
+    Mark queued/running jobs failed whose owning process has exited: their
+    queue lived in that process, so nothing will ever finish them. Jobs of
+    live processes (other gunicorn workers, a restarted sibling) are left alone.
+    """
+    active = Job.query.filter(Job.status.in_(["queued", "running"])).all()
+    orphaned = [job.id for job in active if not owner_alive(job.owner)]
+    if orphaned:
+        Job.query.filter(Job.id.in_(orphaned), Job.status.in_(["queued", "running"])).update(
+            {"status": "failed", "error": "interrupted: the process running it exited"},
+            synchronize_session=False,
+        )
+        db.session.commit()
+    return len(orphaned)
+
+
+def init_jobs(app):
+    """
+    Attach a JobRunner to the app. Jobs orphaned by a process that exited are
+    marked failed before the first request is served, so instances that never
+    serve requests (e.g. `flask load-txns`) leave the jobs table alone.
+    """
+    runner = JobRunner(app)
+    app.extensions["job_runner"] = runner
+    # The pool's own exit hook joins its threads after draining the queue, and
+    # plain atexit hooks run only after that; threading's exit hooks run first
+    # (newest first), so the shutdown is registered there when available.
+    getattr(threading, "_register_atexit", atexit.register)(runner.shutdown)
+    with app.app_context():
+        if inspect(db.engine).has_table(Job.__tablename__):
+            _add_missing_columns(db.engine)
+
+    recovered = threading.Event()
+    recover_lock = threading.Lock()
+
+    @app.before_request
+    def _fail_orphaned_jobs_once():
+        if recovered.is_set():
+            return
+        with recover_lock:
+            if not recovered.is_set():
+                if inspect(db.engine).has_table(Job.__tablename__):
+                    fail_orphaned_jobs()
+                recovered.set()
+
+    return runner
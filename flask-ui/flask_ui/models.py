@@ -10,3 +10,65 @@ class User(db.Model):
 
     def __repr__(self):
         return f"<User {self.id} {self.email}>"
+
+class Job(db.Model):
+    """Background pipeline job (enrichment or PDF extraction) and its progress."""
+    __tablename__ = "jobs"
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="queued", index=True)
+    input_path = db.Column(db.String(512), nullable=False)
+    input_hash = db.Column(db.String(64), nullable=False)  # content hash of the input, see hash_input
+    cache_key = db.Column(db.String(64))  # result-cache key, see JobRunner.cache_key
+    owner = db.Column(db.String(255))  # "host:pid" of the process running the job
+    output_path = db.Column(db.String(512))
+    rows_done = db.Column(db.Integer, nullable=False, default=0)  # progress in the kind's unit (rows or files)
+    rows_total = db.Column(db.Integer)
+    cache_hit = db.Column(db.Boolean, nullable=False, default=False)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index("ix_jobs_kind_cache_key", "kind", "cache_key"),)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+class EnrichedTxn(db.Model):
+    """
+    Indexed copy of fx_transactions_with_rates.csv, loaded with `flask load-txns`.
+    Lives in its own database (bind "txns") so it can grow independently of users.
+    """
+    __bind_key__ = "txns"
+    __tablename__ = "enriched_txns"
+    id = db.Column(db.Integer, primary_key=True)
+    trade_time = db.Column(db.DateTime, nullable=True)
+    trade_hour = db.Column(db.String(13), nullable=True)  # "YYYY-MM-DD HH", precomputed for grouping
+    buy_sell = db.Column(db.String(8))
+    from_ccy = db.Column(db.String(3))
+    to_ccy = db.Column(db.String(3))
+    ccypair = db.Column(db.String(6))
+    from_amt = db.Column(db.Float)
+    to_amt = db.Column(db.Float)
+    exchange_rate = db.Column(db.Float)
+    txn_number = db.Column(db.String(32))
+    account = db.Column(db.String(32))
+    bid_max = db.Column(db.Float)
+    bid_min = db.Column(db.Float)
+    ask_max = db.Column(db.Float)
+    ask_min = db.Column(db.Float)
+    ccypair_used = db.Column(db.String(6))
+    reciprocal = db.Column(db.Boolean)
+    cross_used = db.Column(db.String(32))
+    used_bid = db.Column(db.Boolean)
+
+    # Keyset pagination walks (trade_time, id) within each filter prefix.
+    __table_args__ = (
+        db.Index("ix_enriched_txns_time", "trade_time", "id"),
+        db.Index("ix_enriched_txns_ccypair_time", "ccypair", "trade_time", "id"),
+        db.Index("ix_enriched_txns_account_time", "account", "trade_time", "id"),
+    )
+
+    def __repr__(self):
+        return f"<EnrichedTxn {self.id} {self.txn_number}>"
@@ -0,0 +1,184 @@
+import re
+from flask import current_app
+from sqlalchemy import inspect, or_, text
+from .extensions import db
+from .models import User
+
+FTS_TABLE = "users_fts"
+
+# Terms shorter than this cannot be matched through trigrams and go to ILIKE.
+MIN_TERM_LEN = 3
+
+# External-content FTS5 table over users(full_name, email). The trigram
+# tokenizer indexes every 3-character substring, so a quoted term matches
+# anywhere inside a word ("mith" finds "Smith"), the same results as the
+# old LIKE '%q%' scan but served from the index. Triggers keep the index in
+# step with the users table for every insert/update/delete, including bulk
+# executemany inserts.
+_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        full_name, email,
+        content='users', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON users BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, full_name, email)
+        VALUES (new.id, new.full_name, new.email);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON users BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name, email)
+        VALUES ('delete', old.id, old.full_name, old.email);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON users BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name, email)
+        VALUES ('delete', old.id, old.full_name, old.email);
+        INSERT INTO {FTS_TABLE}(rowid, full_name, email)
+        VALUES (new.id, new.full_name, new.email);
+    END
+    """,
+]
+
+_DROP_DDL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_TOKEN_RE = re.compile(r"[^\s\"]+", re.UNICODE)
+
+
+def init_search(app):
+    """
+    Create the FTS5 index and its sync triggers if the database supports them.
+    Safe to call on every startup; a freshly created index is rebuilt from the
+    existing users table, and an index built with an older tokenizer is
+    replaced. Falls back to ILIKE scans on other backends and on SQLite
+    builds without the trigram tokenizer (before 3.34).
+    """
+    enabled = False
+    with app.app_context():
+        engine = db.engine
+        insp = inspect(engine)
+        if engine.dialect.name == "sqlite" and insp.has_table("users"):
+            existed = insp.has_table(FTS_TABLE)
+            try:
+                with engine.begin() as conn:
+                    if existed:
+                        sql = conn.exec_driver_sql(
+                            "SELECT sql FROM sqlite_master WHERE name = ?", (FTS_TABLE,)
+                        ).scalar()
+                        if "trigram" not in (sql or ""):
+                            for ddl in _DROP_DDL:
+                                conn.exec_driver_sql(ddl)
+                            existed = False
+                    for ddl in _FTS_DDL:
+                        conn.exec_driver_sql(ddl)
+                    if not existed:
+                        conn.exec_driver_sql(
+                            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+                        )
+                enabled = True
+            except Exception as e:  # sqlite built without FTS5
+                app.logger.warning("User search index unavailable, using ILIKE: %s", e)
+    app.extensions["user_search_fts"] = enabled
+
+
+def _fts_query(tokens):
+    """FTS5 MATCH expression: every term must occur as a substring (trigram phrase)."""
+    return " ".join(f'"{t}"' for t in tokens)
+
+
+def _like_search(q, limit=None, before=None):
+    like = f"%{q}%"
+    query = User.query.filter(or_(User.full_name.ilike(like), User.email.ilike(like)))
+    if before:
+        query = query.filter(User.id < before)
+    query = query.order_by(User.id.desc())
+    if not limit:
+        return query.all(), None
+    users = query.limit(limit + 1).all()
+    next_before = users[limit - 1].id if len(users) > limit else None
+    return sorted(users[:limit], key=lambda u: _page_rank(u, q.lower())), next_before
+
+
+def search_page(q, limit=None, before=None):
+    """
+    Users whose name or email contains q (case-insensitive), plus the cursor
+    for the next page (None when there is none).
+
+    Without a limit every match is returned: email prefix hits (a range scan
+    on the unique email index) first, then the rest best bm25 match first.
+    With a limit, results are paged by a keyset cursor on the user id: a page
+    is the next `limit` matches below `before`, newest first, and only that
+    page is ordered (prefix hits before infix hits), so a common term does
+    not rank the whole match set. Every email prefix hit is also a substring
+    match, so it turns up on its own page; no separate block is put in front.
+    """
+    q = (q or "").strip()
+    if not q:
+        return [], None
+
+    tokens = _TOKEN_RE.findall(q)
+    if not current_app.extensions.get("user_search_fts") or any(
+        len(t) < MIN_TERM_LEN for t in tokens
+    ):
+        return _like_search(q, limit, before)
+
+    params = {"match": _fts_query(tokens)}
+    if limit:
+        # Keyset page: FTS5 walks rowids in order and stops at the LIMIT, so
+        # neither the match set nor bm25 over it is ever computed in full
+        # (bm25 needs each term's document frequency, a scan of every match).
+        # One row past the page tells whether another page follows.
+        cursor = "AND rowid < :before" if before else ""
+        sql = f"""
+            SELECT rowid FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH :match {cursor}
+            ORDER BY rowid DESC LIMIT :limit
+        """
+        params["limit"] = limit + 1
+        if before:
+            params["before"] = before
+        ids = [r[0] for r in db.session.execute(text(sql), params)]
+        next_before = ids[limit - 1] if len(ids) > limit else None
+        ids = ids[:limit]
+        by_id = {u.id: u for u in User.query.filter(User.id.in_(ids)).all()} if ids else {}
+        users = [by_id[i] for i in ids if i in by_id]
+        users.sort(key=lambda u: _page_rank(u, q.lower()))
+        return users, next_before
+
+    # Emails are stored lower-cased, so a half-open range is an index prefix match.
+    prefix = q.lower()
+    users = User.query.filter(
+        User.email >= prefix, User.email < prefix + "\uffff"
+    ).order_by(User.email).all()
+    seen = {u.id for u in users}
+    sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rank"
+    ids = [r[0] for r in db.session.execute(text(sql), params) if r[0] not in seen]
+    if ids:
+        by_id = {u.id: u for u in User.query.filter(User.id.in_(ids)).all()}
+        users.extend(by_id[i] for i in ids if i in by_id)
+    return users, None
+
+
+def _page_rank(user, q):
+    """Order within a page: field starts with q, then a word starts with q, then infix."""
+    fields = [(user.full_name or "").lower(), (user.email or "").lower()]
+    if any(f.startswith(q) for f in fields):
+        return 0
+    if any(w.startswith(q) for f in fields for w in re.split(r"[\s@._-]+", f)):
+        return 1
+    return 2
+
+
+def search_users(q, limit=None, before=None):
+    """search_page() without the cursor."""
+    return search_page(q, limit, before)[0]
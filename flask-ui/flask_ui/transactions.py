@@ -0,0 +1,339 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, tuple_
+from .extensions import db
+from .models import EnrichedTxn
+
+# CSV header (as written by fx_transactions_with_rates.py, lower-cased) -> column
+_CSV_COLUMNS = {
+    "tradedatetime": "trade_time",
+    "trade datetime": "trade_time",
+    "trade_datetime": "trade_time",
+    "buy/sell": "buy_sell",
+    "buy_sell": "buy_sell",
+    "from ccy": "from_ccy",
+    "from_ccy": "from_ccy",
+    "to ccy": "to_ccy",
+    "to_ccy": "to_ccy",
+    "from amt": "from_amt",
+    "from_amt": "from_amt",
+    "to amt": "to_amt",
+    "to_amt": "to_amt",
+    "exchange rate": "exchange_rate",
+    "exchange_rate": "exchange_rate",
+    "txn number": "txn_number",
+    "txn_number": "txn_number",
+    "account": "account",
+    "bid_max": "bid_max",
+    "bid_min": "bid_min",
+    "ask_max": "ask_max",
+    "ask_min": "ask_min",
+    "ccypair_used": "ccypair_used",
+    "reciprocal": "reciprocal",
+    "cross_used": "cross_used",
+    "used_bid": "used_bid",
+}
+_FLOAT_COLUMNS = {"from_amt", "to_amt", "exchange_rate", "bid_max", "bid_min", "ask_max", "ask_min"}
+_BOOL_COLUMNS = {"reciprocal", "used_bid"}
+_TRADE_TIME_FORMAT = "%d/%m/%y %H:%M:%S"
+
+
+class FilterError(ValueError):
+    """Bad filter, cursor or grouping supplied by the client."""
+
+
+class ReportNotFound(LookupError):
+    """A TCA report that has not been produced yet."""
+
+
+EXPORT_COLUMNS = [
+    "trade_time", "buy_sell", "from_ccy", "to_ccy", "ccypair", "from_amt", "to_amt",
+    "exchange_rate", "txn_number", "account", "bid_max", "bid_min", "ask_max", "ask_min",
+    "ccypair_used", "reciprocal", "cross_used", "used_bid",
+]
+GROUP_BY_COLUMNS = {
+    "ccypair": EnrichedTxn.ccypair,
+    "account": EnrichedTxn.account,
+    "hour": EnrichedTxn.trade_hour,
+}
+
+
+def _to_float(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def _to_bool(value):
+    value = (value or "").strip().lower()
+    if value in ("true", "1"):
+        return True
+    if value in ("false", "0"):
+        return False
+    return None
+
+
+def _row_values(row):
+    values = {}
+    for key, raw in row.items():
+        col = _CSV_COLUMNS.get((key or "").strip().lower())
+        if col is None:
+            continue
+        raw = (raw or "").strip()
+        if col in _FLOAT_COLUMNS:
+            values[col] = _to_float(raw)
+        elif col in _BOOL_COLUMNS:
+            values[col] = _to_bool(raw)
+        elif col == "trade_time":
+            try:
+                values[col] = datetime.strptime(raw, _TRADE_TIME_FORMAT)
+            except ValueError:
+                values[col] = None
+        else:
+            values[col] = raw or None
+    from_ccy = (values.get("from_ccy") or "").upper()
+    to_ccy = (values.get("to_ccy") or "").upper()
+    values["from_ccy"] = from_ccy or None
+    values["to_ccy"] = to_ccy or None
+    values["ccypair"] = (from_ccy + to_ccy) or None
+    trade_time = values.get("trade_time")
+    values["trade_hour"] = trade_time.strftime("%Y-%m-%d %H") if trade_time else None
+    return values
+
+
+def init_txn_store(app):
+    """
+    Put a file-backed SQLite store into WAL mode. The mode is persistent in the
+    database file, so this only has an effect the first time; without it a load
+    holds an exclusive lock and readers fail with "database is locked".
+    """
+    with app.app_context():
+        engine = db.engines["txns"]
+        if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+            with engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+
+def load_enriched_csv(path, batch_size=50000):
+    """
+    Replace the transactions store with the contents of an enriched CSV.
+    Rows are streamed from disk and inserted with executemany in batches inside
+    one transaction, so memory use is bounded by batch_size rather than file
+    size. SQLite stores are in WAL mode (see init_txn_store), so readers keep
+    seeing the previous copy until the load commits.
+    """
+    engine = db.engines["txns"]
+    total = 0
+    with engine.begin() as conn:
+        conn.execute(delete(EnrichedTxn))
+        with open(path, newline="", encoding="utf-8") as f:
+            batch = []
+            for row in csv.DictReader(f):
+                batch.append(_row_values(row))
+                if len(batch) >= batch_size:
+                    conn.execute(insert(EnrichedTxn), batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                conn.execute(insert(EnrichedTxn), batch)
+                total += len(batch)
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("ANALYZE enriched_txns")
+    clear_aggregate_cache()
+    return total
+
+
+def parse_filters(args):
+    """Read ccypair/account/start/end filters from request args."""
+    filters = {}
+    ccypair = (args.get("ccypair") or "").strip().upper()
+    if ccypair:
+        filters["ccypair"] = ccypair
+    account = (args.get("account") or "").strip()
+    if account:
+        filters["account"] = account
+    for key in ("start", "end"):
+        value = (args.get(key) or "").strip()
+        if value:
+            try:
+                filters[key] = datetime.fromisoformat(value)
+            except ValueError:
+                raise FilterError(f"Invalid {key} timestamp: {value!r} (use ISO format).")
+    return filters
+
+
+def _apply_filters(stmt, filters):
+    if "ccypair" in filters:
+        stmt = stmt.where(EnrichedTxn.ccypair == filters["ccypair"])
+    if "account" in filters:
+        stmt = stmt.where(EnrichedTxn.account == filters["account"])
+    if "start" in filters:
+        stmt = stmt.where(EnrichedTxn.trade_time >= filters["start"])
+    if "end" in filters:
+        stmt = stmt.where(EnrichedTxn.trade_time < filters["end"])
+    return stmt
+
+
+def _listed(stmt):
+    """Rows shown by the page view and the export: only those with a trade time."""
+    return stmt.where(EnrichedTxn.trade_time.is_not(None))
+
+
+def encode_cursor(txn):
+    return f"{txn.trade_time.isoformat() if txn.trade_time else ''}|{txn.id}"
+
+
+def decode_cursor(cursor):
+    try:
+        ts, txn_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(txn_id)
+    except ValueError:
+        raise FilterError(f"Invalid cursor: {cursor!r}")
+
+
+def page_transactions(filters, after=None, limit=100):
+    """
+    Keyset-paginated page ordered by (trade_time, id).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Seeking past the cursor keeps every page an index range scan, unlike
+    OFFSET which re-reads all skipped rows.
+    """
+    stmt = _listed(_apply_filters(select(EnrichedTxn), filters))
+    if after:
+        ts, txn_id = decode_cursor(after)
+        stmt = stmt.where(tuple_(EnrichedTxn.trade_time, EnrichedTxn.id) > tuple_(ts, txn_id))
+    stmt = stmt.order_by(EnrichedTxn.trade_time, EnrichedTxn.id).limit(limit + 1)
+    rows = db.session.execute(stmt).scalars().all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def txn_to_dict(txn):
+    out = {"id": txn.id}
+    for col in EXPORT_COLUMNS:
+        value = getattr(txn, col)
+        out[col] = value.isoformat() if isinstance(value, datetime) else value
+    return out
+
+
+# Aggregates scan the filtered range, so results are cached per (group_by,
+# filters) for a TTL in a bounded LRU, and dropped whenever the store is reloaded.
+_agg_cache = OrderedDict()
+_agg_lock = threading.Lock()
+
+
+def clear_aggregate_cache():
+    with _agg_lock:
+        _agg_cache.clear()
+
+
+def aggregate_transactions(group_by, filters, ttl=300, max_entries=256):
+    if group_by not in GROUP_BY_COLUMNS:
+        raise FilterError(f"group_by must be one of {', '.join(GROUP_BY_COLUMNS)}.")
+    key = (group_by, tuple(sorted((k, str(v)) for k, v in filters.items())))
+    now = time.monotonic()
+    with _agg_lock:
+        hit = _agg_cache.get(key)
+        if hit and now - hit[0] < ttl:
+            _agg_cache.move_to_end(key)
+            return hit[1]
+        if hit:
+            del _agg_cache[key]
+
+    col = GROUP_BY_COLUMNS[group_by]
+    stmt = select(
+        col.label("key"),
+        func.count().label("trades"),
+        func.sum(EnrichedTxn.from_amt).label("from_amt"),
+        func.sum(EnrichedTxn.to_amt).label("to_amt"),
+        func.avg(EnrichedTxn.exchange_rate).label("avg_rate"),
+        func.min(EnrichedTxn.trade_time).label("first_trade"),
+        func.max(EnrichedTxn.trade_time).label("last_trade"),
+    )
+    stmt = _apply_filters(stmt, filters).group_by(col).order_by(col)
+    result = []
+    for row in db.session.execute(stmt):
+        item = dict(row._mapping)
+        for k in ("first_trade", "last_trade"):
+            if isinstance(item[k], datetime):
+                item[k] = item[k].isoformat()
+        result.append(item)
+
+    with _agg_lock:
+        _agg_cache[key] = (now, result)
+        _agg_cache.move_to_end(key)
+        while len(_agg_cache) > max_entries:
+            _agg_cache.popitem(last=False)
+    return result
+
+
+def iter_csv(filters, chunk_rows=10000):
+    """Yield the filtered transactions as CSV text, chunk_rows rows at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    cols = [getattr(EnrichedTxn, c) for c in EXPORT_COLUMNS]
+    stmt = _listed(_apply_filters(select(*cols), filters)).order_by(EnrichedTxn.trade_time, EnrichedTxn.id)
+    stmt = stmt.execution_options(yield_per=chunk_rows)
+    n = 0
+    for row in db.session.execute(stmt):
+        writer.writerow(row)
+        n += 1
+        if n % chunk_rows == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+# TCA summary tables are produced by fx_tca.py; parsed copies are kept
+# until the file's mtime changes.
+TCA_GROUPS = ("account", "ccypair", "hour")
+_tca_cache = {}
+
+
+def _tca_value(value):
+    if value == "":
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() and "." not in value else number
+
+
+def _read_cached(path, parse):
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        raise ReportNotFound(f"No TCA report at {path}; run fx_tca.py first.")
+    with _agg_lock:
+        hit = _tca_cache.get(path)
+        if hit and hit[0] == mtime:
+            return hit[1]
+    with open(path, newline="", encoding="utf-8") as f:
+        data = parse(f)
+    with _agg_lock:
+        _tca_cache[path] = (mtime, data)
+    return data
+
+
+def tca_table(tca_dir, group_by):
+    """Rows of tca_by_<group_by>.csv as dicts with numeric values converted."""
+    if group_by not in TCA_GROUPS:
+        raise FilterError(f"group_by must be one of {', '.join(TCA_GROUPS)}.")
+    path = os.path.join(tca_dir, f"tca_by_{group_by}.csv")
+    return _read_cached(
+        path, lambda f: [{k: _tca_value(v) for k, v in row.items()} for row in csv.DictReader(f)]
+    )
+
+
+def tca_summary(tca_dir):
+    return _read_cached(os.path.join(tca_dir, "tca_summary.json"), json.load)
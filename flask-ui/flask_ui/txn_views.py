@@ -0,0 +1,73 @@
+from flask import render_template, request, jsonify, current_app, Response, stream_with_context
+from .transactions import (
+    FilterError,
+    ReportNotFound,
+    parse_filters,
+    page_transactions,
+    txn_to_dict,
+    aggregate_transactions,
+    iter_csv,
+    tca_table,
+    tca_summary,
+)
+
+def _page_args():
+    filters = parse_filters(request.args)
+    limit = request.args.get("limit", current_app.config["TXN_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, current_app.config["TXN_MAX_PAGE_SIZE"]))
+    return filters, request.args.get("after") or None, limit
+
+def register_routes(app):
+    @app.errorhandler(FilterError)
+    def bad_filter(e):
+        return jsonify({"error": str(e)}), 400
+
+    @app.errorhandler(ReportNotFound)
+    def report_not_found(e):
+        return jsonify({"error": str(e)}), 404
+
+    @app.route("/transactions")
+    def list_transactions():
+        filters, after, limit = _page_args()
+        rows, next_cursor = page_transactions(filters, after=after, limit=limit)
+        return render_template(
+            "list_transactions.html",
+            rows=rows,
+            next_cursor=next_cursor,
+            args=request.args,
+        )
+
+    @app.route("/api/transactions")
+    def transactions_json():
+        filters, after, limit = _page_args()
+        rows, next_cursor = page_transactions(filters, after=after, limit=limit)
+        return jsonify({"results": [txn_to_dict(t) for t in rows], "next": next_cursor})
+
+    @app.route("/api/transactions/aggregates")
+    def transactions_aggregates():
+        filters = parse_filters(request.args)
+        group_by = request.args.get("group_by", "ccypair")
+        result = aggregate_transactions(
+            group_by,
+            filters,
+            ttl=current_app.config["TXN_AGG_CACHE_TTL"],
+            max_entries=current_app.config["TXN_AGG_CACHE_SIZE"],
+        )
+        return jsonify({"group_by": group_by, "results": result})
+
+    @app.route("/api/transactions/tca")
+    def transactions_tca():
+        tca_dir = current_app.config["TCA_DIR"]
+        group_by = request.args.get("group_by")
+        if not group_by:
+            return jsonify(tca_summary(tca_dir))
+        return jsonify({"group_by": group_by, "results": tca_table(tca_dir, group_by)})
+
+    @app.route("/transactions/export.csv")
+    def export_transactions():
+        filters = parse_filters(request.args)
+        return Response(
+            stream_with_context(iter_csv(filters)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=fx_transactions_with_rates.csv"},
+        )
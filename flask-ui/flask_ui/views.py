@@ -1,7 +1,8 @@
-from flask import render_template, request, redirect, url_for, flash
-from sqlalchemy import or_
+from flask import render_template, request, redirect, url_for, flash, jsonify, current_app
 from .extensions import db
 from .models import User
+from .search import search_page, search_users
+from .importer import validate_user_fields, parse_records, import_users
 
 def register_routes(app):
     @app.route("/")
@@ -11,26 +12,37 @@ def register_routes(app):
     @app.route("/users")
     def list_users():
         q = (request.args.get("q") or "").strip()
-        query = User.query
         if q:
-            like = f"%{q}%"
-            query = query.filter(or_(User.full_name.ilike(like), User.email.ilike(like)))
-        users = query.order_by(User.created_at.desc()).all()
+            users = search_users(q)
+        else:
+            users = User.query.order_by(User.created_at.desc()).all()
         return render_template("list_users.html", users=users, q=q)
 
+    @app.route("/users/search")
+    def search_users_json():
+        """
+        Typeahead endpoint: ?q=<text>&limit=<n>[&before=<cursor>] -> JSON list of
+        matches; pass the returned "next" as ?before= for the following page.
+        """
+        q = (request.args.get("q") or "").strip()
+        max_limit = current_app.config["USER_SEARCH_MAX_LIMIT"]
+        limit = request.args.get("limit", current_app.config["USER_SEARCH_LIMIT"], type=int)
+        limit = max(1, min(limit, max_limit))
+        before = request.args.get("before", type=int)
+        users, next_before = search_page(q, limit=limit, before=before)
+        return jsonify({
+            "q": q,
+            "results": [{"id": u.id, "full_name": u.full_name, "email": u.email} for u in users],
+            "next": next_before,
+        })
+
     @app.route("/users/new", methods=["GET", "POST"])
     def create_user():
         if request.method == "POST":
             full_name = (request.form.get("full_name") or "").strip()
             email = (request.form.get("email") or "").strip().lower()
 
-            errors = []
-            if not full_name:
-                errors.append("Full name is required.")
-            if not email:
-                errors.append("Email is required.")
-            elif "@" not in email or "." not in email.split("@")[-1]:
-                errors.append("Email format looks invalid.")
+            errors = validate_user_fields(full_name, email)
 
             if not errors and User.query.filter_by(email=email).first():
                 errors.append("A user with this email already exists.")
@@ -48,6 +60,25 @@ def register_routes(app):
 
         return render_template("create_user.html", values={})
 
+    @app.route("/users/import", methods=["POST"])
+    def import_users_bulk():
+        # Accepts a multipart "file" upload (CSV or JSON) or a raw CSV/JSON body.
+        upload = request.files.get("file")
+        if upload:
+            stream = upload.stream
+            content_type = upload.mimetype or ""
+            if (upload.filename or "").lower().endswith(".json"):
+                content_type = "application/json"
+        else:
+            stream = request.stream
+            content_type = request.mimetype or ""
+        try:
+            records = parse_records(stream, content_type)
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({"error": str(e)}), 400
+        report = import_users(records, batch_size=current_app.config["USER_IMPORT_BATCH_SIZE"])
+        return jsonify(report)
+
     @app.route("/users/<int:user_id>/delete", methods=["POST"])
     def delete_user(user_id):
         user = User.query.get_or_404(user_id)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# flask_ui is imported from this checkout, not an installed copy.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_ui import create_app  # noqa: E402
+from flask_ui.config import TestConfig  # noqa: E402
+from flask_ui.extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
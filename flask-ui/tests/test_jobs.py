@@ -0,0 +1,72 @@
+import subprocess
+import sys
+
+import pytest
+
+from flask_ui import create_app, jobs
+from flask_ui.config import TestConfig
+from flask_ui.extensions import db
+from flask_ui.models import Job
+
+
+class FileDbConfig(TestConfig):
+    """Jobs need a database shared between threads, i.e. not the in-memory one."""
+
+
+@pytest.fixture
+def file_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(FileDbConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'users.db'}", raising=False)
+    monkeypatch.setattr(FileDbConfig, "JOB_DIR", str(tmp_path / "jobs"), raising=False)
+    return create_app(FileDbConfig)
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def add_job(job_id, status, owner, **fields):
+    db.session.add(Job(id=job_id, kind="enrich", status=status, input_path="x.csv",
+                       input_hash="h", owner=owner, **fields))
+    db.session.commit()
+
+
+def test_only_jobs_of_exited_processes_are_failed(file_app):
+    host = jobs.process_owner().rpartition(":")[0]
+    with file_app.app_context():
+        add_job("live", "running", jobs.process_owner())
+        add_job("dead", "running", f"{host}:{dead_pid()}")
+        add_job("queued-dead", "queued", f"{host}:{dead_pid()}")
+        add_job("remote", "running", "some-other-host:1")
+        add_job("done", "succeeded", f"{host}:{dead_pid()}")
+
+    # a second app instance (another worker, or a CLI command) changes nothing by being created
+    create_app(FileDbConfig)
+    with file_app.app_context():
+        assert {j.id for j in Job.query.filter_by(status="failed")} == set()
+
+    file_app.test_client().get("/api/jobs")
+    with file_app.app_context():
+        status = {j.id: j.status for j in Job.query}
+    assert status == {"live": "running", "dead": "failed", "queued-dead": "failed",
+                      "remote": "running", "done": "succeeded"}
+
+
+def test_success_clears_error_and_cache_hit_keeps_input_hash(file_app, tmp_path):
+    runner = file_app.extensions["job_runner"]
+    output = tmp_path / "out.csv"
+    output.write_text("a\n")
+    runner.price_fingerprint = lambda: "prices-v1"
+    with file_app.app_context():
+        add_job("old", "succeeded", jobs.process_owner(), output_path=str(output))
+        old = db.session.get(Job, "old")
+        old.cache_key = runner.cache_key(old)
+        add_job("new", "running", jobs.process_owner(), error="stale")
+        db.session.commit()
+
+        assert runner._reuse_cached("new")
+        new = db.session.get(Job, "new")
+        db.session.refresh(new)
+        assert (new.status, new.error, new.cache_hit) == ("succeeded", None, True)
+        assert new.input_hash == "h" and new.cache_key == old.cache_key
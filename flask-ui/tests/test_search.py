@@ -0,0 +1,59 @@
+import pytest
+
+from flask_ui.extensions import db
+from flask_ui.models import User
+
+
+@pytest.fixture(params=[True, False], ids=["fts", "ilike"])
+def users(app, request):
+    with app.app_context():
+        rows = [User(full_name=f"User {i}", email=f"user{i}@example.com") for i in range(30)]
+        rows += [User(full_name=f"Jo Smith {i}", email=f"smith{i}@example.com") for i in range(8)]
+        rows += [User(full_name=f"Ann Smithers {i}", email=f"ann{i}@example.com") for i in range(12)]
+        db.session.add_all(rows)
+        db.session.commit()
+    app.extensions["user_search_fts"] = request.param and app.extensions["user_search_fts"]
+    return app
+
+
+def walk(client, q, limit):
+    ids, before, pages = [], None, 0
+    while True:
+        args = {"q": q, "limit": limit}
+        if before:
+            args["before"] = before
+        body = client.get("/users/search", query_string=args).get_json()
+        assert len(body["results"]) <= limit
+        ids += [r["id"] for r in body["results"]]
+        pages += 1
+        before = body["next"]
+        if before is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize("q, limit, expected", [
+    ("user", 7, 30),     # every match is an email prefix hit
+    ("smith", 5, 20),    # prefix (smith*@) and infix (Ann Smithers) hits
+    ("mithers", 5, 12),  # infix only
+    ("smith", 20, 20),   # exactly one full page
+])
+def test_paging_walks_every_match_once(users, client, q, limit, expected):
+    ids, pages = walk(client, q, limit)
+    assert len(ids) == len(set(ids)) == expected
+    assert pages == -(-expected // limit)
+
+
+def test_page_puts_prefix_hits_first(users, client):
+    body = client.get("/users/search", query_string={"q": "smith", "limit": 20}).get_json()
+    emails = [r["email"] for r in body["results"]]
+    prefix = [e.startswith("smith") for e in emails]
+    assert prefix == sorted(prefix, reverse=True) and sum(prefix) == 8
+
+
+def test_unpaged_search_returns_every_match(users, client):
+    with users.app_context():
+        from flask_ui.search import search_page
+
+        found, cursor = search_page("smith")
+    assert cursor is None
+    assert len(found) == len({u.id for u in found}) == 20
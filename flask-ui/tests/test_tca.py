@@ -0,0 +1,21 @@
+import pytest
+
+from flask_ui import create_app
+from flask_ui.config import TestConfig
+
+
+@pytest.fixture
+def tca_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestConfig, "TCA_DIR", str(tmp_path / "tca"))
+    return create_app(TestConfig).test_client()
+
+
+@pytest.mark.parametrize("query", ["", "?group_by=account"])
+def test_missing_report_is_not_found(tca_client, query):
+    resp = tca_client.get(f"/api/transactions/tca{query}")
+    assert resp.status_code == 404
+    assert "run fx_tca.py first" in resp.get_json()["error"]
+
+
+def test_unknown_grouping_is_a_bad_request(tca_client):
+    assert tca_client.get("/api/transactions/tca?group_by=nope").status_code == 400
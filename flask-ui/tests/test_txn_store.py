@@ -0,0 +1,27 @@
+import sqlite3
+
+from flask_ui import create_app
+from flask_ui.config import TestConfig
+from flask_ui.extensions import db
+from flask_ui.models import EnrichedTxn
+
+
+class FileStoreConfig(TestConfig):
+    """Locking only shows up with a file-backed store."""
+
+
+def test_reads_are_not_blocked_by_an_open_load(tmp_path, monkeypatch):
+    store = tmp_path / "txns.db"
+    monkeypatch.setattr(FileStoreConfig, "SQLALCHEMY_BINDS", {"txns": f"sqlite:///{store}"})
+    app = create_app(FileStoreConfig)
+
+    writer = sqlite3.connect(store, timeout=0)
+    assert writer.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    writer.execute("BEGIN EXCLUSIVE")  # what a load escalates to once it spills or commits
+    writer.execute("INSERT INTO enriched_txns (txn_number) VALUES ('pending')")
+    try:
+        with app.app_context():
+            assert db.session.query(EnrichedTxn).count() == 0
+    finally:
+        writer.rollback()
+        writer.close()
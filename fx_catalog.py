@@ -0,0 +1,129 @@
+"""
+fx_catalog.py – which ccypairs exist in fx_price, when they have data, and
+how to convert between two currencies with them.
+
+The catalog comes from the price source's coverage() (one GROUP BY over
+fx_price for ClickHouse), cached per source for a TTL, so a run (or a
+long-lived process such as the pipeline orchestrator) asks once instead of
+probing every candidate leg. Pairs become
+edges of a currency graph (AAABBB converts AAA->BBB as quoted, BBB->AAA
+inverted) and conversions are the simple paths between the two
+currencies, fewest legs first.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from fx_metrics import log
+
+CATALOG_TTL = 300
+MAX_LEGS = 3
+# Pivot currencies tried first for crosses, in order; any other pivot after these, alphabetically.
+PIVOT_PREFERENCE = ("USD", "EUR")
+
+# One conversion step: the fx_price pair and whether it is used inverted.
+Leg = namedtuple("Leg", ["pair", "invert"])
+
+
+def split_pair(pair):
+    return (pair[:3], pair[3:]) if len(pair) == 6 else None
+
+
+def path_label(path):
+    """Readable route, e.g. 'EURUSD * USDJPY' or '1/USDEUR / GBPUSD'."""
+    first, rest = path[0], path[1:]
+    label = f"1/{first.pair}" if first.invert else first.pair
+    for leg in rest:
+        label += f" {'/' if leg.invert else '*'} {leg.pair}"
+    return label
+
+
+class PairCatalog:
+    """fx_price pairs with their time coverage, plus conversion-path search over them."""
+
+    def __init__(self, coverage):
+        self.coverage = dict(coverage)
+        self._routes = {}
+        self.graph = {}
+        for pair in sorted(self.coverage):
+            ccys = split_pair(pair)
+            if ccys is None:
+                continue
+            base, quote = ccys
+            self.graph.setdefault(base, []).append((quote, Leg(pair, False)))
+            self.graph.setdefault(quote, []).append((base, Leg(pair, True)))
+
+    @classmethod
+    def load(cls, source):
+        return cls(source.coverage())
+
+    def __contains__(self, pair):
+        return pair in self.coverage
+
+    def covers(self, pair, lo_ns, hi_ns):
+        """True if pair has any ticks in [lo_ns, hi_ns]."""
+        cov = self.coverage.get(pair)
+        return cov is not None and cov.first_ns <= hi_ns and cov.last_ns >= lo_ns
+
+    def paths(self, from_ccy, to_ccy, n_legs):
+        """
+        Simple conversion paths of exactly n_legs legs, in order of
+        preference: preferred pivots first, then pairs used as quoted
+        before inverted ones.
+        """
+        out = []
+
+        def walk(ccy, path, seen):
+            if len(path) == n_legs:
+                if ccy == to_ccy:
+                    out.append(tuple(path))
+                return
+            for nxt, leg in self.graph.get(ccy, ()):
+                if nxt in seen or (nxt == to_ccy) != (len(path) == n_legs - 1):
+                    continue
+                walk(nxt, path + [leg], seen | {nxt})
+
+        walk(from_ccy, [], {from_ccy})
+
+        def pivot_rank(ccy):
+            return (PIVOT_PREFERENCE.index(ccy), "") if ccy in PIVOT_PREFERENCE else (len(PIVOT_PREFERENCE), ccy)
+
+        def key(path):
+            pivots = [split_pair(leg.pair)[0 if leg.invert else 1] for leg in path[:-1]]
+            return [pivot_rank(c) for c in pivots], [leg.invert for leg in path]
+
+        return sorted(out, key=key)
+
+    def routes(self, from_ccy, to_ccy, max_legs=MAX_LEGS):
+        """All paths of 1..max_legs legs in order of preference (fewest legs first), memoized."""
+        key = (from_ccy, to_ccy, max_legs)
+        hit = self._routes.get(key)
+        if hit is None:
+            hit = self._routes[key] = tuple(
+                p for n in range(1, max_legs + 1) for p in self.paths(from_ccy, to_ccy, n)
+            )
+        return hit
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def get_catalog(source, ttl=CATALOG_TTL):
+    """Catalog for a price source (fx_sources), reloaded at most once per ttl seconds."""
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(id(source))
+        if hit and hit[0] is source and now - hit[1] < ttl:
+            return hit[2]
+    catalog = PairCatalog.load(source)
+    log.debug("Loaded catalog of %d ccypairs.", len(catalog.coverage))
+    with _lock:
+        _cache[id(source)] = (source, now, catalog)
+    return catalog
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
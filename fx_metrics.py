@@ -0,0 +1,282 @@
+"""
+fx_metrics.py – lightweight instrumentation for the pipeline scripts.
+
+Counters, gauges and latency histograms are kept in-process and exported
+at the end of a run as a Prometheus textfile (for node_exporter's textfile
+collector) and/or a JSON run summary. Log output is leveled (-v / -q) so
+per-query chatter costs nothing unless asked for, and a cProfile dump can
+be taken with --profile.
+
+Usage in a script:
+
+    import fx_metrics as metrics
+
+    parser = argparse.ArgumentParser(...)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    with metrics.instrumented(args, job="enrich"):
+        with metrics.timer("query_seconds", ccypair=pair):
+            rows = client.execute(query)
+        metrics.inc("rows_fetched_total", len(rows), ccypair=pair)
+"""
+
+import bisect
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+
+PREFIX = "fx_pipeline_"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+log = logging.getLogger("fx_pipeline")
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_started = time.time()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with running count/sum/min/max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Bucket upper bound at quantile q (the Prometheus-style estimate)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (self.max,), self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        k = _key(name, labels)
+        _counters[k] = _counters.get(k, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    with _lock:
+        k = _key(name, labels)
+        hist = _histograms.get(k)
+        if hist is None:
+            hist = _histograms[k] = Histogram()
+        hist.observe(value)
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Record the wall time of the block into histogram `name`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a pipeline stage into stage_seconds{stage=name} and log its duration."""
+    log.debug("Stage %s started", name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        observe("stage_seconds", elapsed, stage=name)
+        log.debug("Stage %s finished in %.3fs", name, elapsed)
+
+
+def rate(name, rows, seconds, **labels):
+    """Record a throughput gauge (rows/sec) for a finished unit of work."""
+    if seconds > 0:
+        set_gauge(name, rows / seconds, **labels)
+
+
+class Sampler:
+    """Let through the 1st and then every n-th event, e.g. for per-row progress logs."""
+
+    def __init__(self, every):
+        self.every = max(int(every), 1)
+        self.n = 0
+
+    def __call__(self):
+        self.n += 1
+        return self.n == 1 or self.n % self.every == 0
+
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+        _started = time.time()
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + inner + "}"
+
+
+def prometheus_text():
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for kind, store in (("counter", _counters), ("gauge", _gauges)):
+            seen = set()
+            for (name, labels), value in sorted(store.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    seen.add(name)
+                lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {value}")
+        seen = set()
+        for (name, labels), hist in sorted(_histograms.items(), key=lambda kv: kv[0]):
+            if name not in seen:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                seen.add(name)
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {hist.count}")
+            lines.append(f"{PREFIX}{name}_sum{_fmt_labels(labels)} {hist.sum}")
+            lines.append(f"{PREFIX}{name}_count{_fmt_labels(labels)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """JSON-friendly run summary: counters, gauges and histogram statistics."""
+    def label_str(labels):
+        return ",".join(f"{k}={v}" for k, v in labels)
+
+    with _lock:
+        out = {
+            "started_at": _started,
+            "elapsed_seconds": time.time() - _started,
+            "counters": {},
+            "gauges": {},
+            "histograms": {},
+        }
+        for (name, labels), value in sorted(_counters.items()):
+            out["counters"].setdefault(name, {})[label_str(labels)] = value
+        for (name, labels), value in sorted(_gauges.items()):
+            out["gauges"].setdefault(name, {})[label_str(labels)] = value
+        for (name, labels), hist in sorted(_histograms.items(), key=lambda kv: kv[0]):
+            out["histograms"].setdefault(name, {})[label_str(labels)] = {
+                "count": hist.count,
+                "sum": hist.sum,
+                "min": hist.min,
+                "max": hist.max,
+                "mean": hist.sum / hist.count if hist.count else None,
+                "p50": hist.quantile(0.5),
+                "p95": hist.quantile(0.95),
+                "p99": hist.quantile(0.99),
+            }
+    return out
+
+
+def _atomic_write(path, text):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_prometheus(path):
+    """Write the textfile atomically so the collector never reads a partial file."""
+    _atomic_write(path, prometheus_text())
+
+
+def write_summary(path):
+    _atomic_write(path, json.dumps(summary(), indent=2) + "\n")
+
+
+def configure_logging(verbosity=0):
+    """-q -> warnings only, default -> progress (INFO), -v -> per-query detail (DEBUG)."""
+    level = logging.INFO
+    if verbosity > 0:
+        level = logging.DEBUG
+    elif verbosity < 0:
+        level = logging.WARNING
+    log.setLevel(level)
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+
+
+def add_arguments(parser):
+    """Add the shared -v/-q, metrics export and --profile options to a script's parser."""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("-v", "--verbose", action="count", default=0, help="More log output (per-query detail).")
+    group.add_argument("-q", "--quiet", action="count", default=0, help="Only log warnings and errors.")
+    group.add_argument("--metrics-prom", metavar="PATH", help="Write a Prometheus textfile with run metrics.")
+    group.add_argument("--metrics-json", metavar="PATH", help="Write a JSON run summary.")
+    group.add_argument("--profile", metavar="PATH", help="Run under cProfile and dump stats to PATH.")
+    return parser
+
+
+@contextlib.contextmanager
+def instrumented(args, job):
+    """
+    Wrap a script run: configure logging, optionally profile, time the whole
+    run as stage "total" and export metrics on the way out (also on failure).
+    """
+    configure_logging(getattr(args, "verbose", 0) - getattr(args, "quiet", 0))
+    set_gauge("run_start_timestamp_seconds", time.time(), job=job)
+    profiler = cProfile.Profile() if getattr(args, "profile", None) else None
+    ok = False
+    try:
+        if profiler:
+            profiler.enable()
+        with stage("total"):
+            yield
+        ok = True
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            log.info("cProfile stats written to %s", args.profile)
+        set_gauge("run_success", int(ok), job=job)
+        set_gauge("run_end_timestamp_seconds", time.time(), job=job)
+        if getattr(args, "metrics_prom", None):
+            write_prometheus(args.metrics_prom)
+        if getattr(args, "metrics_json", None):
+            write_summary(args.metrics_json)
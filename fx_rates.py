@@ -0,0 +1,238 @@
+"""
+fx_rates.py – shared access to the fx_price table.
+
+One connection factory, configured from clickhouse.properties, and
+time-bounded, column-projected queries that come back as NumPy arrays or
+DataFrames. fetch_columns()/fetch_frame() read in columnar mode, without
+building per-row Python tuples. Long ranges can be streamed in blocks with
+iter_frames(), so memory is bounded by the block size rather than the
+range; the driver only streams rows, so each block is transposed from row
+tuples there.
+
+Usage:
+
+    import fx_rates
+
+    client = fx_rates.connect()
+    cols = fx_rates.fetch_columns(client, "EURUSD", start, end, columns=("timestamp", "bids", "asks"))
+    df = fx_rates.fetch_frame(client, ["EURUSD", "USDJPY"], start, end)
+    for block in fx_rates.iter_frames(client, "EURUSD", start, end, block_rows=100_000):
+        ...
+"""
+
+import configparser
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from clickhouse_driver import Client
+
+import fx_metrics as metrics
+from fx_metrics import log
+
+PROPERTIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clickhouse.properties")
+DEFAULTS = {
+    "host": "localhost",
+    "port": "9000",
+    "user": "default",
+    "password": "default",
+    "database": "default",
+}
+TABLE = os.getenv("FX_PRICE_TABLE", "fx_price")
+COLUMNS = ("timestamp", "date", "bids", "asks", "qtys", "ccypair", "quoteId", "name")
+TICK_COLUMNS = ("timestamp", "bids", "asks", "qtys")
+BLOCK_ROWS = 65536
+
+# Time range (int64 ns, inclusive) and row count of one ccypair in fx_price.
+Coverage = namedtuple("Coverage", ["first_ns", "last_ns", "rows"])
+
+
+def load_config(path=PROPERTIES_FILE):
+    """
+    Connection settings from a key=value properties file (no sections;
+    '#' comments allowed), over DEFAULTS. CLICKHOUSE_<KEY> environment
+    variables win over both.
+    """
+    config = dict(DEFAULTS)
+    if path and os.path.exists(path):
+        parser = configparser.ConfigParser(interpolation=None)
+        with open(path, encoding="utf-8") as f:
+            parser.read_string("[clickhouse]\n" + f.read())
+        config.update({k: v for k, v in parser["clickhouse"].items() if v != ""})
+    for key in DEFAULTS:
+        value = os.environ.get(f"CLICKHOUSE_{key.upper()}")
+        if value:
+            config[key] = value
+    return config
+
+
+def connect(path=PROPERTIES_FILE, **overrides):
+    """New ClickHouse client from clickhouse.properties (plus keyword overrides)."""
+    config = load_config(path)
+    config.update({k: str(v) for k, v in overrides.items()})
+    log.debug("Connecting to ClickHouse at %s:%s...", config["host"], config["port"])
+    client = Client(
+        host=config["host"],
+        port=int(config["port"]),
+        user=config["user"],
+        password=config["password"],
+        database=config["database"],
+    )
+    return client
+
+
+def _ts_param(value):
+    return pd.Timestamp(value).isoformat(sep=" ")
+
+
+def _check_columns(columns):
+    columns = tuple(columns)
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown fx_price column(s): {', '.join(sorted(unknown))}")
+    return columns
+
+
+def build_query(ccypairs, start=None, end=None, columns=TICK_COLUMNS, order="ASC", limit=None, table=TABLE):
+    """
+    SELECT for one or more ccypairs over [start, end). Either bound may be
+    None. Returns (query, params) for client-side parameter substitution.
+    """
+    columns = _check_columns(columns)
+    if order not in ("ASC", "DESC"):
+        raise ValueError("order must be ASC or DESC")
+    if isinstance(ccypairs, str):
+        ccypairs = [ccypairs]
+    where = ["ccypair IN %(ccypairs)s"]
+    params = {"ccypairs": tuple(ccypairs)}
+    if start is not None:
+        where.append("timestamp >= toDateTime64(%(start)s, 9)")
+        params["start"] = _ts_param(start)
+    if end is not None:
+        where.append("timestamp < toDateTime64(%(end)s, 9)")
+        params["end"] = _ts_param(end)
+    query = f"""
+    SELECT {', '.join(columns)}
+    FROM {table}
+    WHERE {' AND '.join(where)}
+    ORDER BY timestamp {order}
+    """
+    if limit is not None:
+        query += f"LIMIT {int(limit)}\n"
+    return query, params
+
+
+def _to_array(name, values):
+    if name == "timestamp":
+        return np.array(values, dtype="datetime64[ns]")
+    if name in ("bids", "asks", "qtys"):
+        out = np.empty(len(values), dtype=object)
+        out[:] = list(values)
+        return out
+    return np.asarray(values)
+
+
+def build_since_query(since, columns=TICK_COLUMNS, limit=None, table=TABLE):
+    """
+    SELECT of the rows past each ccypair's own high-water mark, oldest first
+    across all pairs. since is {ccypair: timestamp}. Every row returned is
+    new to its pair, so with a LIMIT a busy pair cannot crowd a lagging one
+    out of the poll forever. Returns (query, params).
+    """
+    columns = _check_columns(columns)
+    pairs = sorted(since)
+    params = {"ccypairs": tuple(pairs), "since": _ts_param(min(since.values()))}
+    per_pair = []
+    for i, pair in enumerate(pairs):
+        per_pair.append(f"(ccypair = %(p{i})s AND timestamp > toDateTime64(%(t{i})s, 9))")
+        params[f"p{i}"] = pair
+        params[f"t{i}"] = _ts_param(since[pair])
+    # the IN / lower bound let the primary key prune before the per-pair test
+    query = f"""
+    SELECT {', '.join(columns)}
+    FROM {table}
+    WHERE ccypair IN %(ccypairs)s AND timestamp > toDateTime64(%(since)s, 9)
+      AND ({' OR '.join(per_pair)})
+    ORDER BY timestamp ASC
+    """
+    if limit is not None:
+        query += f"LIMIT {int(limit)}\n"
+    return query, params
+
+
+def query_label(ccypairs):
+    """Metric label for a query: the pair itself, or "*multi" for several (keeps label cardinality bounded)."""
+    if isinstance(ccypairs, str):
+        return ccypairs
+    return ccypairs[0] if len(ccypairs) == 1 else "*multi"
+
+
+def fetch_columns(client, ccypairs, start=None, end=None, columns=TICK_COLUMNS, order="ASC", limit=None, table=TABLE):
+    """
+    Run a bounded query in columnar mode -> {column: np.ndarray}. Timestamps
+    are datetime64[ns]; array columns are object arrays of per-row lists.
+    """
+    query, params = build_query(ccypairs, start, end, columns, order, limit, table)
+    log.debug("Querying %s for %s from %s to %s...", table, ccypairs, start, end)
+    return _execute_columnar(client, query, params, columns, ccypairs)
+
+
+def fetch_since(client, since, columns=TICK_COLUMNS, limit=None, table=TABLE):
+    """Rows past each pair's high-water mark (see build_since_query) -> {column: np.ndarray}."""
+    query, params = build_since_query(since, columns, limit, table)
+    log.debug("Polling %s for %d pair(s) past their high-water marks...", table, len(since))
+    return _execute_columnar(client, query, params, columns, sorted(since))
+
+
+def _execute_columnar(client, query, params, columns, ccypairs):
+    label = query_label(ccypairs)
+    with metrics.timer("query_seconds", ccypair=label):
+        data = client.execute(query, params, columnar=True)
+    n = len(data[0]) if data else 0
+    metrics.inc("queries_total", ccypair=label)
+    metrics.inc("rows_fetched_total", n, ccypair=label)
+    log.debug("Found %d rows for %s.", n, ccypairs)
+    if not data:
+        data = [[] for _ in columns]
+    return {name: _to_array(name, values) for name, values in zip(columns, data)}
+
+
+def fetch_frame(client, ccypairs, start=None, end=None, columns=COLUMNS, order="ASC", limit=None):
+    """fetch_columns() as a DataFrame."""
+    return pd.DataFrame(fetch_columns(client, ccypairs, start, end, columns, order, limit), columns=list(columns))
+
+
+def iter_frames(client, ccypairs, start=None, end=None, columns=COLUMNS, order="ASC", block_rows=BLOCK_ROWS):
+    """
+    Stream a range as DataFrames of at most block_rows rows. Rows are read
+    with execute_iter, so only the current block is held in memory; the
+    driver yields them as row tuples (execute_iter has no columnar mode),
+    and each block is transposed into columns once. Use fetch_columns()
+    when the range fits in memory: it skips the per-row tuples.
+    """
+    query, params = build_query(ccypairs, start, end, columns, order)
+    settings = {"max_block_size": block_rows}
+    label = query_label(ccypairs)
+    total = 0
+    for chunk in client.execute_iter(query, params, settings=settings, chunk_size=block_rows):
+        total += len(chunk)
+        metrics.inc("rows_fetched_total", len(chunk), ccypair=label)
+        cols = list(zip(*chunk)) if chunk else [[] for _ in columns]
+        yield pd.DataFrame({name: _to_array(name, values) for name, values in zip(columns, cols)},
+                           columns=list(columns))
+    metrics.inc("queries_total", ccypair=label)
+    log.debug("Streamed %d rows for %s.", total, ccypairs)
+
+
+def fetch_coverage(client, table=TABLE):
+    """{ccypair: Coverage(first_ns, last_ns, rows)} for every pair in fx_price."""
+    query = f"""
+    SELECT ccypair, min(timestamp), max(timestamp), count()
+    FROM {table}
+    GROUP BY ccypair
+    """
+    with metrics.timer("query_seconds", ccypair="*catalog"):
+        rows = client.execute(query)
+    metrics.inc("queries_total", ccypair="*catalog")
+    return {pair: Coverage(pd.Timestamp(lo).value, pd.Timestamp(hi).value, n) for pair, lo, hi, n in rows}
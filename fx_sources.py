@@ -0,0 +1,337 @@
+"""
+fx_sources.py – interchangeable price sources for the enrichment.
+
+Every source serves the same calls:
+
+    fetch_range(ccypair, start, end, columns)  bulk [start, end) read -> {column: array}
+    window(ccypair, end, window)               the [end - window, end) slice
+    coverage()                                 {ccypair: Coverage} for the pair catalog
+
+`timestamp` always comes back as datetime64[ns]. bids/asks/qtys come back
+either as an (n, depth) float matrix (Parquet with fixed depth, memory) or
+as an object array of per-tick sequences (ClickHouse); level_matrix() in
+fx_transactions_with_rates.py accepts both.
+
+Backends, chosen with a spec string (--source, or FX_PRICE_SOURCE):
+
+    clickhouse       fx_price via fx_rates (default)
+    parquet:DIR      one DIR/<CCYPAIR>.parquet per pair, sorted by timestamp (needs pyarrow)
+    memory[:seed=N]  the synthetic hour from insert_fx_price_data.py, held in NumPy arrays;
+                     the same prices for the same seed (default 0)
+
+A Parquet store for replays and backtests can be exported from any source:
+
+    python fx_sources.py export --to data/ticks --start "2025-07-22 01:00" --end "2025-07-22 02:00"
+
+`python fx_sources.py fingerprint` prints a hash of the configured source
+and its coverage; flask-ui keys its cached enrichment results on it.
+"""
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import fx_metrics as metrics
+import fx_rates
+from fx_metrics import log
+from fx_rates import Coverage, TICK_COLUMNS
+
+DEFAULT_SOURCE = os.getenv("FX_PRICE_SOURCE", "clickhouse")
+ARRAY_COLUMNS = ("bids", "asks", "qtys")
+
+
+def _ns(value):
+    return None if value is None else pd.Timestamp(value).value
+
+
+class PriceSource:
+    """Base class: subclasses implement fetch_range() and coverage()."""
+
+    name = "base"
+
+    def fetch_range(self, ccypair, start=None, end=None, columns=TICK_COLUMNS):
+        raise NotImplementedError
+
+    def coverage(self):
+        raise NotImplementedError
+
+    def window(self, ccypair, end, window, columns=TICK_COLUMNS):
+        end = pd.Timestamp(end)
+        return self.fetch_range(ccypair, end - window, end, columns)
+
+    def pairs(self):
+        return sorted(self.coverage())
+
+    def _timed(self, ccypair, fetch):
+        with metrics.timer("query_seconds", ccypair=ccypair, source=self.name):
+            cols = fetch()
+        n = len(next(iter(cols.values()))) if cols else 0
+        metrics.inc("queries_total", ccypair=ccypair, source=self.name)
+        metrics.inc("rows_fetched_total", n, ccypair=ccypair, source=self.name)
+        return cols
+
+
+class ClickHouseSource(PriceSource):
+    """fx_price in ClickHouse, through fx_rates' bounded, columnar queries."""
+
+    name = "clickhouse"
+
+    def __init__(self, client=None):
+        self.client = client or fx_rates.connect()
+
+    def fetch_range(self, ccypair, start=None, end=None, columns=TICK_COLUMNS):
+        return fx_rates.fetch_columns(self.client, ccypair, start, end, columns=columns)
+
+    def coverage(self):
+        return fx_rates.fetch_coverage(self.client)
+
+
+class MemorySource(PriceSource):
+    """
+    Ticks held in NumPy arrays per ccypair (timestamps as int64 ns, levels as
+    (n, depth) matrices); ranges are two binary searches and array slices.
+    """
+
+    name = "memory"
+
+    def __init__(self, data):
+        # data: {ccypair: {column: array}}, each sorted by timestamp
+        self.data = {}
+        for pair, cols in data.items():
+            ts = np.asarray(cols["timestamp"], dtype="datetime64[ns]").astype(np.int64)
+            order = np.argsort(ts, kind="stable")
+            stored = {"timestamp": ts[order]}
+            for name, values in cols.items():
+                if name != "timestamp":
+                    stored[name] = _as_matrix(values)[order] if name in ARRAY_COLUMNS else np.asarray(values)[order]
+            self.data[pair] = stored
+
+    @classmethod
+    def from_rows(cls, rows):
+        """From fx_price-shaped tuples (timestamp, date, bids, asks, qtys, ccypair, ...)."""
+        by_pair = {}
+        for r in rows:
+            by_pair.setdefault(r[5], []).append(r)
+        return cls({
+            pair: {
+                "timestamp": [r[0] for r in rs],
+                "bids": [r[2] for r in rs],
+                "asks": [r[3] for r in rs],
+                "qtys": [r[4] for r in rs],
+            }
+            for pair, rs in by_pair.items()
+        })
+
+    @classmethod
+    def synthetic(cls, seed=0):
+        """The hour of ticks insert_fx_price_data.py would insert (seeded), without ClickHouse."""
+        import insert_fx_price_data
+
+        return cls.from_rows(insert_fx_price_data.generate_rows(seed))
+
+    @classmethod
+    def from_source(cls, source, pairs=None, start=None, end=None):
+        """Load a range from another source once, e.g. for repeated backtests."""
+        return cls({p: source.fetch_range(p, start, end) for p in (pairs or source.pairs())})
+
+    def fetch_range(self, ccypair, start=None, end=None, columns=TICK_COLUMNS):
+        def fetch():
+            stored = self.data.get(ccypair)
+            if stored is None:
+                return {c: np.empty(0, dtype="datetime64[ns]" if c == "timestamp" else float) for c in columns}
+            ts = stored["timestamp"]
+            lo = 0 if start is None else np.searchsorted(ts, _ns(start), side="left")
+            hi = len(ts) if end is None else np.searchsorted(ts, _ns(end), side="left")
+            out = {c: stored[c][lo:hi] for c in columns if c != "timestamp"}
+            if "timestamp" in columns:
+                out["timestamp"] = ts[lo:hi].view("datetime64[ns]")
+            return {c: out[c] for c in columns}
+
+        return self._timed(ccypair, fetch)
+
+    def coverage(self):
+        return {
+            pair: Coverage(int(cols["timestamp"][0]), int(cols["timestamp"][-1]), len(cols["timestamp"]))
+            for pair, cols in self.data.items() if len(cols["timestamp"])
+        }
+
+
+def _as_matrix(values):
+    """(n, depth) float matrix from per-tick level sequences, NaN-padded when ragged."""
+    if isinstance(values, np.ndarray) and values.ndim == 2:
+        return values.astype(float, copy=False)
+    values = list(values)
+    depth = max((len(v) for v in values if v is not None), default=0)
+    out = np.full((len(values), depth), np.nan)
+    for i, v in enumerate(values):
+        if v is not None:
+            out[i, :len(v)] = v
+    return out
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The parquet price source needs pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+class ParquetSource(PriceSource):
+    """
+    Local tick store: DIR/<CCYPAIR>.parquet, sorted by timestamp. Range reads
+    push the timestamp bounds down as Parquet filters, so only the row
+    groups overlapping the range are decoded, and only the requested columns.
+    """
+
+    name = "parquet"
+
+    def __init__(self, path):
+        self.pa = _require_pyarrow()
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Parquet tick store not found: {path}")
+        self.path = path
+
+    def _file(self, ccypair):
+        return os.path.join(self.path, f"{ccypair}.parquet")
+
+    def fetch_range(self, ccypair, start=None, end=None, columns=TICK_COLUMNS):
+        pq = self.pa.parquet
+
+        def fetch():
+            path = self._file(ccypair)
+            if not os.path.exists(path):
+                return {c: np.empty(0, dtype="datetime64[ns]" if c == "timestamp" else float) for c in columns}
+            filters = []
+            if start is not None:
+                filters.append(("timestamp", ">=", pd.Timestamp(start)))
+            if end is not None:
+                filters.append(("timestamp", "<", pd.Timestamp(end)))
+            table = pq.read_table(path, columns=list(columns), filters=filters or None)
+            return {c: self._column(table.column(c), c) for c in columns}
+
+        return self._timed(ccypair, fetch)
+
+    def _column(self, column, name):
+        if name == "timestamp":
+            return column.to_numpy().astype("datetime64[ns]")
+        if name not in ARRAY_COLUMNS:
+            return column.to_numpy()
+        arr = column.combine_chunks()
+        n = len(arr)
+        if n and arr.null_count == 0:
+            lengths = np.diff(arr.offsets.to_numpy())
+            if (lengths == lengths[0]).all():
+                return arr.flatten().to_numpy(zero_copy_only=False).astype(float).reshape(n, lengths[0])
+        return _as_matrix(arr.to_pylist())
+
+    def coverage(self):
+        pq = self.pa.parquet
+        out = {}
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".parquet"):
+                continue
+            meta = pq.ParquetFile(os.path.join(self.path, name)).metadata
+            if not meta.num_rows:
+                continue
+            idx = meta.schema.to_arrow_schema().get_field_index("timestamp")
+            lo = hi = None
+            for i in range(meta.num_row_groups):
+                stats = meta.row_group(i).column(idx).statistics
+                if stats is None or not stats.has_min_max:
+                    lo = hi = None
+                    break
+                lo = stats.min if lo is None else min(lo, stats.min)
+                hi = stats.max if hi is None else max(hi, stats.max)
+            if lo is None:  # no statistics: read the column
+                ts = pq.read_table(os.path.join(self.path, name), columns=["timestamp"]).column(0).to_numpy()
+                lo, hi = ts.min(), ts.max()
+            out[name[:-len(".parquet")]] = Coverage(_ns(lo), _ns(hi), meta.num_rows)
+        return out
+
+
+def write_parquet(source, path, pairs=None, start=None, end=None, row_group_size=65536):
+    """Export [start, end) of each pair from source to path/<CCYPAIR>.parquet; returns rows written."""
+    pa = _require_pyarrow()
+    os.makedirs(path, exist_ok=True)
+    total = 0
+    for pair in pairs or source.pairs():
+        cols = source.fetch_range(pair, start, end, TICK_COLUMNS)
+        arrays = {"timestamp": pa.array(cols["timestamp"].astype("datetime64[ns]"))}
+        for name in ARRAY_COLUMNS:
+            m = _as_matrix(cols[name])
+            if np.isnan(m).any() or m.shape[1] == 0:
+                arrays[name] = pa.array([row[~np.isnan(row)] for row in m], type=pa.list_(pa.float64()))
+            else:
+                offsets = np.arange(0, m.size + 1, m.shape[1], dtype=np.int32)
+                arrays[name] = pa.ListArray.from_arrays(offsets, m.ravel())
+        table = pa.table(arrays)
+        pa.parquet.write_table(table, os.path.join(path, f"{pair}.parquet"), row_group_size=row_group_size)
+        total += table.num_rows
+        log.info("Wrote %d ticks for %s.", table.num_rows, pair)
+    return total
+
+
+def open_source(spec=None):
+    """Price source from a spec: clickhouse, parquet:DIR or memory[:seed=N]."""
+    spec = spec or DEFAULT_SOURCE
+    kind, _, arg = spec.partition(":")
+    if kind == "clickhouse":
+        return ClickHouseSource()
+    if kind == "parquet":
+        return ParquetSource(arg or "ticks")
+    if kind == "memory":
+        key, _, value = arg.partition("=")
+        if arg and (key != "seed" or not value.lstrip("-").isdigit()):
+            raise ValueError(f"Bad memory source option {arg!r} (use memory:seed=N).")
+        return MemorySource.synthetic(int(value) if arg else 0)
+    raise ValueError(f"Unknown price source {spec!r} (use clickhouse, parquet:DIR or memory[:seed=N]).")
+
+
+def fingerprint(spec=None):
+    """
+    sha256 over the source spec (and table, for ClickHouse) and every pair's
+    coverage (first/last tick, row count): it changes when ticks are added or
+    removed or another source is configured.
+    """
+    spec = spec or DEFAULT_SOURCE
+    source = open_source(spec)
+    h = hashlib.sha256(spec.encode())
+    if source.name == "clickhouse":
+        h.update(f"|{fx_rates.TABLE}".encode())
+    for pair, cov in sorted(source.coverage().items()):
+        h.update(f"|{pair} {cov.first_ns} {cov.last_ns} {cov.rows}".encode())
+    return h.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price-source utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export ticks from a source into a Parquet tick store.")
+    export.add_argument("--source", default=DEFAULT_SOURCE, help="Source spec to read (default: %(default)s).")
+    export.add_argument("--to", required=True, help="Output directory for <CCYPAIR>.parquet files.")
+    export.add_argument("--pairs", help="Comma-separated ccypairs (default: every pair in the source).")
+    export.add_argument("--start", type=pd.Timestamp, help="Inclusive start timestamp.")
+    export.add_argument("--end", type=pd.Timestamp, help="Exclusive end timestamp.")
+    fp = sub.add_parser("fingerprint", help="Print a hash of the source and its coverage.")
+    fp.add_argument("--source", default=DEFAULT_SOURCE, help="Source spec (default: %(default)s).")
+    for p in (export, fp):
+        metrics.add_arguments(p)
+    args = parser.parse_args(argv)
+
+    with metrics.instrumented(args, job="sources"):
+        if args.command == "fingerprint":
+            print(fingerprint(args.source))
+            return
+        source = open_source(args.source)
+        pairs = [p.strip().upper() for p in args.pairs.split(",")] if args.pairs else None
+        total = write_parquet(source, args.to, pairs, args.start, args.end)
+        log.info("Exported %d ticks to %s.", total, args.to)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+fx_stream_enrich.py – long-running, low-latency enrichment of a trade stream.
+
+Transactions arrive as JSON lines (stdin, or *.jsonl files dropped into a
+watched directory) and each one is written back out, as soon as it is
+read, with the same band columns the batch enrichment produces. Instead of
+querying fx_price per trade, a background poller fetches new ticks past a
+per-pair high-water timestamp every --poll-ms and appends the selected book
+level to an in-memory ring buffer per ccypair; a trade is then priced from
+the ring alone, so the per-trade cost is a couple of binary searches and a
+min/max over the window.
+
+Tick sources:
+    clickhouse  incremental polling of fx_price (default)
+    file        replay ticks from a JSONL file (timestamp, ccypair, bids, asks)
+    synthetic   random-walk ticks around the insert_fx_price_data.py base
+                prices, stamped with the wall clock - a local stand-in for
+                trying the stream without ClickHouse
+
+Usage:
+    python fx_stream_enrich.py < trades.jsonl > enriched.jsonl
+    python fx_stream_enrich.py --watch-dir incoming/ --output enriched.jsonl
+    python fx_stream_enrich.py --source file --ticks-file ticks.jsonl --once < trades.jsonl
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import fx_catalog
+import fx_metrics as metrics
+import fx_rates
+from fx_metrics import log
+from fx_rates import Coverage
+from fx_transactions_with_rates import (
+    TRADE_TIME_FORMAT, USD, WINDOW, Ticks, determine_used_bid, oriented, path_series, window_bands,
+)
+
+DEFAULT_LEVEL = 1
+RING_CAPACITY = 65536   # ticks kept per ccypair (~18h of 1-second ticks)
+POLL_MS = 50
+POLL_LIMIT = 50000
+BACKFILL_SECONDS = 300  # history loaded for a pair before the first trade that needs it
+BAND_COLUMNS = ['bid_max', 'bid_min', 'ask_max', 'ask_min']
+DEBUG_EVERY = 100       # per-poll / per-trade debug lines: the 1st and then every n-th
+
+
+class TickRing:
+    """
+    Fixed-capacity buffer of (timestamp ns, bid, ask) for one ccypair; the
+    oldest tick is overwritten once it is full. Every tick is stored twice,
+    at i and i + capacity, so the live ticks are always the contiguous slice
+    [start, start + size) and window lookups are plain numpy views.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self.ts = np.zeros(2 * capacity, dtype=np.int64)
+        self.bid = np.full(2 * capacity, np.nan)
+        self.ask = np.full(2 * capacity, np.nan)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def last_ts(self):
+        return int(self.ts[self.start + self.size - 1]) if self.size else None
+
+    def first_ts(self):
+        return int(self.ts[self.start]) if self.size else None
+
+    def append(self, ts, bid, ask):
+        """Add a tick; ticks not newer than the last one are dropped."""
+        if self.size and ts <= self.ts[self.start + self.size - 1]:
+            return False
+        if self.size < self.capacity:
+            i = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        for j in (i, i + self.capacity):
+            self.ts[j] = ts
+            self.bid[j] = bid
+            self.ask[j] = ask
+        return True
+
+    def window(self, lo, hi):
+        """Ticks with lo <= ts < hi as a Ticks of (n, 1) level matrices (views)."""
+        ts = self.ts[self.start:self.start + self.size]
+        a, b = np.searchsorted(ts, [lo, hi], side='left')
+        sl = slice(self.start + a, self.start + b)
+        bid = self.bid[sl][:, None]
+        return Ticks(self.ts[sl], bid, self.ask[sl][:, None], np.full_like(bid, np.nan))
+
+
+def _level(values, level):
+    values = list(values or [])
+    v = float(values[level]) if level < len(values) else math.nan
+    return math.nan if v == 0 else v
+
+
+def _to_ns(value):
+    return int(pd.Timestamp(value).value)
+
+
+class ClickHouseTickSource:
+    """Incremental fx_price reader: only rows past each pair's high-water mark."""
+
+    def __init__(self, client, limit=POLL_LIMIT):
+        self.client = client
+        self.limit = limit
+
+    def fetch(self, since):
+        """
+        since: {ccypair: ns}. Returns [(ts_ns, ccypair, bids, asks)] ordered by
+        timestamp. Each pair is read from its own high-water mark, so all of
+        the (at most limit) rows are new and a pair that lags far behind the
+        others still advances on every poll.
+        """
+        if not since:
+            return []
+        with metrics.timer("poll_query_seconds"):
+            cols = fx_rates.fetch_since(self.client, {p: pd.Timestamp(ns) for p, ns in since.items()},
+                                        columns=("timestamp", "ccypair", "bids", "asks"), limit=self.limit)
+        ts = cols["timestamp"].astype(np.int64)
+        return [(int(t), pair, bids, asks)
+                for t, pair, bids, asks in zip(ts, cols["ccypair"], cols["bids"], cols["asks"])
+                if t > since[pair]]
+
+    def coverage(self):
+        return fx_rates.fetch_coverage(self.client)
+
+
+class MemoryTickSource:
+    """Serves a fixed, in-memory list of ticks as if they were arriving incrementally."""
+
+    def __init__(self, rows):
+        self.rows = {}
+        for ts, pair, bids, asks in sorted(rows, key=lambda r: r[0]):
+            self.rows.setdefault(pair, ([], []))
+            self.rows[pair][0].append(ts)
+            self.rows[pair][1].append((ts, pair, bids, asks))
+
+    @classmethod
+    def from_jsonl(cls, path):
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    r = json.loads(line)
+                    rows.append((_to_ns(r["timestamp"]), r["ccypair"], r.get("bids"), r.get("asks")))
+        return cls(rows)
+
+    def fetch(self, since):
+        out = []
+        for pair, hw in since.items():
+            ts, rows = self.rows.get(pair, ([], []))
+            out.extend(rows[np.searchsorted(ts, hw, side='right'):])
+        out.sort(key=lambda r: r[0])
+        return out
+
+    def coverage(self):
+        return {pair: Coverage(ts[0], ts[-1], len(ts)) for pair, (ts, _) in self.rows.items() if ts}
+
+
+class SyntheticTickSource:
+    """
+    Random-walk ticks every tick_ms up to the wall clock, for the pairs in
+    insert_fx_price_data.py. Stands in for a live fx_price feed.
+    """
+
+    def __init__(self, tick_ms=100, seed=None):
+        from insert_fx_price_data import asks_base, bids_base, ccypairs
+
+        self.step = int(tick_ms * 1e6)
+        self.mid = {p: (b + a) / 2 for p, b, a in zip(ccypairs, bids_base, asks_base)}
+        self.spread = {p: (a - b) / 2 for p, b, a in zip(ccypairs, bids_base, asks_base)}
+        self.rng = random.Random(seed)
+
+    def fetch(self, since):
+        now = time.time_ns()
+        out = []
+        for pair, hw in since.items():
+            if pair not in self.mid:
+                continue
+            t = (hw // self.step + 1) * self.step
+            t = max(t, now - 60 * 10**9)  # don't backfill more than a minute
+            while t <= now:
+                mid = self.mid[pair] = self.mid[pair] * (1 + self.rng.gauss(0, 2e-5))
+                half = self.spread[pair]
+                bids = [round(mid - half - 0.0001 * j, 6) for j in range(3)]
+                asks = [round(mid + half + 0.0001 * j, 6) for j in range(3)]
+                out.append((t, pair, bids, asks))
+                t += self.step
+        out.sort(key=lambda r: r[0])
+        return out
+
+    def coverage(self):
+        # ticks are made up on demand at any time
+        return {pair: Coverage(0, np.iinfo(np.int64).max, 0) for pair in self.mid}
+
+
+class TickPoller:
+    """
+    Keeps one TickRing per tracked ccypair up to date from a tick source,
+    in a background thread. A pair is tracked from the first trade that
+    needs it; that trade waits for one synchronous fetch so it is priced
+    from the pair's history rather than an empty ring.
+    """
+
+    def __init__(self, source, level=DEFAULT_LEVEL, capacity=RING_CAPACITY, interval=POLL_MS / 1000,
+                 backfill_ns=BACKFILL_SECONDS * 10**9):
+        self.source = source
+        self.backfill_ns = backfill_ns
+        self.level = level
+        self.capacity = capacity
+        self.interval = interval
+        self.rings = {}
+        self.high_water = {}
+        self.covered_from = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.debug_sample = metrics.Sampler(DEBUG_EVERY)
+
+    def track(self, pairs, since_ns):
+        """
+        Make sure pairs are tracked with history from at least since_ns.
+        Returns False when a pair was already tracked from a later time, i.e.
+        the trade is older than the buffered history (a late trade).
+        """
+        new = [p for p in pairs if p not in self.high_water]
+        if new:
+            start = since_ns - self.backfill_ns
+            with self.lock:
+                for p in new:
+                    self.rings[p] = TickRing(self.capacity)
+                    self.high_water[p] = self.covered_from[p] = start
+            self.poll(new)
+        with self.lock:
+            return all(self._coverage(p) <= since_ns for p in pairs)
+
+    def _coverage(self, pair):
+        ring = self.rings[pair]
+        # Once the ring has wrapped, its oldest tick bounds the history still held.
+        return ring.first_ts() if len(ring) == ring.capacity else self.covered_from[pair]
+
+    def poll(self, pairs=None):
+        with self.lock:
+            since = {p: self.high_water[p] for p in (pairs or self.high_water)}
+        if not since:
+            return 0
+        rows = self.source.fetch(since)
+        added = 0
+        with self.lock:
+            for ts, pair, bids, asks in rows:
+                ring = self.rings.get(pair)
+                if ring is not None and ring.append(ts, _level(bids, self.level), _level(asks, self.level)):
+                    added += 1
+                    self.high_water[pair] = max(self.high_water[pair], ts)
+        metrics.inc("ticks_buffered_total", added)
+        if added and self.debug_sample():
+            log.debug("Buffered %d new ticks (poll %d).", added, self.debug_sample.n)
+        return added
+
+    def windows(self, pairs, lo, hi):
+        """Snapshot of each pair's ticks in [lo, hi) (copies, safe to use outside the lock)."""
+        with self.lock:
+            return {p: Ticks(*(a.copy() for a in self.rings[p].window(lo, hi))) for p in pairs}
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                metrics.inc("poll_errors_total")
+                log.exception("Tick poll failed; retrying in %.3fs.", self.interval)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="tick-poller", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+
+def parse_trade_time(value):
+    if value is None or value == "":
+        return None
+    try:
+        return pd.Timestamp(pd.to_datetime(value, format=TRADE_TIME_FORMAT))
+    except (ValueError, TypeError):
+        pass
+    try:
+        return pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _num(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+_late_sample = metrics.Sampler(DEBUG_EVERY)
+
+
+def price_trade(record, poller, window_ns, max_legs=fx_catalog.MAX_LEGS):
+    """
+    Band columns for one trade (a dict with lower-cased CSV keys), routed as
+    in the batch enrichment: the first path from the tick source's pair
+    catalog (fewest legs first, up to max_legs) whose legs all have ticks in
+    the trade's window. Only the legs of the paths tried are tracked.
+    """
+    out = {c: None for c in BAND_COLUMNS}
+    out.update(ccypair_used=None, reciprocal=None, cross_used=None, used_bid=None)
+    ts = parse_trade_time(record.get('tradedatetime', record.get('trade_datetime')))
+    f = str(record.get('from ccy', record.get('from_ccy', ''))).upper()
+    t = str(record.get('to ccy', record.get('to_ccy', ''))).upper()
+    if ts is None or pd.isna(ts) or not f or not t:
+        metrics.inc("transactions_skipped_total")
+        out['reciprocal'] = False
+        return out
+    trade_ns = ts.value
+    lo = trade_ns - window_ns
+    side = record.get('buy/sell', record.get('buy_sell'))
+
+    def bands(bid, ask, tick_ts):
+        s = np.searchsorted(tick_ts, [lo], side='left')
+        b = window_bands(bid, ask, s, np.array([len(tick_ts)]), [0])
+        return {c: _num(b[c][0, 0]) for c in BAND_COLUMNS}
+
+    catalog = fx_catalog.get_catalog(poller.source)
+    for path in catalog.routes(f, t, max_legs):
+        pairs = [leg.pair for leg in path]
+        # Later legs are matched to ticks up to a window before the previous leg's.
+        since = lo - len(path) * window_ns
+        if not poller.track(pairs, since):
+            metrics.inc("late_transactions_total")
+            if _late_sample():
+                log.debug("Trade at %s is older than the buffered ticks; bands may be incomplete (%d late so far).",
+                          ts, _late_sample.n)
+        ticks = poller.windows(pairs, since, trade_ns)
+        if not all(len(ticks[p].ts) and ticks[p].ts[-1] >= lo for p in pairs):
+            continue
+        if len(path) == 1:
+            pair, reciprocal = path[0]
+            bid, ask = oriented(ticks[pair], reciprocal)
+            out.update(bands(bid, ask, ticks[pair].ts))
+            out.update(ccypair_used=pair, reciprocal=reciprocal,
+                       used_bid=determine_used_bid(side, f, t, pair, reciprocal))
+        else:
+            series = path_series(path, ticks, window_ns)
+            out.update(bands(series.bids, series.asks, series.ts))
+            out['cross_used'] = fx_catalog.path_label(path)
+        return out
+
+    if USD in (f, t):
+        # No quote in the window either way: reported against the reverse quote, as in the batch run.
+        out.update(ccypair_used=t + f, reciprocal=True, used_bid=determine_used_bid(side, f, t, t + f, True))
+    return out
+
+
+def iter_stdin():
+    for line in sys.stdin:
+        yield line
+
+
+def iter_watch_dir(path, interval, once=False):
+    """
+    Yield complete lines appended to *.jsonl files in path, in file-name
+    order, remembering a byte offset per file. With once=True, stop after
+    the first pass that finds nothing new.
+    """
+    offsets = {}
+    pending = {}
+    while True:
+        found = False
+        for name in sorted(glob.glob(os.path.join(path, "*.jsonl"))):
+            size = os.path.getsize(name)
+            if size <= offsets.get(name, 0):
+                continue
+            with open(name, encoding="utf-8") as f:
+                f.seek(offsets.get(name, 0))
+                data = pending.pop(name, "") + f.read()
+                offsets[name] = f.tell()
+            *lines, rest = data.split("\n")
+            if rest:
+                pending[name] = rest
+            for line in lines:
+                found = True
+                yield line
+        if once and not found:
+            return
+        if not found:
+            time.sleep(interval)
+
+
+def run(lines, poller, out, window_ns, log_every=1000, max_legs=fx_catalog.MAX_LEGS):
+    n = 0
+    recent = []
+    try:
+        for line in lines:
+            t0 = time.perf_counter()
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError:
+                metrics.inc("invalid_lines_total")
+                log.warning("Skipping invalid JSON line: %.80s", line)
+                continue
+            record = {k.strip().lower(): v for k, v in raw.items()}
+            raw.update(price_trade(record, poller, window_ns, max_legs))
+            elapsed = time.perf_counter() - t0
+            raw['latency_ms'] = round(elapsed * 1000, 3)
+            out.write(json.dumps(raw) + "\n")
+            out.flush()
+            n += 1
+            metrics.observe("trade_latency_seconds", elapsed)
+            metrics.inc("transactions_enriched_total")
+            recent.append(elapsed)
+            if n % log_every == 0:
+                lat = np.array(recent) * 1000
+                log.info("Processed %d transactions (last %d: p50 %.3f ms, p99 %.3f ms, max %.3f ms).",
+                         n, len(lat), np.percentile(lat, 50), np.percentile(lat, 99), lat.max())
+                recent = []
+    except KeyboardInterrupt:
+        pass
+    return n
+
+
+def make_source(args):
+    if args.source == "file":
+        if not args.ticks_file:
+            raise SystemExit("--source file needs --ticks-file")
+        return MemoryTickSource.from_jsonl(args.ticks_file)
+    if args.source == "synthetic":
+        return SyntheticTickSource(tick_ms=args.synthetic_tick_ms)
+    return ClickHouseTickSource(fx_rates.connect(), limit=args.poll_limit)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrich a JSONL stream of FX transactions from an in-memory tick buffer.")
+    parser.add_argument("--watch-dir", help="Read *.jsonl files appearing in this directory instead of stdin.")
+    parser.add_argument("--once", action="store_true", help="With --watch-dir: exit once no new lines are found.")
+    parser.add_argument("--output", help="Append enriched JSON lines here (default: stdout).")
+    parser.add_argument("--source", choices=["clickhouse", "file", "synthetic"], default="clickhouse")
+    parser.add_argument("--ticks-file", help="Tick JSONL for --source file.")
+    parser.add_argument("--synthetic-tick-ms", type=int, default=100, help="Tick spacing for --source synthetic.")
+    parser.add_argument("--level", type=int, default=DEFAULT_LEVEL, help=f"Book level kept in the ring (default: {DEFAULT_LEVEL}).")
+    parser.add_argument("--ring-size", type=int, default=RING_CAPACITY, help=f"Ticks kept per ccypair (default: {RING_CAPACITY}).")
+    parser.add_argument("--poll-ms", type=int, default=POLL_MS, help=f"Tick poll interval (default: {POLL_MS}).")
+    parser.add_argument("--backfill-seconds", type=int, default=BACKFILL_SECONDS,
+                        help=f"History loaded for a pair before its first trade (default: {BACKFILL_SECONDS}).")
+    parser.add_argument("--poll-limit", type=int, default=POLL_LIMIT, help="Max rows per ClickHouse poll.")
+    parser.add_argument("--max-legs", type=int, default=fx_catalog.MAX_LEGS,
+                        help=f"Longest conversion path tried for a trade (default: {fx_catalog.MAX_LEGS}).")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.instrumented(args, job="stream"):
+        poller = TickPoller(make_source(args), level=args.level, capacity=args.ring_size,
+                            interval=args.poll_ms / 1000, backfill_ns=args.backfill_seconds * 10**9)
+        poller.start()
+        lines = iter_watch_dir(args.watch_dir, args.poll_ms / 1000, args.once) if args.watch_dir else iter_stdin()
+        out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+        window_ns = int(WINDOW.total_seconds() * 1e9)
+        log.info("Streaming enrichment started (source=%s, level=%d).", args.source, args.level)
+        try:
+            n = run(lines, poller, out, window_ns, max_legs=args.max_legs)
+        finally:
+            poller.stop()
+            if out is not sys.stdout:
+                out.close()
+        log.info("Streaming enrichment stopped after %d transactions.", n)
+
+
+if __name__ == "__main__":
+    main()
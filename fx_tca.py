@@ -0,0 +1,188 @@
+"""
+fx_tca.py – execution-quality (TCA) scoring of enriched transactions.
+
+Each trade's exchange rate is compared with the band of the side it dealt
+on: the ask band for buys and the bid band for sells. The bands are quoted
+in the trade's direction, as written by fx_transactions_with_rates.py.
+
+    ref_price        best price in the window (ask_min for buys, bid_max for sells)
+    slippage_bps     cost versus ref_price in basis points; negative = better than the best quote
+    outside_band     rate outside [min, max] of that side's band
+    band_excess_bps  distance outside the band in basis points, 0 inside
+
+Trades without a side are checked against the full band (bid_min..ask_max)
+and get no slippage. Everything is computed on whole columns and the
+summaries with pandas groupby, so a million trades take seconds.
+
+Outputs, in --output-dir:
+
+    tca_by_account.csv, tca_by_ccypair.csv, tca_by_hour.csv
+    tca_summary.json    overall figures and the worst trades
+    tca_trades.csv      every scored trade (only with --trades)
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import fx_metrics as metrics
+from fx_metrics import log
+
+ENRICHED_CSV = "fx_transactions_with_rates.csv"
+OUTPUT_DIR = "tca"
+TRADE_TIME_FORMAT = '%d/%m/%y %H:%M:%S'
+GROUPS = {
+    "account": "account",
+    "ccypair": "ccypair",
+    "hour": "trade_hour",
+}
+WORST_TRADES = 20
+# Columns read from the enriched CSV (lower-cased); everything else is skipped.
+INPUT_COLUMNS = {
+    "tradedatetime", "buy/sell", "from ccy", "to ccy", "exchange rate", "txn number", "account",
+    "bid_max", "bid_min", "ask_max", "ask_min", "ccypair_used", "cross_used",
+}
+
+
+def read_enriched(path):
+    df = pd.read_csv(
+        path,
+        usecols=lambda c: c.strip().lower() in INPUT_COLUMNS,
+        dtype={"Account": "category", "account": "category", "From CCY": "category", "To CCY": "category",
+               "from ccy": "category", "to ccy": "category"},
+    )
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
+
+
+def _per_unique(series, func):
+    """
+    Apply a vectorized func to the distinct values only (timestamps, sides and
+    currencies repeat heavily) and broadcast the result back to every row.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    return np.asarray(func(pd.Series(uniques, dtype=object)))[codes]
+
+
+def _col(df, name):
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float) if name in df.columns \
+        else np.full(len(df), np.nan)
+
+
+def score(df):
+    """Add ccypair, trade_hour and the TCA columns to an enriched DataFrame in place."""
+    side = _per_unique(df["buy/sell"], lambda u: u.astype(str).str.strip().str.lower()) \
+        if "buy/sell" in df.columns else np.full(len(df), "")
+    buy = side == "buy"
+    sell = side == "sell"
+    rate = _col(df, "exchange rate")
+    bid_max, bid_min = _col(df, "bid_max"), _col(df, "bid_min")
+    ask_max, ask_min = _col(df, "ask_max"), _col(df, "ask_min")
+
+    lo = np.where(buy, ask_min, bid_min)
+    hi = np.where(sell, bid_max, ask_max)
+    ref = np.where(buy, ask_min, np.where(sell, bid_max, np.nan))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slippage = np.where(buy, rate - ref, ref - rate) / ref * 1e4
+        excess = np.where(rate > hi, (rate - hi) / hi, np.where(rate < lo, (lo - rate) / lo, 0.0)) * 1e4
+    priced = ~(np.isnan(lo) | np.isnan(hi) | np.isnan(rate))
+    excess[~priced] = np.nan
+
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([df["from ccy"].astype(str), df["to ccy"].astype(str)]))
+    df["ccypair"] = pd.Categorical(np.array([(f + t).upper() for f, t in uniques], dtype=object)[codes])
+    hours = _per_unique(df["tradedatetime"], lambda u: pd.to_datetime(
+        u, format=TRADE_TIME_FORMAT, errors="coerce").dt.strftime("%Y-%m-%d %H"))
+    df["trade_hour"] = pd.Categorical(hours)
+    df["side_used"] = np.where(buy, "ask", np.where(sell, "bid", "both"))
+    df["priced"] = priced
+    df["ref_price"] = ref
+    df["slippage_bps"] = slippage
+    df["outside_band"] = priced & (excess > 0)
+    df["band_excess_bps"] = excess
+    return df
+
+
+def summarize(df, by):
+    """Per-group trade counts, out-of-band counts and slippage statistics."""
+    g = df.groupby(by, observed=True, sort=True)
+    out = g.agg(
+        trades=("priced", "size"),
+        priced=("priced", "sum"),
+        outside_band=("outside_band", "sum"),
+        slippage_bps_mean=("slippage_bps", "mean"),
+        slippage_bps_median=("slippage_bps", "median"),
+        slippage_bps_max=("slippage_bps", "max"),
+        band_excess_bps_max=("band_excess_bps", "max"),
+    )
+    out.insert(5, "slippage_bps_p95", g["slippage_bps"].quantile(0.95))
+    out.insert(3, "outside_band_pct", (100 * out["outside_band"] / out["priced"].where(out["priced"] > 0)))
+    out.index.name = by if by != "trade_hour" else "hour"
+    return out.round(4).reset_index()
+
+
+def overall(df, worst=WORST_TRADES):
+    priced = int(df["priced"].sum())
+    slip = df["slippage_bps"]
+    cols = [c for c in ("txn number", "tradedatetime", "account", "ccypair", "buy/sell", "exchange rate",
+                        "ref_price", "slippage_bps", "outside_band") if c in df.columns]
+    top = df.loc[slip.nlargest(worst).index, cols]
+    return {
+        "trades": len(df),
+        "priced": priced,
+        "outside_band": int(df["outside_band"].sum()),
+        "outside_band_pct": round(100 * df["outside_band"].sum() / priced, 4) if priced else None,
+        "slippage_bps_mean": None if slip.isna().all() else round(float(slip.mean()), 4),
+        "slippage_bps_median": None if slip.isna().all() else round(float(slip.median()), 4),
+        "slippage_bps_p95": None if slip.isna().all() else round(float(slip.quantile(0.95)), 4),
+        "worst_trades": json.loads(top.astype(object).where(top.notna(), None).to_json(orient="records")),
+    }
+
+
+def write_reports(df, output_dir, trades=False):
+    """Write the summary tables (and optionally the scored trades); returns the paths written."""
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for name, col in GROUPS.items():
+        path = os.path.join(output_dir, f"tca_by_{name}.csv")
+        summarize(df, col).to_csv(path, index=False)
+        written.append(path)
+    path = os.path.join(output_dir, "tca_summary.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(overall(df), f, indent=2)
+    written.append(path)
+    if trades:
+        path = os.path.join(output_dir, "tca_trades.csv")
+        df.to_csv(path, index=False)
+        written.append(path)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score enriched FX transactions against their bid/ask bands.")
+    parser.add_argument("--input", default=ENRICHED_CSV, help=f"Enriched CSV (default: {ENRICHED_CSV}).")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help=f"Directory for the reports (default: {OUTPUT_DIR}).")
+    parser.add_argument("--trades", action="store_true", help="Also write every scored trade to tca_trades.csv.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.instrumented(args, job="tca"):
+        log.info("Reading %s...", args.input)
+        with metrics.stage("read_csv"):
+            df = read_enriched(args.input)
+        with metrics.stage("score"):
+            score(df)
+        with metrics.stage("write_reports"):
+            written = write_reports(df, args.output_dir, trades=args.trades)
+        metrics.inc("transactions_scored_total", len(df))
+        metrics.inc("transactions_outside_band_total", int(df["outside_band"].sum()))
+        log.info("Scored %d transactions (%d priced, %d outside their band).",
+                 len(df), int(df["priced"].sum()), int(df["outside_band"].sum()))
+        for path in written:
+            log.info("%s written.", path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,341 @@
+import argparse
+import time
+import numpy as np
 import pandas as pd
-from clickhouse_driver import Client
-from datetime import datetime, timedelta
-
-print("Reading fx_transactions.csv...")
-df = pd.read_csv("fx_transactions.csv")
-print(f"Loaded {len(df)} transactions.")
-
-# Normalize column names to lower for easier access
-df.columns = [c.strip().lower() for c in df.columns]
-
-print("Connecting to ClickHouse...")
-client = Client(
-    host='localhost',
-    port=9000,
-    user='default',
-    password='default',
-    database='default'
-)
-print("Connected to ClickHouse.")
+from collections import namedtuple
+from datetime import timedelta
+import fx_catalog
+import fx_checkpoint
+import fx_metrics as metrics
+import fx_rates
+import fx_sources
+from fx_metrics import log
+
+INPUT_CSV = "fx_transactions.csv"
+OUTPUT_CSV = "fx_transactions_with_rates.csv"
 
 USD = "USD"
+WINDOW = timedelta(seconds=30)
+# Book level(s) used for the bid/ask bands. Level 1 (the second entry of the
+# bids/asks arrays) is what the bands have always been built from.
+DEFAULT_LEVELS = [1]
+TRADE_TIME_FORMAT = '%d/%m/%y %H:%M:%S'
+# Trade windows closer together than LOAD_GAP are fetched in one query; past
+# LOAD_MAX_SPANS queries per pair and call the smallest remaining gaps are
+# bridged too. Fetched spans are rounded out to whole LOAD_GAP blocks.
+LOAD_GAP = timedelta(minutes=10)
+LOAD_MAX_SPANS = 8
+# Parsed as float whatever the rows look like, so a whole file and any slice of
+# it (e.g. one PDF page in run_pipeline.py) come out with the same values.
+NUMERIC_COLUMNS = ('from amt', 'to amt', 'exchange rate')
+
+source = None
+
+# Ticks for one ccypair: int64 ns timestamps plus (n, depth) level matrices.
+Ticks = namedtuple("Ticks", ["ts", "bids", "asks", "qtys"])
+# Ticks already fetched, shareable across enrich() calls on slices of one run:
+# pair -> Ticks, and pair -> sorted, disjoint [(lo_ns, hi_ns), ...] spans those
+# ticks cover.
+TickCache = namedtuple("TickCache", ["ticks", "loaded"])
+
+def new_tick_cache():
+    return TickCache({}, {})
+
+def evict_ticks(cache, before_ns):
+    """Drop cached ticks older than before_ns, and trim the loaded spans to match."""
+    ticks, loaded = cache
+    for pair in list(ticks):
+        t = ticks[pair]
+        i = int(np.searchsorted(t.ts, before_ns, side='left'))
+        if i:
+            ticks[pair] = Ticks(t.ts[i:], t.bids[i:], t.asks[i:], t.qtys[i:])
+    for pair, spans in loaded.items():
+        loaded[pair] = [(max(lo, before_ns), hi) for lo, hi in spans if hi > before_ns]
 
-def get_ccypair(row):
-    from_ccy = str(row['from ccy']).upper()
-    to_ccy = str(row['to ccy']).upper()
-    return from_ccy + to_ccy, to_ccy + from_ccy, from_ccy, to_ccy
+def connect(spec=None):
+    """Open the price source: clickhouse (default), parquet:DIR or memory (see fx_sources)."""
+    global source
+    log.debug("Opening price source %s...", spec or fx_sources.DEFAULT_SOURCE)
+    source = fx_sources.open_source(spec)
+    log.debug("Price source %s ready.", source.name)
+    return source
+
+def read_transactions(path_or_buffer):
+    """Transactions CSV as a DataFrame with lower-cased column names and float amounts."""
+    df = pd.read_csv(path_or_buffer)
+    # Normalize column names to lower for easier access
+    df.columns = [c.strip().lower() for c in df.columns]
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+    return df
 
 def fetch_fx_rows(ccypair, start_time, end_time):
-    query = f"""
-    SELECT timestamp, bids, asks
-    FROM fx_price
-    WHERE ccypair = '{ccypair}'
-      AND timestamp >= toDateTime64('{start_time}', 9)
-      AND timestamp < toDateTime64('{end_time}', 9)
-    ORDER BY timestamp
-    """
-    print(f"Querying fx_price for ccypair={ccypair} from {start_time} to {end_time}...")
-    rows = client.execute(query)
-    print(f"Found {len(rows)} rows for {ccypair}.")
-    return rows
-
-def safe_get(arr, idx):
-    return arr[idx] if isinstance(arr, list) and len(arr) > idx else None
-
-df['bid_max'] = None
-df['bid_min'] = None
-df['ask_max'] = None
-df['ask_min'] = None
-df['ccypair_used'] = None
-df['reciprocal'] = False
-df['cross_used'] = None
-
-# Add a column to indicate if bid price was used for transaction evaluation
-df['used_bid'] = None
+    """One pair's ticks for [start_time, end_time) as {column: array}."""
+    return source.fetch_range(ccypair, start_time, end_time, fx_rates.TICK_COLUMNS)
+
+def level_matrix(arrays, depth):
+    """
+    Pack a sequence of per-tick level arrays into an (n, depth) float matrix.
+    Short arrays are NaN-padded; zero prices/quantities count as missing.
+    """
+    out = np.full((len(arrays), depth), np.nan)
+    if isinstance(arrays, np.ndarray) and arrays.ndim == 2:  # already a matrix (Parquet, memory)
+        packed = arrays
+    else:
+        try:
+            packed = np.asarray(list(arrays), dtype=float)
+        except (ValueError, TypeError):  # ragged (ticks with differing depth) or missing arrays
+            packed = None
+    if packed is not None and packed.ndim == 2:
+        width = min(packed.shape[1], depth)
+        out[:, :width] = packed[:, :width]
+    else:
+        for i, a in enumerate(arrays):
+            a = list(a or [])[:depth]
+            out[i, :len(a)] = a
+    out[out == 0] = np.nan
+    return out
+
+def level_depth(arrays):
+    """Widest level array in a column (matrix or per-tick sequences)."""
+    if isinstance(arrays, np.ndarray) and arrays.ndim == 2:
+        return arrays.shape[1]
+    return max((len(a) for a in arrays if a is not None), default=0)
+
+def load_ticks(ccypair, start_time, end_time, min_depth=1):
+    """Fetch one ccypair's ticks for [start_time, end_time) as a Ticks of level matrices."""
+    cols = fetch_fx_rows(ccypair, start_time, end_time)
+    depth = max(min_depth, level_depth(cols['bids']), level_depth(cols['asks']))
+    return Ticks(
+        cols['timestamp'].astype(np.int64),
+        level_matrix(cols['bids'], depth),
+        level_matrix(cols['asks'], depth),
+        level_matrix(cols['qtys'], depth),
+    )
+
+def merge_ticks(a, b):
+    """Ticks of a and b (fetched for disjoint spans) in one timestamp-sorted Ticks."""
+    depth = max(a.bids.shape[1], b.bids.shape[1])
+
+    def cat(x, y):
+        return np.concatenate([np.pad(m, ((0, 0), (0, depth - m.shape[1])), constant_values=np.nan) for m in (x, y)])
+
+    ts = np.concatenate([a.ts, b.ts])
+    order = np.argsort(ts, kind='stable')
+    return Ticks(ts[order], cat(a.bids, b.bids)[order], cat(a.asks, b.asks)[order], cat(a.qtys, b.qtys)[order])
+
+def coalesce_spans(lo, hi, gap_ns, max_spans):
+    """
+    Sorted, disjoint [lo, hi) spans covering every interval [lo[i], hi[i]).
+    Intervals that overlap or lie at most gap_ns apart are joined; if more
+    than max_spans spans remain, the smallest gaps are bridged as well.
+    """
+    if len(lo) == 0:
+        return []
+    order = np.argsort(lo, kind='stable')
+    lo, hi = lo[order], np.maximum.accumulate(hi[order])
+    gaps = lo[1:] - hi[:-1]
+    cut = gaps > gap_ns
+    if cut.sum() >= max_spans:
+        cut[:] = False
+        cut[np.argsort(gaps, kind='stable')[len(gaps) - (max_spans - 1):]] = True
+    first = np.r_[0, np.flatnonzero(cut) + 1]
+    last = np.r_[np.flatnonzero(cut), len(lo) - 1]
+    return list(zip(lo[first].tolist(), hi[last].tolist()))
+
+def subtract_spans(spans, covered):
+    """The parts of sorted spans not inside the sorted, disjoint covered spans."""
+    out = []
+    for lo, hi in spans:
+        for c_lo, c_hi in covered:
+            if c_hi <= lo or c_lo >= hi:
+                continue
+            if c_lo > lo:
+                out.append((lo, c_lo))
+            lo = max(lo, c_hi)
+            if lo >= hi:
+                break
+        if lo < hi:
+            out.append((lo, hi))
+    return out
+
+def merge_spans(spans):
+    """Sorted, disjoint union of [lo, hi) spans."""
+    out = []
+    for lo, hi in sorted(spans):
+        if out and lo <= out[-1][1]:
+            out[-1] = (out[-1][0], max(out[-1][1], hi))
+        else:
+            out.append((lo, hi))
+    return out
+
+def oriented(ticks, invert):
+    """
+    Bid/ask level matrices quoted in the trade's direction. Inverting a pair
+    swaps sides (bid' = 1/ask, ask' = 1/bid). A level only counts when both
+    its bid and ask are present, as in the original row-by-row logic.
+    """
+    if invert:
+        bid, ask = 1 / ticks.asks, 1 / ticks.bids
+    else:
+        bid, ask = ticks.bids.copy(), ticks.asks.copy()
+    missing = np.isnan(bid) | np.isnan(ask)
+    bid[missing] = np.nan
+    ask[missing] = np.nan
+    return bid, ask
+
+def window_bounds(ts, trade_ns, window_ns):
+    """Per-trade tick index range [start, end) for trade - window <= ts < trade."""
+    starts = np.searchsorted(ts, trade_ns - window_ns, side='left')
+    ends = np.searchsorted(ts, trade_ns, side='left')
+    return starts, ends
+
+def window_reduce(ufunc, values, starts, ends):
+    """
+    ufunc.reduce over values[starts[i]:ends[i]] for every window in a single
+    reduceat call (values may be 1-D or (n, k)). NaNs are ignored; empty or
+    all-NaN windows give NaN.
+    """
+    identity = np.inf if ufunc is np.minimum else -np.inf
+    v = np.where(np.isnan(values), identity, values)
+    v = np.concatenate([v, np.full((1,) + v.shape[1:], identity)])  # sentinel so ends == n is a valid index
+    if len(starts) == 0:
+        return np.empty((0,) + values.shape[1:])
+    idx = np.empty(2 * len(starts), dtype=np.int64)
+    idx[0::2] = starts
+    idx[1::2] = ends
+    out = ufunc.reduceat(v, idx, axis=0)[0::2]
+    out[starts >= ends] = identity
+    out[np.isinf(out)] = np.nan
+    return out
+
+def select_levels(matrix, levels):
+    """Columns of a level matrix for the requested levels; absent levels are NaN."""
+    out = np.full((matrix.shape[0], len(levels)), np.nan)
+    for j, lvl in enumerate(levels):
+        if lvl < matrix.shape[1]:
+            out[:, j] = matrix[:, lvl]
+    return out
+
+def window_bands(bid, ask, starts, ends, levels):
+    """Min/max of the selected bid/ask levels over each trade's window -> dict of (n_trades, n_levels)."""
+    b = select_levels(bid, levels)
+    a = select_levels(ask, levels)
+    return {
+        'bid_max': window_reduce(np.maximum, b, starts, ends),
+        'bid_min': window_reduce(np.minimum, b, starts, ends),
+        'ask_max': window_reduce(np.maximum, a, starts, ends),
+        'ask_min': window_reduce(np.minimum, a, starts, ends),
+    }
+
+def book_vwap(prices, qtys, notional):
+    """
+    Walk each book row level by level until `notional` is filled.
+    prices/qtys are (n, depth), notional is (n,). Returns (vwap, filled),
+    where filled is False when the visible depth is smaller than the
+    notional (the vwap then covers the whole visible book).
+    """
+    q = np.where(np.isnan(prices) | np.isnan(qtys), 0.0, qtys)
+    p = np.nan_to_num(prices)
+    before = np.cumsum(q, axis=1) - q
+    take = np.clip(notional[:, None] - before, 0.0, q)
+    taken = take.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vwap = (take * p).sum(axis=1) / taken
+    vwap[~(taken > 0)] = np.nan
+    filled = taken >= notional * (1 - 1e-12)
+    return vwap, filled
+
+def prevailing_vwap(ticks, starts, ends, notional, invert):
+    """
+    VWAP for each trade's notional against the last book in its window.
+    notional is in the pair's base currency; results are quoted in the
+    trade's direction (inverted pairs swap and reciprocate the sides).
+    """
+    n = len(ends)
+    vwap_bid = np.full(n, np.nan)
+    vwap_ask = np.full(n, np.nan)
+    filled = np.zeros(n, dtype=bool)
+    has_book = (ends > starts) & ~np.isnan(notional)
+    if len(ticks.ts) and has_book.any():
+        last = ends[has_book] - 1
+        q = ticks.qtys[last]
+        vb, fb = book_vwap(ticks.bids[last], q, notional[has_book])
+        va, fa = book_vwap(ticks.asks[last], q, notional[has_book])
+        if invert:
+            vb, va = 1 / va, 1 / vb
+        vwap_bid[has_book] = vb
+        vwap_ask[has_book] = va
+        filled[has_book] = fb & fa
+    return vwap_bid, vwap_ask, filled
+
+def path_vwap(path, ticks, trade_ns, window_ns, from_amt, to_amt):
+    """
+    VWAP of a multi-leg route: each leg's notional is walked against that
+    leg's last book in the trade's window and the legs' VWAPs are chained.
+    The amount entering leg k is from_amt converted at the top-of-book mids
+    of the earlier legs (to_amt for the amount leaving the last leg), and a
+    leg's notional is the amount in its pair's base currency, so inverted
+    legs take the amount they convert into. filled requires every leg filled.
+    """
+    n = len(trade_ns)
+    vwap_bid = np.ones(n)
+    vwap_ask = np.ones(n)
+    filled = np.ones(n, dtype=bool)
+    has_books = np.ones(n, dtype=bool)
+    amount = np.asarray(from_amt, dtype=float)
+    for k, leg in enumerate(path):
+        leg_ticks = ticks[leg.pair]
+        s, e = window_bounds(leg_ticks.ts, trade_ns, window_ns)
+        has_books &= e > s
+        if k == len(path) - 1:
+            out = np.asarray(to_amt, dtype=float)
+        else:
+            bid, ask = oriented(leg_ticks, leg.invert)
+            mid = np.full(n, np.nan)
+            book = e > s
+            mid[book] = (bid[e[book] - 1, 0] + ask[e[book] - 1, 0]) / 2
+            out = amount * mid
+        vb, va, f = prevailing_vwap(leg_ticks, s, e, out if leg.invert else amount, leg.invert)
+        vwap_bid *= vb
+        vwap_ask *= va
+        filled &= f
+        amount = out
+    return vwap_bid, vwap_ask, np.where(has_books, filled, None)
+
+def cross_series(ticks1, invert1, ticks2, invert2, window_ns):
+    """
+    Combined cross bid/ask level matrices on leg 1's timestamps. Each leg-1
+    tick is paired with the latest leg-2 tick at or before it (no older than
+    the window), then cross_bid = bid1 * bid2 and cross_ask = ask1 * ask2
+    with both legs oriented X->USD->Y.
+    """
+    bid1, ask1 = oriented(ticks1, invert1)
+    bid2, ask2 = oriented(ticks2, invert2)
+    depth = max(bid1.shape[1], bid2.shape[1])
+    bid1, ask1, bid2, ask2 = (np.pad(m, ((0, 0), (0, depth - m.shape[1])), constant_values=np.nan)
+                              for m in (bid1, ask1, bid2, ask2))
+    j = np.searchsorted(ticks2.ts, ticks1.ts, side='right') - 1
+    ok = j >= 0
+    ok[ok] = ticks1.ts[ok] - ticks2.ts[j[ok]] <= window_ns
+    bid = np.full_like(bid1, np.nan)
+    ask = np.full_like(ask1, np.nan)
+    bid[ok] = bid1[ok] * bid2[j[ok]]
+    ask[ok] = ask1[ok] * ask2[j[ok]]
+    return bid, ask
+
+def path_series(path, ticks, window_ns):
+    """
+    Bid/ask level matrices for a conversion path of two or more legs, on the
+    first leg's timestamps, built by chaining cross_series leg by leg.
+    """
+    first = ticks[path[0].pair]
+    series, invert = first, path[0].invert
+    for leg in path[1:]:
+        bid, ask = cross_series(series, invert, ticks[leg.pair], leg.invert, window_ns)
+        series, invert = Ticks(first.ts, bid, ask, None), False
+    return series
 
 def determine_used_bid(buy_sell, from_ccy, to_ccy, used_ccypair, reciprocal):
     """
@@ -82,171 +365,293 @@ def determine_used_bid(buy_sell, from_ccy, to_ccy, used_ccypair, reciprocal):
             return True   # Sell uses bid
     return None
 
-print("Processing transactions and enriching with FX rates...")
-for idx, row in df.iterrows():
-    print(f"\nProcessing transaction {idx+1}/{len(df)}...")
-    tradedatetime = row.get('tradedatetime') or row.get('trade datetime') or row.get('trade_datetime')
-    if pd.notnull(tradedatetime):
-        try:
-            trade_time = datetime.strptime(tradedatetime, '%d/%m/%y %H:%M:%S')
-            print(f"Parsed trade time: {trade_time}")
-        except Exception as e:
-            print(f"Failed to parse tradedatetime '{tradedatetime}': {e}. Skipping transaction.")
-            continue
-    else:
-        print("No tradedatetime found. Skipping transaction.")
-        continue
-
-    ccypair, ccypair_rev, from_ccy, to_ccy = get_ccypair(row)
-    start_time = trade_time - timedelta(seconds=30)
-    end_time = trade_time
-
-    # Direct USD pair
-    if USD in [from_ccy, to_ccy]:
-        reciprocal = False
-        used_ccypair = None
-        print(f"Transaction is a USD pair: {from_ccy}/{to_ccy}")
-        # Try direct
-        result = fetch_fx_rows(ccypair, start_time, end_time)
-        if not result:
-            print(f"No direct match for {ccypair}, trying reverse {ccypair_rev}...")
-            # Try reverse
-            result = fetch_fx_rows(ccypair_rev, start_time, end_time)
-            reciprocal = True
-            used_ccypair = ccypair_rev
-        else:
-            used_ccypair = ccypair
-
-        bids_1 = []
-        asks_1 = []
-        for _, bids, asks in result:
-            b = safe_get(bids, 1)
-            a = safe_get(asks, 1)
-            if not reciprocal:
-                if b and a and b != 0 and a != 0:
-                    bids_1.append(b)
-                    asks_1.append(a)
+def enrich(df, levels=None, window=WINDOW, max_legs=fx_catalog.MAX_LEGS, cache=None, row_offset=0, total_rows=None):
+    """
+    Add bid/ask band and VWAP columns to the transactions DataFrame in place.
+
+    Each trade is priced over the fewest legs with ticks in its window: the
+    pair or its reverse quote, then crosses through a pivot currency (USD
+    first, see fx_catalog), up to max_legs. Only pairs listed in the fx_price
+    catalog are fetched, once each for the span of trades that need them, and
+    every trade's window is then reduced in one vectorized pass per route.
+    Ticks are fetched for the union of the trades' windows (close windows
+    coalesced, see LOAD_GAP), not for the whole span between the first and
+    last trade. bid_max/bid_min/ask_max/ask_min use the
+    first entry of `levels`; with several levels each also gets
+    bid_max_l<N>... columns. vwap_bid/vwap_ask price the trade's notional
+    (from_amt, or to_amt when the pair is quoted the other way round) against
+    the last book in the window; for crosses each leg is priced that way
+    (see path_vwap) and the legs' VWAPs are chained.
+
+    Pass a TickCache to reuse fetched ticks across calls (e.g. successive row
+    ranges of one file). Ticks older than this slice's earliest window are
+    evicted from it first, so it holds roughly one slice's span rather than
+    the whole run's; a later slice reaching further back fetches them again.
+    row_offset/total_rows place this slice in the progress messages.
+    """
+    levels = list(levels or DEFAULT_LEVELS)
+    window_ns = int(window.total_seconds() * 1e9)
+    n = len(df)
+    total_rows = n if total_rows is None else total_rows
+
+    df['bid_max'] = None
+    df['bid_min'] = None
+    df['ask_max'] = None
+    df['ask_min'] = None
+    df['ccypair_used'] = None
+    df['reciprocal'] = pd.Series(False, index=df.index, dtype=object)
+    df['cross_used'] = None
+
+    # Add a column to indicate if bid price was used for transaction evaluation
+    df['used_bid'] = None
+    df['vwap_bid'] = None
+    df['vwap_ask'] = None
+    df['vwap_filled'] = None
+    band_cols = ['bid_max', 'bid_min', 'ask_max', 'ask_min']
+    if len(levels) > 1:
+        for lvl in levels:
+            for col in band_cols:
+                df[f'{col}_l{lvl}'] = None
+
+    time_col = next((c for c in ('tradedatetime', 'trade datetime', 'trade_datetime') if c in df.columns), None)
+    if time_col is None:
+        log.warning("No tradedatetime column found. Nothing to enrich.")
+        return df
+    trade_time = pd.to_datetime(df[time_col], format=TRADE_TIME_FORMAT, errors='coerce')
+    skipped = int(trade_time.isna().sum())
+    if skipped:
+        log.warning("Skipping %d transactions with a missing or unparseable tradedatetime.", skipped)
+        metrics.inc("transactions_skipped_total", skipped)
+    trade_ns = trade_time.values.astype('datetime64[ns]').astype(np.int64)
+
+    from_ccy = df['from ccy'].astype(str).str.upper().values
+    to_ccy = df['to ccy'].astype(str).str.upper().values
+    side_col = next((c for c in ('buy/sell', 'buy_sell') if c in df.columns), None)
+    side = (df[side_col].fillna('').astype(str).str.strip().str.lower().values
+            if side_col else np.full(n, '', dtype=object))
+    amt = {
+        'from': pd.to_numeric(df['from amt'], errors='coerce').values if 'from amt' in df.columns else np.full(n, np.nan),
+        'to': pd.to_numeric(df['to amt'], errors='coerce').values if 'to amt' in df.columns else np.full(n, np.nan),
+    }
+
+    valid = np.flatnonzero(~trade_time.isna().values)
+    keys = pd.DataFrame({'f': from_ccy[valid], 't': to_ccy[valid]})
+    groups = {key: valid[pos] for key, pos in keys.groupby(['f', 't']).indices.items()}
+
+    # Route each trade over the fewest legs that have ticks in its window.
+    # Candidate paths come from the fx_price catalog, so only pairs that exist
+    # and have data around the trades are queried, each for the windows of
+    # the trades that may use it. Longer paths are only looked at for trades
+    # the shorter ones could not price.
+    catalog = fx_catalog.get_catalog(source)
+    gap_ns = int(LOAD_GAP.total_seconds() * 1e9)
+    if cache is not None and len(valid):
+        # Leg k of a path is matched up to k + 1 windows before the trade;
+        # evicting whole LOAD_GAP blocks keeps the block this slice loads from.
+        earliest = int(trade_ns[valid].min()) - max_legs * window_ns
+        evict_ticks(cache, earliest // gap_ns * gap_ns)
+    ticks, loaded = cache if cache is not None else new_tick_cache()
+
+    def load(needs):
+        # needs: pair -> [(lo array, hi array), ...] windows to cover
+        with metrics.stage("load_ticks"):
+            for pair, windows in needs.items():
+                lo = np.concatenate([w[0] for w in windows])
+                hi = np.concatenate([w[1] for w in windows])
+                spans = coalesce_spans(lo, hi, gap_ns, LOAD_MAX_SPANS)
+                # whole LOAD_GAP blocks, so later calls sharing the cache find
+                # the neighbourhood of earlier windows already loaded
+                spans = merge_spans([(a // gap_ns * gap_ns, -(-b // gap_ns) * gap_ns) for a, b in spans])
+                missing = subtract_spans(spans, loaded.get(pair, []))
+                for m_lo, m_hi in missing:
+                    part = load_ticks(pair, pd.Timestamp(m_lo).to_pydatetime(), pd.Timestamp(m_hi).to_pydatetime(),
+                                      min_depth=max(levels) + 1)
+                    ticks[pair] = merge_ticks(ticks[pair], part) if pair in ticks else part
+                if missing:
+                    loaded[pair] = merge_spans(loaded.get(pair, []) + missing)
+
+    # (f, t) -> (paths, index into paths chosen per trade; -1 = no route yet)
+    routes = {key: ([], np.full(len(rows), -1)) for key, rows in groups.items()}
+    candidates = {}
+    for key, rows in groups.items():
+        tns = trade_ns[rows]
+        lo, hi = tns.min() - window_ns, tns.max()
+        candidates[key] = [p for p in catalog.routes(*key, max_legs)
+                           if all(catalog.covers(leg.pair, lo, hi) for leg in p)]
+    # Each round tries the next candidate path of every group that still has
+    # unrouted trades, loading only that path's legs for those trades; a
+    # group drops out once all its trades are routed.
+    rank = 0
+    while True:
+        pending, needs = {}, {}
+        for key, paths in candidates.items():
+            chosen = routes[key][1]
+            unrouted = chosen < 0
+            if rank >= len(paths) or not unrouted.any():
+                continue
+            path = pending[key] = paths[rank]
+            tns = trade_ns[groups[key][unrouted]]
+            # the k-th leg of a path is matched to ticks of the legs before
+            # it up to a window earlier each, so it needs k + 1 windows
+            for k, leg in enumerate(path):
+                needs.setdefault(leg.pair, []).append((tns - (k + 1) * window_ns, tns))
+        if not pending:
+            break
+        load(needs)
+        for key, path in pending.items():
+            known, chosen = routes[key]
+            tns = trade_ns[groups[key]]
+            ok = chosen < 0
+            for leg in path:
+                s, e = window_bounds(ticks[leg.pair].ts, tns, window_ns)
+                ok &= e > s
+            chosen[ok] = len(known)
+            known.append(path)
+            metrics.inc("routes_considered_total", legs=len(path))
+        rank += 1
+
+    def assign(rows, bands, **cols):
+        for col in band_cols:
+            df.loc[df.index[rows], col] = bands[col][:, 0]
+            if len(levels) > 1:
+                for j, lvl in enumerate(levels):
+                    df.loc[df.index[rows], f'{col}_l{lvl}'] = bands[col][:, j]
+        for col, values in cols.items():
+            df.loc[df.index[rows], col] = values
+
+    def used_bid_for(rows, reciprocal):
+        buy = side[rows] == 'buy'
+        sell = side[rows] == 'sell'
+        # Reciprocal quotes flip the side: a buy then hits the pair's bid.
+        return np.where(buy | sell, buy if reciprocal else sell, None)
+
+    done = row_offset
+    log.info("Processing transactions and enriching with FX rates...")
+    t0 = time.perf_counter()
+    for (f, t), rows in groups.items():
+        tg = time.perf_counter()
+        tns = trade_ns[rows]
+        paths, chosen = routes[(f, t)]
+        for k, path in enumerate(paths):
+            mask = chosen == k
+            if not mask.any():
+                continue
+            sub = rows[mask]
+            if len(path) == 1:
+                pair, reciprocal = path[0]
+                pair_ticks = ticks[pair]
+                s, e = window_bounds(pair_ticks.ts, tns[mask], window_ns)
+                bid, ask = oriented(pair_ticks, reciprocal)
+                notional = amt['to' if reciprocal else 'from'][sub]
+                vwap_bid, vwap_ask, filled = prevailing_vwap(pair_ticks, s, e, notional, reciprocal)
+                assign(sub, window_bands(bid, ask, s, e, levels),
+                       ccypair_used=pair,
+                       reciprocal=reciprocal,
+                       cross_used=None,
+                       used_bid=used_bid_for(sub, reciprocal),
+                       vwap_bid=vwap_bid,
+                       vwap_ask=vwap_ask,
+                       vwap_filled=np.where(e > s, filled, None))
+            else:
+                series = path_series(path, ticks, window_ns)
+                s, e = window_bounds(series.ts, tns[mask], window_ns)
+                vwap_bid, vwap_ask, filled = path_vwap(path, ticks, tns[mask], window_ns,
+                                                       amt['from'][sub], amt['to'][sub])
+                assign(sub, window_bands(series.bids, series.asks, s, e, levels),
+                       ccypair_used=None, reciprocal=None, cross_used=fx_catalog.path_label(path), used_bid=None,
+                       vwap_bid=vwap_bid, vwap_ask=vwap_ask, vwap_filled=filled)
+        unrouted = rows[chosen < 0]
+        if len(unrouted):
+            if USD in (f, t):
+                # No quote in the window either way: reported against the reverse quote, as before.
+                empty = np.full((len(unrouted), len(levels)), np.nan)
+                assign(unrouted, {col: empty for col in band_cols},
+                       ccypair_used=t + f, reciprocal=True, cross_used=None,
+                       used_bid=used_bid_for(unrouted, True),
+                       vwap_bid=np.nan, vwap_ask=np.nan, vwap_filled=None)
             else:
-                if b and a and b != 0 and a != 0:
-                    bids_1.append(1 / a)
-                    asks_1.append(1 / b)
-        print(f"Collected {len(bids_1)} valid bids and {len(asks_1)} valid asks for USD pair.")
-        if bids_1:
-            df.at[idx, 'bid_max'] = max(bids_1)
-            df.at[idx, 'bid_min'] = min(bids_1)
-        if asks_1:
-            df.at[idx, 'ask_max'] = max(asks_1)
-            df.at[idx, 'ask_min'] = min(asks_1)
-        df.at[idx, 'ccypair_used'] = used_ccypair
-        df.at[idx, 'reciprocal'] = reciprocal
-        df.at[idx, 'cross_used'] = None
-
-        # Use new logic for bid/ask determination
-        buy_sell = (row.get('buy/sell') or row.get('buy_sell') or '')
-        used_bid = determine_used_bid(buy_sell, from_ccy, to_ccy, used_ccypair, reciprocal)
-        df.at[idx, 'used_bid'] = used_bid
-        continue
-
-    # Cross pair: neither from_ccy nor to_ccy is USD
-    print(f"Transaction is a cross pair: {from_ccy}/{to_ccy}. Calculating cross rate using USD legs.")
-    xusd = from_ccy + USD
-    usdx = USD + from_ccy
-    usdy = USD + to_ccy
-    yusd = to_ccy + USD
-
-    leg_xusd = fetch_fx_rows(xusd, start_time, end_time)
-    leg_usdx = fetch_fx_rows(usdx, start_time, end_time)
-    leg_usdy = fetch_fx_rows(usdy, start_time, end_time)
-    leg_yusd = fetch_fx_rows(yusd, start_time, end_time)
-
-    cross_bids = []
-    cross_asks = []
-    cross_used = None
-
-    # 1. X/USD and USD/Y (e.g., EURUSD * USDJPY)
-    if leg_xusd and leg_usdy:
-        print(f"Using {xusd} * {usdy} for cross calculation.")
-        min_len = min(len(leg_xusd), len(leg_usdy))
-        for i in range(min_len):
-            _, bids1, asks1 = leg_xusd[i]
-            _, bids2, asks2 = leg_usdy[i]
-            b1 = safe_get(bids1, 1)
-            a1 = safe_get(asks1, 1)
-            b2 = safe_get(bids2, 1)
-            a2 = safe_get(asks2, 1)
-            if b1 and b2 and a1 and a2 and b1 != 0 and b2 != 0 and a1 != 0 and a2 != 0:
-                cross_bids.append(b1 * b2)
-                cross_asks.append(a1 * a2)
-        cross_used = f"{xusd} * {usdy}"
-
-    # 2. X/USD and Y/USD (e.g., EURUSD / USDJPY)
-    elif leg_xusd and leg_yusd:
-        print(f"Using {xusd} / {yusd} for cross calculation.")
-        min_len = min(len(leg_xusd), len(leg_yusd))
-        for i in range(min_len):
-            _, bids1, asks1 = leg_xusd[i]
-            _, bids2, asks2 = leg_yusd[i]
-            b1 = safe_get(bids1, 1)
-            a1 = safe_get(asks1, 1)
-            b2 = safe_get(bids2, 1)
-            a2 = safe_get(asks2, 1)
-            # cross_bid = bid(X/USD) / ask(Y/USD)
-            # cross_ask = ask(X/USD) / bid(Y/USD)
-            if b1 and a2 and a1 and b2 and b1 != 0 and a2 != 0 and a1 != 0 and b2 != 0:
-                cross_bids.append(b1 / a2)
-                cross_asks.append(a1 / b2)
-        cross_used = f"{xusd} / {yusd}"
-
-    # 3. USD/X and USD/Y (e.g., 1/USDEUR * USDJPY)
-    elif leg_usdx and leg_usdy:
-        print(f"Using 1/{usdx} * {usdy} for cross calculation.")
-        min_len = min(len(leg_usdx), len(leg_usdy))
-        for i in range(min_len):
-            _, bids1, asks1 = leg_usdx[i]
-            _, bids2, asks2 = leg_usdy[i]
-            b1 = safe_get(bids1, 1)
-            a1 = safe_get(asks1, 1)
-            b2 = safe_get(bids2, 1)
-            a2 = safe_get(asks2, 1)
-            # cross_bid = (1/ask(USD/X)) * bid(USD/Y)
-            # cross_ask = (1/bid(USD/X)) * ask(USD/Y)
-            if a1 and b2 and b1 and a2 and a1 != 0 and b2 != 0 and b1 != 0 and a2 != 0:
-                cross_bids.append((1 / a1) * b2)
-                cross_asks.append((1 / b1) * a2)
-        cross_used = f"1/{usdx} * {usdy}"
-
-    # 4. USD/X and Y/USD (e.g., 1/USDEUR / USDJPY)
-    elif leg_usdx and leg_yusd:
-        print(f"Using 1/{usdx} / {yusd} for cross calculation.")
-        min_len = min(len(leg_usdx), len(leg_yusd))
-        for i in range(min_len):
-            _, bids1, asks1 = leg_usdx[i]
-            _, bids2, asks2 = leg_yusd[i]
-            b1 = safe_get(bids1, 1)
-            a1 = safe_get(asks1, 1)
-            b2 = safe_get(bids2, 1)
-            a2 = safe_get(asks2, 1)
-            # cross_bid = (1/ask(USD/X)) / ask(Y/USD)
-            # cross_ask = (1/bid(USD/X)) / bid(Y/USD)
-            if a1 and a2 and b1 and b2 and a1 != 0 and a2 != 0 and b1 != 0 and b2 != 0:
-                cross_bids.append((1 / a1) / a2)
-                cross_asks.append((1 / b1) / b2)
-        cross_used = f"1/{usdx} / {yusd}"
-
-    print(f"Collected {len(cross_bids)} valid cross bids and {len(cross_asks)} valid cross asks for cross pair.")
-    if cross_bids:
-        df.at[idx, 'bid_max'] = max(cross_bids)
-        df.at[idx, 'bid_min'] = min(cross_bids)
-    if cross_asks:
-        df.at[idx, 'ask_max'] = max(cross_asks)
-        df.at[idx, 'ask_min'] = min(cross_asks)
-    df.at[idx, 'ccypair_used'] = None
-    df.at[idx, 'reciprocal'] = None
-    df.at[idx, 'cross_used'] = cross_used
-
-    # For cross pairs, set to None (or implement similar logic if needed)
-    df.at[idx, 'used_bid'] = None
-
-print("Writing enriched transactions to fx_transactions_with_rates.csv...")
-df.to_csv("fx_transactions_with_rates.csv", index=False)
-print("fx_transactions_with_rates.csv generated.")
+                df.loc[df.index[unrouted], ['ccypair_used', 'reciprocal']] = None
+        done += len(rows)
+        metrics.observe("group_seconds", time.perf_counter() - tg, ccypair=f + t)
+        metrics.inc("transactions_enriched_total", len(rows))
+        log.info("Processing transactions %d/%d (%s/%s)...", done, total_rows, f, t)
+    metrics.observe("stage_seconds", time.perf_counter() - t0, stage="compute")
+    metrics.rate("rows_per_second", done - row_offset, time.perf_counter() - t0, stage="enrich")
+    return df
+
+def parse_levels(value):
+    levels = [int(v) for v in value.split(',') if v.strip()]
+    if not levels or min(levels) < 0:
+        raise argparse.ArgumentTypeError("levels must be a comma-separated list of non-negative integers")
+    return levels
+
+def enrich_checkpointed(df, args):
+    """
+    Enrich df in ranges of args.checkpoint_rows rows, checkpointing each
+    finished range (see fx_checkpoint), then assemble args.output from the
+    segments. Ticks fetched for one range are reused by the next.
+    """
+    directory = args.checkpoint_dir or f"{args.output}.ckpt"
+    key = fx_checkpoint.fingerprint(args.input, levels=args.levels, source=args.source, max_legs=args.max_legs,
+                                    checkpoint_rows=args.checkpoint_rows, window=WINDOW)
+    checkpoint = fx_checkpoint.Checkpoint.open(directory, key, resume=args.resume)
+    ranges = fx_checkpoint.row_ranges(len(df), args.checkpoint_rows)
+    cache = new_tick_cache()
+    try:
+        for lo, hi in ranges:
+            if checkpoint.is_done(lo, hi):
+                metrics.inc("checkpoint_rows_skipped_total", hi - lo)
+                log.info("Processing transactions %d/%d (checkpointed)...", hi, len(df))
+                continue
+            part = df.iloc[lo:hi].copy()
+            enrich(part, levels=args.levels, max_legs=args.max_legs, cache=cache, row_offset=lo, total_rows=len(df))
+            with metrics.stage("write_checkpoint"):
+                checkpoint.complete(lo, hi, part)
+    except KeyboardInterrupt:
+        log.warning("Interrupted; %d of %d range(s) are checkpointed in %s. Rerun with --resume to continue.",
+                    len(checkpoint.done), len(ranges), directory)
+        raise
+    log.info("Writing enriched transactions to %s...", args.output)
+    with metrics.stage("write_csv"):
+        checkpoint.assemble(args.output, ranges)
+    checkpoint.remove()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrich FX transactions with bid/ask bands from ClickHouse.")
+    parser.add_argument("--input", default=INPUT_CSV, help=f"Transactions CSV (default: {INPUT_CSV}).")
+    parser.add_argument("--output", default=OUTPUT_CSV, help=f"Enriched CSV to write (default: {OUTPUT_CSV}).")
+    parser.add_argument("--levels", type=parse_levels, default=DEFAULT_LEVELS,
+                        help="Comma-separated book levels for the bands, e.g. 0,1,2 (default: 1).")
+    parser.add_argument("--source", default=fx_sources.DEFAULT_SOURCE,
+                        help="Price source: clickhouse, parquet:DIR or memory (default: %(default)s).")
+    parser.add_argument("--max-legs", type=int, default=fx_catalog.MAX_LEGS,
+                        help=f"Longest conversion path to try for crosses (default: {fx_catalog.MAX_LEGS}).")
+    parser.add_argument("--checkpoint-rows", type=int, default=fx_checkpoint.CHECKPOINT_ROWS,
+                        help="Rows per checkpointed output segment; 0 enriches in one piece "
+                             f"(default: {fx_checkpoint.CHECKPOINT_ROWS}).")
+    parser.add_argument("--checkpoint-dir", help="Directory for segments and manifest (default: <output>.ckpt).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip row ranges already checkpointed by an interrupted run on the same input.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.instrumented(args, job="enrich"):
+        log.info("Reading %s...", args.input)
+        with metrics.stage("read_csv"):
+            df = read_transactions(args.input)
+        log.info("Loaded %d transactions.", len(df))
+        metrics.inc("transactions_read_total", len(df))
+
+        with metrics.stage("connect"):
+            connect(args.source)
+        if args.checkpoint_rows > 0 and len(df) > 0:
+            enrich_checkpointed(df, args)
+        else:
+            enrich(df, levels=args.levels, max_legs=args.max_legs)
+            log.info("Writing enriched transactions to %s...", args.output)
+            with metrics.stage("write_csv"):
+                df.to_csv(args.output, index=False)
+        log.info("%s generated.", args.output)
+
+if __name__ == "__main__":
+    main()
@@ -78,16 +78,24 @@ def create_pdf(transactions, filename):
 # fpdf is a suitable choice for generating simple PDF tables.
 # For more complex layouts, consider reportlab, but for this use case fpdf is efficient and easy to use.
 
-if __name__ == "__main__":
-    output_dir = "generated-pdf"
+def generate_pdfs(output_dir="generated-pdf", n_files=3, n_transactions=N_TRANSACTIONS):
     os.makedirs(output_dir, exist_ok=True)
-    for i in range(3):
+    filenames = []
+    for i in range(n_files):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         rand_suffix = random.randint(1000, 9999)
         fname = os.path.join(
             output_dir,
             f"fx_transactions_{timestamp}_{rand_suffix}.pdf"
         )
-        transactions = generate_transactions(N_TRANSACTIONS)
+        transactions = generate_transactions(n_transactions)
         create_pdf(transactions, fname)
         print(f"PDF generated: {fname}")
+        filenames.append(fname)
+    return filenames
+
+def main():
+    generate_pdfs()
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,29 @@
-from clickhouse_driver import Client
+import argparse
 import pandas as pd
+import fx_rates
 
-# Connect to ClickHouse server (update host, user, password as needed)
-client = Client(
-    host='localhost',
-    port=9000,
-    user='default',
-    password='default',
-    database='default'
-)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print fx_price rows for a ccypair as a DataFrame.")
+    parser.add_argument("--ccypair", default="EURUSD")
+    parser.add_argument("--start", type=pd.Timestamp, help="Inclusive start timestamp, e.g. '2025-07-22 01:00'.")
+    parser.add_argument("--end", type=pd.Timestamp, help="Exclusive end timestamp.")
+    parser.add_argument("--columns", default=",".join(fx_rates.COLUMNS),
+                        help="Comma-separated columns to select (default: all).")
+    parser.add_argument("--limit", type=int, default=1000, help="Max rows, latest first (default: 1000; 0 for no limit).")
+    args = parser.parse_args(argv)
 
-# Fetch latest EURUSD FX prices from fx_price table
-query = """
-SELECT
-    timestamp,
-    date,
-    bids,
-    asks,
-    qtys,
-    ccypair,
-    quoteId,
-    name
-FROM fx_price
-WHERE ccypair = 'EURUSD'
-ORDER BY timestamp DESC
-"""
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()]
+    if "timestamp" not in columns:
+        columns.insert(0, "timestamp")
 
-result = client.execute(query)
-columns = ['timestamp', 'date', 'bids', 'asks', 'qtys', 'ccypair', 'quoteId', 'name']
-df = pd.DataFrame(result, columns=columns)
-df.set_index('timestamp', inplace=True)
-print(df)
+    # Connection settings come from clickhouse.properties
+    client = fx_rates.connect()
+
+    # Fetch latest FX prices from fx_price table
+    df = fx_rates.fetch_frame(client, args.ccypair, args.start, args.end, columns=columns,
+                              order="DESC", limit=args.limit or None)
+    df.set_index('timestamp', inplace=True)
+    print(df)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,10 @@
-from clickhouse_driver import Client
+import argparse
 from datetime import datetime, timedelta
 import random
-
-client = Client(
-    host='localhost',
-    port=9000,
-    user='default',
-    password='default',
-    database='default'
-)
+import time
+import fx_metrics as metrics
+import fx_rates
+from fx_metrics import log
 
 ccypairs = [
     'EURUSD', 'USDJPY', 'GBPUSD', 'AUDUSD', 'USDCAD',
@@ -31,33 +27,59 @@ start_time = datetime(2025, 7, 22, 1, 0, 0)
 end_time = datetime(2025, 7, 22, 2, 0, 0)
 total_seconds = int((end_time - start_time).total_seconds())
 
-rows = []
-for idx, ccypair in enumerate(ccypairs):
-    for i in range(total_seconds):  # 1-second intervals between 1am and 2am
-        ts = start_time + timedelta(seconds=i)
-        bids = [round(bids_base[idx] - 0.0001 * j - random.uniform(0, 0.0002), 6) for j in range(3)]
-        asks = [round(asks_base[idx] + 0.0001 * j + random.uniform(0, 0.0002), 6) for j in range(3)]
-        row = (
-            ts,              # DateTime64(9)
-            date_only,       # Date as date object
-            bids,
-            asks,
-            qtys,
-            ccypair,
-            f"Q{random.randint(10000,99999)}",
-            f"Source{idx+1}"
-        )
-        rows.append(row)
-
-insert_query = """
-INSERT INTO fx_price (
+INSERT_QUERY = """
+INSERT INTO {table} (
     timestamp, date, bids, asks, qtys, ccypair, quoteId, name
 ) VALUES
 """
 
-client.execute(
-    insert_query,
-    rows
-)
+def generate_rows(seed=None):
+    """The synthetic hour of ticks; pass a seed for the same rows on every call."""
+    rng = random.Random(seed) if seed is not None else random
+    rows = []
+    for idx, ccypair in enumerate(ccypairs):
+        for i in range(total_seconds):  # 1-second intervals between 1am and 2am
+            ts = start_time + timedelta(seconds=i)
+            bids = [round(bids_base[idx] - 0.0001 * j - rng.uniform(0, 0.0002), 6) for j in range(3)]
+            asks = [round(asks_base[idx] + 0.0001 * j + rng.uniform(0, 0.0002), 6) for j in range(3)]
+            row = (
+                ts,              # DateTime64(9)
+                date_only,       # Date as date object
+                bids,
+                asks,
+                qtys,
+                ccypair,
+                f"Q{rng.randint(10000,99999)}",
+                f"Source{idx+1}"
+            )
+            rows.append(row)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Populate fx_price with synthetic 1-second ticks.")
+    parser.add_argument("--table", default=fx_rates.TABLE,
+                        help="Table to insert into (default: FX_PRICE_TABLE or fx_price: %(default)s).")
+    parser.add_argument("--seed", type=int, help="Seed for the generated prices (default: random).")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.instrumented(args, job="insert"):
+        client = fx_rates.connect()
+
+        with metrics.stage("generate"):
+            rows = generate_rows(args.seed)
+
+        t0 = time.perf_counter()
+        with metrics.timer("insert_seconds"):
+            client.execute(
+                INSERT_QUERY.format(table=args.table),
+                rows
+            )
+        metrics.inc("rows_inserted_total", len(rows))
+        metrics.rate("rows_per_second", len(rows), time.perf_counter() - t0, stage="insert")
+
+        log.info("Inserted %d rows into %s for %s between 1am and 2am with 1-second intervals.",
+                 len(rows), args.table, date_str)
 
-print(f"Inserted {len(rows)} rows into fx_price for {date_str} between 1am and 2am with 1-second intervals.")
+if __name__ == "__main__":
+    main()
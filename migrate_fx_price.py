@@ -0,0 +1,121 @@
+"""
+migrate_fx_price.py – copy fx_price into the optimized layout from
+create_fx_price_table_optimized.sql (codecs, LowCardinality, skip indexes).
+
+The copy runs one partition at a time with INSERT ... SELECT inside
+ClickHouse, so no rows pass through Python. A partition whose row count
+already matches in the target is skipped, and a partially copied one is
+dropped and copied again, so an interrupted migration can simply be rerun.
+
+    python migrate_fx_price.py                  # create fx_price_optimized and copy
+    python migrate_fx_price.py --optimize       # also merge parts (fair size comparison)
+    python migrate_fx_price.py --swap           # then EXCHANGE the two tables
+"""
+
+import argparse
+import os
+import re
+import time
+
+import fx_metrics as metrics
+import fx_rates
+from fx_metrics import log
+
+SCHEMA_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "create_fx_price_table_optimized.sql")
+SOURCE_TABLE = "fx_price"
+TARGET_TABLE = "fx_price_optimized"
+
+
+def read_statements(path, table=TARGET_TABLE):
+    """SQL statements from a file ('--' comments dropped), with the table renamed to `table`."""
+    with open(path, encoding="utf-8") as f:
+        sql = re.sub(r"--[^\n]*", "", f.read())
+    sql = re.sub(rf"\b{TARGET_TABLE}\b", table, sql)
+    return [stmt.strip() for stmt in sql.split(";") if stmt.strip()]
+
+
+def partition_rows(client, table):
+    """{partition_id: rows} over the table's active parts."""
+    rows = client.execute(
+        """
+        SELECT partition_id, sum(rows)
+        FROM system.parts
+        WHERE database = currentDatabase() AND table = %(table)s AND active
+        GROUP BY partition_id
+        ORDER BY partition_id
+        """,
+        {"table": table},
+    )
+    return {pid: int(n) for pid, n in rows}
+
+
+def copy_partition(client, source, target, partition_id, columns=fx_rates.COLUMNS):
+    cols = ", ".join(columns)
+    client.execute(
+        f"INSERT INTO {target} ({cols}) SELECT {cols} FROM {source} WHERE _partition_id = %(pid)s",
+        {"pid": partition_id},
+    )
+
+
+def migrate(client, source=SOURCE_TABLE, target=TARGET_TABLE, schema=SCHEMA_SQL, recreate=False):
+    """Create target from schema if needed and copy every partition of source that is not there yet."""
+    if recreate:
+        log.info("Dropping %s...", target)
+        client.execute(f"DROP TABLE IF EXISTS {target}")
+    for stmt in read_statements(schema, target):
+        client.execute(stmt)
+
+    src = partition_rows(client, source)
+    dst = partition_rows(client, target)
+    copied = 0
+    for i, (pid, rows) in enumerate(src.items(), start=1):
+        have = dst.get(pid, 0)
+        if have == rows:
+            log.info("Partition %s: %d rows already copied (%d/%d).", pid, rows, i, len(src))
+            continue
+        if have:
+            log.info("Partition %s: %d of %d rows present, recopying.", pid, have, rows)
+            client.execute(f"ALTER TABLE {target} DROP PARTITION ID %(pid)s", {"pid": pid})
+        t0 = time.perf_counter()
+        with metrics.timer("copy_partition_seconds", partition=pid):
+            copy_partition(client, source, target, pid)
+        elapsed = time.perf_counter() - t0
+        metrics.inc("rows_copied_total", rows)
+        metrics.rate("rows_per_second", rows, elapsed, stage="migrate")
+        copied += rows
+        log.info("Partition %s: copied %d rows in %.1fs (%d/%d).", pid, rows, elapsed, i, len(src))
+
+    dst = partition_rows(client, target)
+    missing = {pid: (n, dst.get(pid, 0)) for pid, n in src.items() if dst.get(pid, 0) != n}
+    if missing:
+        raise RuntimeError(f"Row counts differ after the copy (partition: source, target): {missing}")
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy fx_price into the codec-optimized table layout.")
+    parser.add_argument("--source", default=SOURCE_TABLE, help=f"Table to copy from (default: {SOURCE_TABLE}).")
+    parser.add_argument("--target", default=TARGET_TABLE, help=f"Table to create and fill (default: {TARGET_TABLE}).")
+    parser.add_argument("--schema", default=SCHEMA_SQL, help="DDL for the target (default: create_fx_price_table_optimized.sql).")
+    parser.add_argument("--recreate", action="store_true", help="Drop the target first and copy everything again.")
+    parser.add_argument("--optimize", action="store_true", help="OPTIMIZE ... FINAL the target after the copy.")
+    parser.add_argument("--swap", action="store_true",
+                        help="EXCHANGE the tables afterwards, so the source name serves the new layout.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.instrumented(args, job="migrate"):
+        client = fx_rates.connect()
+        with metrics.stage("copy"):
+            copied = migrate(client, args.source, args.target, args.schema, recreate=args.recreate)
+        log.info("Copied %d rows from %s to %s.", copied, args.source, args.target)
+        if args.optimize:
+            with metrics.stage("optimize"):
+                client.execute(f"OPTIMIZE TABLE {args.target} FINAL")
+        if args.swap:
+            client.execute(f"EXCHANGE TABLES {args.source} AND {args.target}")
+            log.info("%s now has the optimized layout; the previous table is kept as %s.", args.source, args.target)
+
+
+if __name__ == "__main__":
+    main()
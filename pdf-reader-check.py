@@ -3,18 +3,36 @@
 pdf_reader.py – A robust, self‑contained PDF reader.
 
 Usage:
-    python pdf_reader.py <path_or_url> [--output OUTDIR] [--verbose]
+    python pdf_reader.py <path_or_url> [<path_or_url> ...] [--output OUTDIR] [--verbose]
+    python pdf_reader.py --urls urls.txt [--workers 8] [--extract-workers 4] [--output OUTDIR]
+
+URLs are downloaded concurrently into a content-addressed cache
+(--cache-dir, default .pdf_reader_cache): files are stored under their
+SHA-256, a URL seen before is revalidated with If-None-Match /
+If-Modified-Since so an unchanged file is not transferred again, and the
+least recently used files are evicted once the cache exceeds
+--cache-max-mb. Each finished download goes straight to an extraction
+worker while the remaining downloads continue.
+
+To try it locally, serve a directory of PDFs with `python -m http.server`
+and pass http://localhost:8000/<name>.pdf URLs; its Last-Modified headers
+exercise the conditional requests.
 
 Dependencies (install via pip):
     pip install PyPDF2 pdfplumber pdfminer.six tqdm requests
 """
 
 import argparse
+import hashlib
 import json
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 # -------------------------------------------------
 # 1. Import libraries – fall back to stub if missing
@@ -46,27 +64,199 @@ except ImportError:  # pragma: no cover
 import requests
 from urllib.parse import urlparse
 
+CACHE_DIR = ".pdf_reader_cache"
+CACHE_MAX_MB = 512
+CHUNK_SIZE = 1 << 16
+TIMEOUT = 15
+
 # -------------------------------------------------
-# 2. Helpers
+# 2. Download cache
 # -------------------------------------------------
-def download_pdf(url: str, tmp_dir: Path) -> Path:
-    """Download a PDF from a URL to a temporary directory."""
+class DownloadCache:
+    """
+    Content-addressed store for downloaded PDFs.
+
+        objects/<sha256[:2]>/<sha256>.pdf   file bodies, one copy per distinct content
+        index.json                          url -> sha256, etag, last_modified
+
+    Safe to share between download threads. Objects in use (handed out and
+    not yet released) are never evicted.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects = root / "objects"
+        self.tmp = root / "tmp"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.tmp.mkdir(exist_ok=True)
+        self._index_path = root / "index.json"
+        self._lock = threading.Lock()
+        self._in_use: Dict[str, int] = {}
+        # sha256 -> size of every object, least recently used first, and their
+        # total: kept up to date by store/acquire/_evict so eviction never has
+        # to list or stat the directory (it is scanned once, here).
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        for p, st in sorted(((p, p.stat()) for p in self.objects.glob("*/*.pdf")), key=lambda x: x[1].st_mtime):
+            self._sizes[p.stem] = st.st_size
+        self._total = sum(self._sizes.values())
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def path(self, sha: str) -> Path:
+        return self.objects / sha[:2] / f"{sha}.pdf"
+
+    def lookup(self, url: str) -> Optional[dict]:
+        """Index entry for url, if its object is still in the cache."""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry and self.path(entry["sha256"]).exists():
+                return dict(entry)
+            return None
+
+    def acquire(self, sha: str) -> Optional[Path]:
+        """
+        Pin an object (protect it from eviction) and mark it recently used.
+        Returns None if it has been evicted since it was looked up.
+        """
+        path = self.path(sha)
+        with self._lock:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            self._in_use[sha] = self._in_use.get(sha, 0) + 1
+            if sha in self._sizes:
+                self._sizes.move_to_end(sha)
+        return path
+
+    def release(self, sha: str) -> None:
+        with self._lock:
+            self._in_use[sha] -= 1
+            if not self._in_use[sha]:
+                del self._in_use[sha]
+
+    def store(self, url: str, tmp_path: Path, sha: str, etag: Optional[str], last_modified: Optional[str]) -> Path:
+        """Move a finished download into place, record it for url and pin it."""
+        path = self.path(sha)
+        path.parent.mkdir(exist_ok=True)
+        with self._lock:  # so the object cannot be evicted between the check and the pin
+            if path.exists():  # same content under another URL, or re-downloaded
+                tmp_path.unlink()
+            else:
+                os.replace(tmp_path, path)
+            size = path.stat().st_size
+            self._index[url] = {"sha256": sha, "etag": etag, "last_modified": last_modified,
+                                "size": size, "fetched": time.time()}
+            self._in_use[sha] = self._in_use.get(sha, 0) + 1
+            if sha not in self._sizes:
+                self._total += size
+            self._sizes[sha] = size
+            self._sizes.move_to_end(sha)
+            self._evict()
+            self._save()
+        return path
+
+    def trim(self) -> None:
+        """Evict down to max_bytes now (objects still pinned are kept)."""
+        with self._lock:
+            self._evict()
+            self._save()
+
+    def _evict(self) -> None:
+        if self._total <= self.max_bytes:
+            return
+        evicted = set()
+        for sha, size in list(self._sizes.items()):
+            if self._total <= self.max_bytes:
+                break
+            if sha in self._in_use:
+                continue
+            self.path(sha).unlink(missing_ok=True)
+            del self._sizes[sha]
+            self._total -= size
+            evicted.add(sha)
+        if evicted:
+            self._index = {u: e for u, e in self._index.items() if e["sha256"] not in evicted}
+
+    def _save(self) -> None:
+        tmp = self._index_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, indent=1)
+        os.replace(tmp, self._index_path)
+
+
+_local = threading.local()
+
+
+def _session() -> "requests.Session":
+    """One requests.Session (connection pool) per download thread."""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def download_pdf(url: str, cache: DownloadCache) -> Tuple[Path, str, str]:
+    """
+    Fetch url through the cache. Returns (path, sha256, status) with status
+    "downloaded", "not-modified" (304 on revalidation) or "duplicate" (new
+    download whose content was already cached). The object is pinned until
+    cache.release(sha256). A 304 for an object evicted since the lookup is a
+    miss: the URL is fetched again without validators.
+    """
     parsed = urlparse(url)
     if not parsed.scheme.startswith("http"):
         raise ValueError(f"Unsupported URL scheme: {parsed.scheme}")
 
-    local_path = tmp_dir / Path(parsed.path).name
-    if not local_path.suffix.lower() == ".pdf":
-        local_path = local_path.with_suffix(".pdf")
+    entry = cache.lookup(url)
+    while True:
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        r = _session().get(url, headers=headers, stream=True, timeout=TIMEOUT)
+        if r.status_code != 304:
+            break
+        r.close()
+        if not headers:
+            raise requests.HTTPError(f"304 Not Modified for an unconditional request: {url}", response=r)
+        path = cache.acquire(entry["sha256"])
+        if path is not None:
+            return path, entry["sha256"], "not-modified"
+        # evicted since the lookup: fetch it again, without validators
+        entry = None
+
+    with r:
+        r.raise_for_status()
+        h = hashlib.sha256()
+        tmp_path = cache.tmp / f"{threading.get_ident()}-{time.monotonic_ns()}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    h.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        sha = h.hexdigest()
+        status = "duplicate" if cache.path(sha).exists() else "downloaded"
+        path = cache.store(url, tmp_path, sha, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+    return path, sha, status
 
-    r = requests.get(url, stream=True, timeout=15)
-    r.raise_for_status()
-    with open(local_path, "wb") as f:
-        for chunk in r.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-    return local_path
 
+def output_name(url: str) -> str:
+    """Base name for a URL's outputs: the file name in its path, else its host."""
+    parsed = urlparse(url)
+    return Path(parsed.path).stem or parsed.netloc.replace(":", "_")
+
+# -------------------------------------------------
+# 3. Extraction helpers
+# -------------------------------------------------
 def extract_with_pypdf2(pdf_path: Path) -> Tuple[List[str], dict]:
     """Extract text and metadata using PyPDF2."""
     with open(pdf_path, "rb") as f:
@@ -129,9 +319,10 @@ def write_output(
         meta: dict,
         out_dir: Path,
         verbose: bool = False,
+        base_name: Optional[str] = None,
 ):
-    """Write plain‑text and JSON dump to out_dir."""
-    base_name = pdf_path.stem
+    """Write plain‑text and JSON dump to out_dir (named after base_name, default the PDF's stem)."""
+    base_name = base_name or pdf_path.stem
     txt_out = out_dir / f"{base_name}.txt"
     json_out = out_dir / f"{base_name}_pages.json"
 
@@ -154,35 +345,131 @@ def write_output(
         print(f"✅ Text written to: {txt_out}")
         print(f"✅ JSON written to: {json_out}")
 
+def extract_to(pdf_path: Path, base_name: str, out_dir: Path, verbose: bool = False) -> int:
+    """Extract one PDF and write its outputs; returns the number of pages. Runs in a worker process."""
+    if verbose:
+        print(f"[INFO] Processing: {pdf_path}")
+    page_texts, meta = best_extraction(pdf_path, verbose=verbose)
+    write_output(pdf_path, page_texts, meta, out_dir, verbose=verbose, base_name=base_name)
+    return len(page_texts)
+
+
+def read_url_list(path: Path) -> List[str]:
+    """One URL or path per line; blank lines and '#' comments are skipped."""
+    with open(path, encoding="utf-8") as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+
+
+def process_sources(
+        sources: List[str],
+        out_dir: Path,
+        cache: DownloadCache,
+        workers: int,
+        extract_workers: int,
+        verbose: bool = False,
+) -> int:
+    """
+    Download URLs on a pool of `workers` threads and extract each PDF on a
+    pool of `extract_workers` processes as soon as its download finishes
+    (local files go straight to extraction). Returns the number of failures.
+    """
+    names: Dict[str, str] = {}
+    taken = set()
+    for src in sources:
+        is_url = src.lower().startswith(("http://", "https://"))
+        name = output_name(src) if is_url else Path(src).stem
+        if name in taken:
+            name = f"{name}_{hashlib.sha256(src.encode()).hexdigest()[:8]}"
+        taken.add(name)
+        names[src] = name
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as downloads, \
+            ProcessPoolExecutor(max_workers=extract_workers) as extractions, \
+            tqdm(total=len(sources), unit="pdf", disable=verbose) as bar:
+        fetching = {}
+        extracting = {}
+        for src in sources:
+            if src.lower().startswith(("http://", "https://")):
+                fetching[downloads.submit(download_pdf, src, cache)] = src
+                continue
+            pdf_path = Path(src).expanduser().resolve()
+            if not pdf_path.is_file():
+                print(f"❌ File does not exist: {pdf_path}")
+                failures += 1
+                bar.update()
+                continue
+            extracting[extractions.submit(extract_to, pdf_path, names[src], out_dir, verbose)] = (src, None)
+
+        pending = set(fetching) | set(extracting)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in fetching:
+                    src = fetching.pop(fut)
+                    try:
+                        pdf_path, sha, status = fut.result()
+                    except Exception as e:
+                        print(f"❌ Download failed: {src}: {e}")
+                        failures += 1
+                        bar.update()
+                        continue
+                    if verbose:
+                        print(f"[{status}] {src} -> {pdf_path}")
+                    ext = extractions.submit(extract_to, pdf_path, names[src], out_dir, verbose)
+                    extracting[ext] = (src, sha)
+                    pending.add(ext)
+                else:
+                    src, sha = extracting.pop(fut)
+                    if sha:
+                        cache.release(sha)
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        print(f"❌ Extraction failed: {src}: {e}")
+                        failures += 1
+                    bar.update()
+    cache.trim()
+    return failures
+
 # -------------------------------------------------
-# 3. CLI
+# 4. CLI
 # -------------------------------------------------
 def main() -> None:
     parser = argparse.ArgumentParser(description="Extract PDF text with multiple back‑ends.")
-    parser.add_argument("source", help="Local file path or HTTP(S) URL to a PDF.")
+    parser.add_argument("source", nargs="*", help="Local file paths or HTTP(S) URLs of PDFs.")
+    parser.add_argument("--urls", help="File with one URL or path per line (bulk mode).")
     parser.add_argument("--output", "-o", default=".", help="Directory to write results (default: current dir).")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent downloads (default: 8).")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1,
+                        help="Extraction processes (default: number of CPUs).")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help=f"Download cache directory (default: {CACHE_DIR}).")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_MB,
+                        help=f"Evict least recently used downloads above this size (default: {CACHE_MAX_MB}).")
     parser.add_argument("--verbose", "-v", action="store_true", help="Print progress information.")
     args = parser.parse_args()
 
+    sources = list(args.source)
+    if args.urls:
+        sources += read_url_list(Path(args.urls))
+    if not sources:
+        parser.error("give at least one PDF path or URL, or --urls FILE")
+
     out_dir = Path(args.output).expanduser().resolve()
     out_dir.mkdir(parents=True, exist_ok=True)
+    cache = DownloadCache(Path(args.cache_dir).expanduser().resolve(), int(args.cache_max_mb * 1024 * 1024))
 
-    # Resolve source to a local file
-    if args.source.lower().startswith(("http://", "https://")):
-        tmp_dir = Path.cwd() / ".pdf_reader_tmp"
-        tmp_dir.mkdir(exist_ok=True)
-        pdf_path = download_pdf(args.source, tmp_dir)
-    else:
-        pdf_path = Path(args.source).expanduser().resolve()
-        if not pdf_path.is_file():
-            print(f"❌ File does not exist: {pdf_path}")
-            sys.exit(1)
-
-    if args.verbose:
-        print(f"[INFO] Processing: {pdf_path}")
-
-    page_texts, meta = best_extraction(pdf_path, verbose=args.verbose)
-    write_output(pdf_path, page_texts, meta, out_dir, verbose=args.verbose)
+    failures = process_sources(
+        sources,
+        out_dir,
+        cache,
+        workers=max(1, min(args.workers, len(sources))),
+        extract_workers=max(1, min(args.extract_workers, len(sources))),
+        verbose=args.verbose,
+    )
+    if failures:
+        print(f"❌ {failures} of {len(sources)} PDF(s) failed.")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,48 +1,78 @@
+import argparse
 import pdfplumber
 import csv
 import os
 import glob
+import time
+import fx_metrics as metrics
+from fx_metrics import log
 
 PDF_DIR = "generated-pdf"
 CSV_FILE = "fx_transactions.csv"
 
-def extract_table_from_pdf(pdf_file):
-    all_rows = []
-    with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            for table in tables:
-                all_rows.extend(table)
-    return all_rows
-
 def write_csv(table, csv_file):
     with open(csv_file, "w", newline="") as f:
         writer = csv.writer(f)
         for row in table:
             writer.writerow(row)
 
-if __name__ == "__main__":
-    all_tables = []
-    seen_headers = set()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract FX transaction tables from PDFs into one CSV.")
+    parser.add_argument("--pdf-dir", default=PDF_DIR, help=f"Directory of PDFs to read (default: {PDF_DIR}).")
+    parser.add_argument("--output", default=CSV_FILE, help=f"CSV file to write (default: {CSV_FILE}).")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.instrumented(args, job="extract"):
+        extract_all(args.pdf_dir, args.output)
+
+def iter_page_rows(pdf_files):
+    """
+    Yield (header_row, page_rows) for every PDF page in order. The header is
+    the first non-empty row seen; blank rows and repeated headers are dropped
+    from page_rows.
+    """
     header_row = None
+    header_key = None
+    for n, pdf_file in enumerate(pdf_files, start=1):
+        log.info("Processing file %d/%d: %s", n, len(pdf_files), pdf_file)
+        with pdfplumber.open(pdf_file) as pdf:
+            for page in pdf.pages:
+                with metrics.timer("page_extract_seconds"):
+                    tables = page.extract_tables()
+                metrics.inc("pages_total")
+                page_rows = []
+                for table in tables:
+                    for row in table:
+                        if not any((cell or "").strip() for cell in row):
+                            continue
+                        key = tuple((cell or "").strip().lower() for cell in row)
+                        if header_row is None:
+                            header_row, header_key = row, key
+                        elif key != header_key:
+                            page_rows.append(row)
+                yield header_row, page_rows
+        metrics.inc("files_total")
 
-    pdf_files = sorted(glob.glob(os.path.join(PDF_DIR, "*.pdf")))
-    for pdf_file in pdf_files:
-        table = extract_table_from_pdf(pdf_file)
-        for row in table:
-            if not any(cell.strip() for cell in row):
-                continue
-            header_tuple = tuple(cell.strip().lower() for cell in row)
-            if header_row is None:
-                header_row = row
-                all_tables.append(row)
-                seen_headers.add(header_tuple)
-            elif header_tuple == tuple(cell.strip().lower() for cell in header_row):
-                continue  # skip duplicate header
-            else:
-                all_tables.append(row)
-    write_csv(all_tables, CSV_FILE)
-    print(f"CSV generated: {CSV_FILE}")
+def list_pdfs(pdf_dir):
+    return sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))
+
+def extract_all(pdf_dir, output):
+    t0 = time.perf_counter()
+    header_row = None
+    all_rows = []
+    for header_row, page_rows in iter_page_rows(list_pdfs(pdf_dir)):
+        all_rows.extend(page_rows)
+    table = ([header_row] if header_row is not None else []) + all_rows
+    metrics.inc("rows_extracted_total", len(all_rows))
+    metrics.observe("stage_seconds", time.perf_counter() - t0, stage="extract")
+    metrics.rate("rows_per_second", len(all_rows), time.perf_counter() - t0, stage="extract")
+    with metrics.stage("write_csv"):
+        write_csv(table, output)
+    log.info("CSV generated: %s", output)
+
+if __name__ == "__main__":
+    main()
 
 # pdfplumber is a strong choice for extracting tables from PDFs.
 # Alternatives: camelot, tabula-py (require Java or work best with specific PDF types).
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+run_pipeline.py – in-process pipeline orchestrator (replaces the body of run_all.sh).
+
+Stages run in order: generate -> extract -> enrich -> tca. Each stage has a
+key derived from the content of its inputs and its settings; a stage whose
+key matches the last successful run (and whose output still exists) is
+skipped. When both extract and enrich need to run they are fused: a
+producer thread extracts PDF pages into a bounded queue while the main
+thread enriches the previous batch, so rows never round-trip through
+fx_transactions.csv on the way to the enrichment (the CSV is still written
+as an artifact). Batches share one tick cache, are parsed exactly as the
+CSV would be and are checkpointed like the standalone enrichment, so
+--resume continues an interrupted run. A per-stage timing report is
+printed at the end.
+
+Usage:
+    python run_pipeline.py                 # reuse existing PDFs, skip unchanged stages
+    python run_pipeline.py --regenerate    # fresh PDFs (what run_all.sh does)
+    python run_pipeline.py --force         # ignore the stage cache
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+import fx_checkpoint
+import fx_metrics as metrics
+
+STATE_FILE = ".pipeline_state.json"
+PDF_DIR = "generated-pdf"
+TRANSACTIONS_CSV = "fx_transactions.csv"
+ENRICHED_CSV = "fx_transactions_with_rates.csv"
+TCA_DIR = "tca"
+
+STAGES = ("generate", "extract", "enrich", "tca")
+
+_DONE = object()
+
+
+def hash_files(paths):
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        h.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_values(*values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+class Report:
+    """Collects per-stage status, busy time and row counts for the final table."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def record(self, stage, status, seconds=0.0, rows=None, note=""):
+        self.rows[stage] = (status, seconds, rows, note)
+        if status == "ran":
+            metrics.observe("stage_seconds", seconds, stage=stage)
+
+    def render(self, wall):
+        lines = [f"{'Stage':<10} {'Status':<8} {'Seconds':>9} {'Rows':>9}  Note"]
+        for stage in STAGES:
+            status, seconds, rows, note = self.rows.get(stage, ("-", 0.0, None, ""))
+            rows = "-" if rows is None else str(rows)
+            lines.append(f"{stage:<10} {status:<8} {seconds:>9.3f} {rows:>9}  {note}")
+        lines.append(f"{'wall':<10} {'':<8} {wall:>9.3f}")
+        return "\n".join(lines)
+
+
+def frame_from_rows(header, rows):
+    """Extracted rows as the DataFrame read_transactions() would give for the same CSV."""
+    from fx_transactions_with_rates import read_transactions
+
+    buf = io.StringIO()
+    csv.writer(buf).writerows([header] + rows)
+    buf.seek(0)
+    return read_transactions(buf)
+
+
+def enrich_args(args):
+    """args with the names fx_transactions_with_rates.enrich_checkpointed expects."""
+    return argparse.Namespace(**vars(args), input=args.transactions_csv)
+
+
+def run_generate(args, report):
+    import generate_fx_transactions_pdf as gen
+
+    t0 = time.perf_counter()
+    for old in glob.glob(os.path.join(args.pdf_dir, "*.pdf")):
+        os.remove(old)
+    files = gen.generate_pdfs(args.pdf_dir, n_files=args.n_files)
+    report.record("generate", "ran", time.perf_counter() - t0, rows=len(files) * gen.N_TRANSACTIONS)
+
+
+def run_extract(args, report):
+    import pdf_to_csv_fx_transactions as extract
+
+    t0 = time.perf_counter()
+    extract.extract_all(args.pdf_dir, args.transactions_csv)
+    with open(args.transactions_csv, encoding="utf-8") as f:
+        rows = max(sum(1 for _ in f) - 1, 0)
+    report.record("extract", "ran", time.perf_counter() - t0, rows=rows)
+
+
+def run_enrich(args, report):
+    import fx_transactions_with_rates as enrichment
+
+    t0 = time.perf_counter()
+    df = enrichment.read_transactions(args.transactions_csv)
+    enrichment.connect(args.source)
+    if args.checkpoint_rows > 0 and len(df) > 0:
+        enrichment.enrich_checkpointed(df, enrich_args(args))
+    else:
+        enrichment.enrich(df, levels=args.levels, max_legs=args.max_legs)
+        df.to_csv(args.output, index=False)
+    report.record("enrich", "ran", time.perf_counter() - t0, rows=len(df))
+
+
+def run_tca(args, report):
+    import fx_tca
+
+    t0 = time.perf_counter()
+    df = fx_tca.score(fx_tca.read_enriched(args.output))
+    fx_tca.write_reports(df, args.tca_dir)
+    report.record("tca", "ran", time.perf_counter() - t0, rows=len(df),
+                  note=f"{int(df['outside_band'].sum())} outside band")
+
+
+def run_extract_enrich(args, report, key):
+    """
+    Overlapped extract + enrich. The producer thread pushes batches of
+    `batch_pages` pages into a queue of at most `queue_size` batches, so
+    extraction runs at most that far ahead of enrichment. All batches share
+    one tick cache, so a pair is fetched once per run rather than once per
+    batch. Enriched batches are checkpointed in segments of at least
+    `checkpoint_rows` rows under `key` (the enrich stage key); with --resume,
+    batches inside a finished segment are extracted but not enriched again.
+    """
+    import fx_transactions_with_rates as enrichment
+    import pdf_to_csv_fx_transactions as extract
+
+    q = queue.Queue(maxsize=args.queue_size)
+    busy = {"extract": 0.0, "enrich": 0.0}
+
+    def produce():
+        try:
+            pages = extract.iter_page_rows(extract.list_pdfs(args.pdf_dir))
+            header, batch, n_pages = None, [], 0
+            while True:
+                t = time.perf_counter()
+                item = next(pages, None)
+                busy["extract"] += time.perf_counter() - t
+                if item is None:
+                    break
+                header, page_rows = item
+                batch.extend(page_rows)
+                n_pages += 1
+                if n_pages % args.batch_pages == 0 and batch:
+                    q.put((header, batch))
+                    batch = []
+            if batch:
+                q.put((header, batch))
+            q.put((header, _DONE))
+        except BaseException as e:  # surface extraction failures in the main thread
+            q.put((None, e))
+
+    producer = threading.Thread(target=produce, name="extract", daemon=True)
+    producer.start()
+
+    enrichment.connect(args.source)
+    cache = enrichment.new_tick_cache()
+    checkpoint = None
+    if args.checkpoint_rows > 0:
+        directory = args.checkpoint_dir or f"{args.output}.ckpt"
+        # segment boundaries follow the batches, so they are part of the key
+        key = hash_values(key, args.batch_pages, args.checkpoint_rows)
+        checkpoint = fx_checkpoint.Checkpoint.open(directory, key, resume=args.resume)
+    header, raw_rows, enriched, pending = None, [], [], []
+
+    def flush():
+        # write the pending batches as one segment
+        start = len(raw_rows) - sum(len(df) for df in pending)
+        checkpoint.complete(start, len(raw_rows), pd.concat(pending, ignore_index=True))
+        pending.clear()
+
+    while True:
+        header, item = q.get()
+        if item is _DONE:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        t = time.perf_counter()
+        lo, hi = len(raw_rows), len(raw_rows) + len(item)
+        raw_rows.extend(item)
+        if checkpoint and any(a <= lo and hi <= b for a, b in checkpoint.done):
+            metrics.inc("checkpoint_rows_skipped_total", hi - lo)
+        else:
+            # progress is out of the rows extracted so far; the total is known only at the end
+            df = enrichment.enrich(frame_from_rows(header, item), levels=args.levels, max_legs=args.max_legs,
+                                   cache=cache, row_offset=lo, total_rows=hi)
+            if checkpoint:
+                pending.append(df)
+                if sum(len(p) for p in pending) >= args.checkpoint_rows:
+                    flush()
+            else:
+                enriched.append(df)
+        busy["enrich"] += time.perf_counter() - t
+    producer.join()
+
+    t = time.perf_counter()
+    if header is not None:
+        extract.write_csv([header] + raw_rows, args.transactions_csv)
+    busy["extract"] += time.perf_counter() - t
+    t = time.perf_counter()
+    if checkpoint:
+        if pending:
+            flush()
+        if checkpoint.done:
+            checkpoint.assemble(args.output, sorted(checkpoint.done))
+        else:
+            pd.DataFrame().to_csv(args.output, index=False)
+        checkpoint.remove()
+    else:
+        out = pd.concat(enriched, ignore_index=True) if enriched else pd.DataFrame()
+        out.to_csv(args.output, index=False)
+    busy["enrich"] += time.perf_counter() - t
+
+    report.record("extract", "ran", busy["extract"], rows=len(raw_rows), note="overlapped with enrich")
+    report.record("enrich", "ran", busy["enrich"], rows=len(raw_rows), note="in-memory input")
+
+
+def run(args):
+    state = {} if args.force else load_state(args.state_file)
+    new_state = dict(state)
+    report = Report()
+    wall0 = time.perf_counter()
+
+    # generate: no content inputs, so it only runs on request or when there are no PDFs.
+    pdfs = glob.glob(os.path.join(args.pdf_dir, "*.pdf"))
+    if args.regenerate or not pdfs:
+        run_generate(args, report)
+        pdfs = glob.glob(os.path.join(args.pdf_dir, "*.pdf"))
+    else:
+        report.record("generate", "skipped", note=f"{len(pdfs)} PDFs present")
+
+    import fx_sources
+
+    keys = {}
+    keys["extract"] = hash_values("extract", hash_files(pdfs))
+    # the price fingerprint changes when ticks are loaded, so enrichment re-runs on new prices
+    keys["enrich"] = hash_values("enrich", keys["extract"], args.levels, args.source, args.max_legs,
+                                 fx_sources.fingerprint(args.source))
+    keys["tca"] = hash_values("tca", keys["enrich"])
+    outputs = {
+        "extract": args.transactions_csv,
+        "enrich": args.output,
+        "tca": os.path.join(args.tca_dir, "tca_summary.json"),
+    }
+
+    def needed(stage):
+        return state.get(stage) != keys[stage] or not os.path.exists(outputs[stage])
+
+    need_extract, need_enrich = needed("extract"), needed("enrich")
+    if need_extract and need_enrich:
+        run_extract_enrich(args, report, keys["enrich"])
+    else:
+        if need_extract:
+            run_extract(args, report)
+        else:
+            report.record("extract", "skipped", note="PDFs unchanged")
+        if need_enrich:
+            run_enrich(args, report)
+        else:
+            report.record("enrich", "skipped", note="input and prices unchanged")
+    if needed("tca"):
+        run_tca(args, report)
+    else:
+        report.record("tca", "skipped", note="enriched output unchanged")
+
+    for stage in ("extract", "enrich", "tca"):
+        new_state[stage] = keys[stage]
+    save_state(new_state, args.state_file)
+
+    print()
+    print(report.render(time.perf_counter() - wall0))
+    return report
+
+
+def main(argv=None):
+    import fx_transactions_with_rates as enrichment
+
+    parser = argparse.ArgumentParser(description="Run generate -> extract -> enrich in one process.")
+    parser.add_argument("--pdf-dir", default=PDF_DIR)
+    parser.add_argument("--transactions-csv", default=TRANSACTIONS_CSV)
+    parser.add_argument("--output", default=ENRICHED_CSV)
+    parser.add_argument("--tca-dir", default=TCA_DIR, help=f"Directory for the TCA reports (default: {TCA_DIR}).")
+    parser.add_argument("--levels", type=enrichment.parse_levels, default=enrichment.DEFAULT_LEVELS,
+                        help="Book levels for the bands (see fx_transactions_with_rates.py).")
+    parser.add_argument("--source", default=enrichment.fx_sources.DEFAULT_SOURCE,
+                        help="Price source for the enrichment: clickhouse, parquet:DIR or memory (default: %(default)s).")
+    parser.add_argument("--max-legs", type=int, default=enrichment.fx_catalog.MAX_LEGS,
+                        help=f"Longest conversion path for crosses (default: {enrichment.fx_catalog.MAX_LEGS}).")
+    parser.add_argument("--checkpoint-rows", type=int, default=fx_checkpoint.CHECKPOINT_ROWS,
+                        help="Rows per checkpointed enrichment segment; 0 disables "
+                             f"(default: {fx_checkpoint.CHECKPOINT_ROWS}).")
+    parser.add_argument("--checkpoint-dir", help="Directory for segments and manifest (default: <output>.ckpt).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip enrichment already checkpointed by an interrupted run on the same input.")
+    parser.add_argument("--n-files", type=int, default=3, help="PDFs to generate (default: 3).")
+    parser.add_argument("--regenerate", action="store_true", help="Replace the PDFs with freshly generated ones.")
+    parser.add_argument("--force", action="store_true", help="Run every stage regardless of the stage cache.")
+    parser.add_argument("--batch-pages", type=int, default=1, help="PDF pages per enrichment batch (default: 1).")
+    parser.add_argument("--queue-size", type=int, default=4, help="Max extracted batches waiting for enrichment.")
+    parser.add_argument("--state-file", default=STATE_FILE)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    args.batch_pages = max(args.batch_pages, 1)
+    args.queue_size = max(args.queue_size, 1)
+
+    with metrics.instrumented(args, job="pipeline"):
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
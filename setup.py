@@ -10,12 +10,19 @@ setup(
         "clickhouse-driver==0.2.6",
         "pandas==2.2.2"
     ],
+    extras_require={
+        # parquet:DIR price source and fx_sources.py export
+        "parquet": ["pyarrow>=14.0"],
+    },
     entry_points={
         "console_scripts": [
             # You must add a main() function to these scripts for this to work
             "fx-generate=generate_fx_transactions_pdf:main",
             "fx-extract=pdf_to_csv_fx_transactions:main",
-            "fx-enrich=fx_transactions_with_rates:main"
+            "fx-enrich=fx_transactions_with_rates:main",
+            "fx-stream=fx_stream_enrich:main",
+            "fx-tca=fx_tca:main",
+            "fx-sources=fx_sources:main"
         ]
     },
     include_package_data=True,
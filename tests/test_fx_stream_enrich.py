@@ -0,0 +1,101 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+import fx_rates
+import fx_stream_enrich
+
+BASE = pd.Timestamp("2025-07-22 01:00:00")
+
+
+class FakeClient:
+    """
+    Answers fx_rates.build_since_query() from an in-memory fx_price:
+    rows past each pair's bound, oldest first, up to the LIMIT.
+    """
+
+    def __init__(self, rows):
+        self.rows = sorted(rows)  # (timestamp, ccypair, bids, asks)
+        self.queries = 0
+
+    def execute(self, query, params, columnar=False, settings=None):
+        self.queries += 1
+        since = {}
+        i = 0
+        while f"p{i}" in params:
+            since[params[f"p{i}"]] = pd.Timestamp(params[f"t{i}"])
+            i += 1
+        limit = re.search(r"LIMIT (\d+)", query)
+        out = [r for r in self.rows if r[1] in since and r[0] > since[r[1]]]
+        out = out[:int(limit.group(1))] if limit else out
+        return [list(col) for col in zip(*out)] if out else []
+
+
+def make_rows():
+    busy = [(BASE + pd.Timedelta(seconds=i), "EURUSD", [1.1, 1.09], [1.2, 1.21]) for i in range(100)]
+    illiquid = [(BASE - pd.Timedelta(minutes=10 - i), "USDJPY", [150.0, 149.9], [150.1, 150.2]) for i in range(3)]
+    return busy + illiquid
+
+
+def make_poller(client, limit):
+    poller = fx_stream_enrich.TickPoller(fx_stream_enrich.ClickHouseTickSource(client, limit=limit))
+    hw = {"EURUSD": (BASE + pd.Timedelta(seconds=5)).value, "USDJPY": (BASE - pd.Timedelta(hours=1)).value}
+    for pair, ns in hw.items():
+        poller.rings[pair] = fx_stream_enrich.TickRing(1000)
+        poller.high_water[pair] = poller.covered_from[pair] = ns
+    return poller
+
+
+def test_since_query_bounds_each_pair_by_its_own_high_water_mark():
+    query, params = fx_rates.build_since_query(
+        {"USDJPY": BASE - pd.Timedelta(hours=1), "EURUSD": BASE}, columns=("timestamp", "ccypair"), limit=5
+    )
+    assert "(ccypair = %(p0)s AND timestamp > toDateTime64(%(t0)s, 9))" in query
+    assert "(ccypair = %(p1)s AND timestamp > toDateTime64(%(t1)s, 9))" in query
+    assert query.rstrip().endswith("LIMIT 5")
+    assert (params["p0"], params["p1"]) == ("EURUSD", "USDJPY")
+    assert params["since"] == params["t1"]
+
+
+def test_lagging_pair_does_not_stall_a_small_limit_poll():
+    client = FakeClient(make_rows())
+    poller = make_poller(client, limit=5)
+
+    for _ in range(50):
+        if poller.poll() == 0:
+            break
+    else:
+        raise AssertionError("poll never caught up")
+
+    assert len(poller.rings["USDJPY"]) == 3
+    assert len(poller.rings["EURUSD"]) == 94  # ticks after the 5 s high-water mark
+    assert poller.high_water["EURUSD"] == (BASE + pd.Timedelta(seconds=99)).value
+    assert client.queries <= 21  # 97 rows, 5 per poll, plus the empty final poll
+
+
+def test_every_polled_row_is_new():
+    client = FakeClient(make_rows())
+    source = fx_stream_enrich.ClickHouseTickSource(client, limit=5)
+    since = {"EURUSD": (BASE + pd.Timedelta(seconds=5)).value, "USDJPY": (BASE - pd.Timedelta(hours=1)).value}
+    rows = source.fetch(since)
+    assert len(rows) == 5
+    assert all(ts > since[pair] for ts, pair, _, _ in rows)
+    assert np.all(np.diff([ts for ts, _, _, _ in rows]) >= 0)
+
+
+def test_stream_prices_non_usd_crosses_from_the_catalog():
+    t0 = BASE.value
+    ticks = [(t0 + i * 10**9, "AUDNZD", [1.1, 1.1], [1.2, 1.2]) for i in range(30)]
+    ticks += [(t0 + i * 10**9, "NZDJPY", [90.0, 90.0], [91.0, 91.0]) for i in range(30)]
+    ticks += [(t0 + i * 10**9, "EURUSD", [1.1], [1.2]) for i in range(30)]
+    poller = fx_stream_enrich.TickPoller(fx_stream_enrich.MemoryTickSource(ticks))
+    window_ns = 10 * 10**9
+    trade = {"tradedatetime": (BASE + pd.Timedelta(seconds=20)).strftime("%d/%m/%y %H:%M:%S"),
+             "buy/sell": "Buy", "from ccy": "AUD", "to ccy": "JPY"}
+
+    out = fx_stream_enrich.price_trade(trade, poller, window_ns)
+
+    assert out["cross_used"] == "AUDNZD * NZDJPY"
+    assert np.isclose(out["bid_min"], 1.1 * 90.0) and np.isclose(out["ask_max"], 1.2 * 91.0)
+    assert "EURUSD" not in poller.rings  # only the legs of the routes tried are tracked
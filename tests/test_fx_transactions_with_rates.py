@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+from fx_catalog import Leg
+from fx_transactions_with_rates import (
+    Ticks, book_vwap, coalesce_spans, merge_spans, path_series, path_vwap, subtract_spans, window_reduce,
+)
+
+nan = np.nan
+
+
+def ticks(ts, bids, asks, qtys):
+    return Ticks(np.asarray(ts, dtype=np.int64), np.asarray(bids, dtype=float),
+                 np.asarray(asks, dtype=float), np.asarray(qtys, dtype=float))
+
+
+# window_reduce
+
+def test_window_reduce_ignores_nan_and_gives_nan_for_empty_windows():
+    values = np.array([[1.0, nan], [3.0, nan], [nan, nan], [2.0, 5.0]])
+    starts = np.array([0, 1, 2, 2, 4])
+    ends = np.array([2, 1, 3, 4, 4])  # [0,2), empty, all-NaN, mixed, empty at the end
+    mx = window_reduce(np.maximum, values, starts, ends)
+    mn = window_reduce(np.minimum, values, starts, ends)
+    np.testing.assert_array_equal(mx, [[3.0, nan], [nan, nan], [nan, nan], [2.0, 5.0], [nan, nan]])
+    np.testing.assert_array_equal(mn, [[1.0, nan], [nan, nan], [nan, nan], [2.0, 5.0], [nan, nan]])
+
+
+def test_window_reduce_one_dimensional_and_no_windows():
+    values = np.array([4.0, 1.0, 7.0])
+    np.testing.assert_array_equal(window_reduce(np.maximum, values, np.array([0, 1]), np.array([3, 2])), [7.0, 1.0])
+    assert window_reduce(np.minimum, values, np.array([], dtype=int), np.array([], dtype=int)).shape == (0,)
+
+
+# book_vwap
+
+def test_book_vwap_walks_levels_and_flags_partial_fills():
+    prices = np.array([[1.0, 2.0, 3.0]] * 3)
+    qtys = np.array([[10.0, 10.0, 10.0]] * 3)
+    vwap, filled = book_vwap(prices, qtys, np.array([5.0, 15.0, 50.0]))
+    np.testing.assert_allclose(vwap, [1.0, (10 * 1 + 5 * 2) / 15, 2.0])  # the last covers the whole book
+    np.testing.assert_array_equal(filled, [True, True, False])
+
+
+def test_book_vwap_skips_nan_levels_and_empty_books():
+    prices = np.array([[1.0, nan, 3.0], [nan, nan, nan]])
+    qtys = np.array([[10.0, 10.0, 10.0], [10.0, 10.0, 10.0]])
+    vwap, filled = book_vwap(prices, qtys, np.array([15.0, 1.0]))
+    np.testing.assert_allclose(vwap[0], (10 * 1 + 5 * 3) / 15)
+    assert np.isnan(vwap[1])
+    np.testing.assert_array_equal(filled, [True, False])
+
+
+# path_series / path_vwap
+
+def test_inverted_cross_leg_swaps_and_reciprocates_sides():
+    # EUR -> USD -> JPY with the second leg quoted as JPYUSD, i.e. used inverted
+    eurusd = ticks([10, 20], [[1.10], [1.20]], [[1.11], [1.21]], [[1e6], [1e6]])
+    jpyusd = ticks([5, 15], [[0.0080], [0.0100]], [[0.0081], [0.0101]], [[1e9], [1e9]])
+    path = (Leg("EURUSD", False), Leg("JPYUSD", True))
+    series = path_series(path, {"EURUSD": eurusd, "JPYUSD": jpyusd}, window_ns=100)
+    np.testing.assert_array_equal(series.ts, [10, 20])
+    # each EURUSD tick meets the latest JPYUSD tick at or before it
+    np.testing.assert_allclose(series.bids[:, 0], [1.10 / 0.0081, 1.20 / 0.0101])
+    np.testing.assert_allclose(series.asks[:, 0], [1.11 / 0.0080, 1.21 / 0.0100])
+
+
+def test_cross_leg_older_than_the_window_is_not_matched():
+    a = ticks([100], [[1.0]], [[1.0]], [[1.0]])
+    b = ticks([10], [[2.0]], [[2.0]], [[1.0]])
+    series = path_series((Leg("AAABBB", False), Leg("BBBCCC", False)), {"AAABBB": a, "BBBCCC": b}, window_ns=50)
+    assert np.isnan(series.bids[0, 0]) and np.isnan(series.asks[0, 0])
+
+
+def test_path_vwap_chains_legs_and_requires_every_leg_filled():
+    # EUR -> USD (EURUSD as quoted) -> JPY (USDJPY as quoted); USD leg has little depth
+    eurusd = ticks([10], [[1.0, 0.9]], [[1.2, 1.3]], [[100.0, 100.0]])
+    usdjpy = ticks([10], [[150.0, 149.0]], [[151.0, 152.0]], [[120.0, 1000.0]])
+    book = {"EURUSD": eurusd, "USDJPY": usdjpy}
+    path = (Leg("EURUSD", False), Leg("USDJPY", False))
+    vb, va, filled = path_vwap(path, book, np.array([20, 20]), 100, np.array([50.0, 150.0]), np.array([1.0, 1.0]))
+    # trade 0: 50 EUR fills at level 0 of EURUSD; 50 * mid 1.1 = 55 USD fills at level 0 of USDJPY
+    np.testing.assert_allclose([vb[0], va[0]], [1.0 * 150.0, 1.2 * 151.0])
+    # trade 1: 150 EUR walks both EURUSD levels; 165 USD walks past USDJPY level 0
+    eur_bid = (100 * 1.0 + 50 * 0.9) / 150
+    usd_bid = (120 * 150.0 + 45 * 149.0) / 165
+    np.testing.assert_allclose(vb[1], eur_bid * usd_bid)
+    assert list(filled) == [True, True]
+
+    vb, va, filled = path_vwap(path, book, np.array([20]), 100, np.array([1000.0]), np.array([1.0]))
+    assert list(filled) == [False]  # EURUSD has only 200 visible
+
+
+def test_path_vwap_inverted_leg_takes_the_amount_it_converts_into():
+    # USD -> EUR through EURUSD used inverted: the notional is the EUR amount (to_amt)
+    eurusd = ticks([10], [[1.0, 0.5]], [[2.0, 4.0]], [[10.0, 10.0]])
+    vb, va, filled = path_vwap((Leg("EURUSD", True),), {"EURUSD": eurusd}, np.array([20]), 100,
+                               np.array([nan]), np.array([15.0]))
+    ask_vwap = (10 * 2.0 + 5 * 4.0) / 15
+    bid_vwap = (10 * 1.0 + 5 * 0.5) / 15
+    np.testing.assert_allclose([vb[0], va[0]], [1 / ask_vwap, 1 / bid_vwap])
+    assert list(filled) == [True]
+
+
+def test_path_vwap_without_a_book_in_the_window():
+    eurusd = ticks([10], [[1.0]], [[1.1]], [[1.0]])
+    vb, va, filled = path_vwap((Leg("EURUSD", False),), {"EURUSD": eurusd}, np.array([500]), 100,
+                               np.array([1.0]), np.array([1.0]))
+    assert np.isnan(vb[0]) and np.isnan(va[0]) and filled[0] is None
+
+
+# coalesce_spans / subtract_spans / merge_spans
+
+def test_coalesce_joins_overlapping_and_close_windows():
+    lo = np.array([30, 0, 12, 100])
+    hi = np.array([40, 10, 20, 110])
+    assert coalesce_spans(lo, hi, gap_ns=1, max_spans=10) == [(0, 10), (12, 20), (30, 40), (100, 110)]
+    assert coalesce_spans(lo, hi, gap_ns=10, max_spans=10) == [(0, 40), (100, 110)]
+    # a gap exactly gap_ns wide is still joined
+    assert coalesce_spans(np.array([0, 15]), np.array([10, 20]), gap_ns=5, max_spans=10) == [(0, 20)]
+    assert coalesce_spans(np.array([], dtype=int), np.array([], dtype=int), 5, 10) == []
+
+
+def test_coalesce_bridges_smallest_gaps_beyond_max_spans():
+    lo = np.array([0, 20, 25, 100])
+    hi = np.array([10, 22, 30, 110])  # gaps 10, 3, 70
+    assert coalesce_spans(lo, hi, gap_ns=0, max_spans=2) == [(0, 30), (100, 110)]
+    assert coalesce_spans(lo, hi, gap_ns=0, max_spans=1) == [(0, 110)]
+
+
+def test_coalesce_keeps_contained_windows_inside():
+    assert coalesce_spans(np.array([0, 5]), np.array([100, 10]), gap_ns=0, max_spans=5) == [(0, 100)]
+
+
+@pytest.mark.parametrize("spans, covered, expected", [
+    ([(0, 100)], [], [(0, 100)]),
+    ([(0, 100)], [(0, 100)], []),
+    ([(0, 100)], [(-10, 0), (100, 110)], [(0, 100)]),     # touching at both edges
+    ([(0, 100)], [(20, 30), (50, 60)], [(0, 20), (30, 50), (60, 100)]),
+    ([(0, 100)], [(-5, 10), (90, 120)], [(10, 90)]),      # overhanging both ends
+    ([(0, 10), (20, 30)], [(5, 25)], [(0, 5), (25, 30)]),
+])
+def test_subtract_spans(spans, covered, expected):
+    assert subtract_spans(spans, covered) == expected
+
+
+def test_merge_spans_joins_touching_and_overlapping():
+    assert merge_spans([(20, 30), (0, 10), (10, 15), (25, 40)]) == [(0, 15), (20, 40)]
@@ -0,0 +1,120 @@
+import functools
+import http.server
+import importlib.util
+import os
+import threading
+
+import pytest
+
+for dep in ("PyPDF2", "pdfplumber", "pdfminer", "tqdm", "requests"):
+    pytest.importorskip(dep)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_spec = importlib.util.spec_from_file_location("pdf_reader_check", os.path.join(ROOT, "pdf-reader-check.py"))
+pdf_reader = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pdf_reader)
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """http.server's file handler (Last-Modified / If-Modified-Since), counting the bodies it sends."""
+
+    sent = 0
+
+    def send_head(self):
+        f = super().send_head()
+        if f is not None:
+            type(self).sent += 1
+        return f
+
+    def log_message(self, *args):
+        pass
+
+
+class ConditionalOnlyHandler(QuietHandler):
+    """Answers any conditional request with 304, whether or not the file changed."""
+
+    def send_head(self):
+        if self.headers.get("If-Modified-Since") or self.headers.get("If-None-Match"):
+            self.send_response(304)
+            self.end_headers()
+            return None
+        return super().send_head()
+
+
+@pytest.fixture
+def serve(tmp_path):
+    servers = []
+
+    def start(handler):
+        docs = tmp_path / "docs"
+        docs.mkdir(exist_ok=True)
+        handler.sent = 0
+        httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=str(docs)))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return docs, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def make_cache(tmp_path, max_bytes=1 << 20):
+    return pdf_reader.DownloadCache(tmp_path / "cache", max_bytes)
+
+
+def test_unchanged_file_is_revalidated_not_transferred(tmp_path, serve):
+    docs, base = serve(QuietHandler)
+    (docs / "a.pdf").write_bytes(b"%PDF-a" * 100)
+    cache = make_cache(tmp_path)
+
+    path, sha, status = pdf_reader.download_pdf(f"{base}/a.pdf", cache)
+    cache.release(sha)
+    assert status == "downloaded" and path.read_bytes() == b"%PDF-a" * 100
+
+    path2, sha2, status2 = pdf_reader.download_pdf(f"{base}/a.pdf", cache)
+    cache.release(sha2)
+    assert (path2, sha2, status2) == (path, sha, "not-modified")
+    assert QuietHandler.sent == 1
+
+
+def test_304_for_an_evicted_object_is_a_miss(tmp_path, serve):
+    docs, base = serve(ConditionalOnlyHandler)
+    (docs / "a.pdf").write_bytes(b"%PDF-a" * 100)
+    cache = make_cache(tmp_path)
+    _, sha, _ = pdf_reader.download_pdf(f"{base}/a.pdf", cache)
+    cache.release(sha)
+
+    # evicted by another thread between lookup() and acquire()
+    stale = cache.lookup(f"{base}/a.pdf")
+    cache.path(sha).unlink()
+    cache.lookup = lambda url: stale
+    assert cache.acquire(sha) is None
+
+    path, sha2, status = pdf_reader.download_pdf(f"{base}/a.pdf", cache)
+    assert (sha2, status) == (sha, "downloaded")
+    assert path.read_bytes() == b"%PDF-a" * 100
+    assert ConditionalOnlyHandler.sent == 2
+
+
+def test_eviction_keeps_a_running_total_and_spares_pinned_objects(tmp_path, serve):
+    docs, base = serve(QuietHandler)
+    for name in "abc":
+        (docs / f"{name}.pdf").write_bytes(name.encode() * 400)
+    cache = make_cache(tmp_path, max_bytes=1000)
+
+    _, sha_a, _ = pdf_reader.download_pdf(f"{base}/a.pdf", cache)
+    cache.release(sha_a)
+    _, sha_b, _ = pdf_reader.download_pdf(f"{base}/b.pdf", cache)  # still pinned
+    _, sha_c, _ = pdf_reader.download_pdf(f"{base}/c.pdf", cache)
+    cache.release(sha_c)
+
+    assert not cache.path(sha_a).exists()  # least recently used
+    assert cache.path(sha_b).exists() and cache.path(sha_c).exists()
+    assert cache.lookup(f"{base}/a.pdf") is None
+    on_disk = sum(p.stat().st_size for p in cache.objects.glob("*/*.pdf"))
+    assert cache._total == on_disk == 800
+
+    # a fresh cache over the same directory starts from the same total
+    assert make_cache(tmp_path, max_bytes=1000)._total == 800